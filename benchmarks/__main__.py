@@ -0,0 +1,65 @@
+"""Run the microbenchmarks, or compare two saved runs.
+
+    python -m benchmarks run -o results.json
+    python -m benchmarks run -k 'propagation.*'
+    python -m benchmarks compare baseline.json results.json
+
+`compare` exits with status 1 if any benchmark regressed by more than the
+threshold, so it can gate CI.
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+
+from . import harness
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('-k', dest='pattern', default='*',
+                     help='only run benchmarks matching this glob')
+    run.add_argument('-r', '--repeats', type=int,
+                     default=harness.DEFAULT_REPEATS)
+    run.add_argument('-o', '--output', help='write results to this JSON file')
+
+    compare = commands.add_parser(
+        'compare', help='compare results against a baseline')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('-t', '--threshold', type=float,
+                         default=harness.DEFAULT_THRESHOLD,
+                         help='relative slowdown counted as a regression '
+                              '(default: %(default)s)')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = harness.run(args.pattern, args.repeats)
+        if args.output:
+            harness.write_results(results, args.output)
+        return 0
+
+    if args.command == 'compare':
+        regressions = harness.compare(
+            harness.read_results(args.baseline),
+            harness.read_results(args.current),
+            args.threshold)
+        if regressions:
+            print('\n{0} benchmark(s) regressed by more than {1:.0%}'.format(
+                len(regressions), args.threshold))
+            return 1
+        return 0
+
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""How well samplers keep to a budget under skewed traffic with a spike.
+
+Simulates --seconds of root spans over --operations operations whose traffic
+follows a Zipf distribution (a few operations get most of it), at --rate
+traces per second, ten times that during the middle third of the run. Every
+sampled trace records --spans-per-trace spans. The clock is simulated, so
+the run takes as long as the sampling decisions:
+
+    python -m benchmarks.adaptive_sampling --budget 500
+
+Compares an AdaptiveSampler with that budget of spans per second to a
+ProbabilisticSampler whose rate meets the budget at the normal traffic. For
+each phase, prints the recorded spans per second (mean and worst second)
+and how many operations, and how many of the ten rarest, had a trace
+sampled.
+"""
+from __future__ import division, print_function
+
+import argparse
+import random
+
+from lightstep.sampler import AdaptiveSampler, ProbabilisticSampler
+
+
+class _Clock(object):
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _workload(args):
+    """Yields (second, operation names) for every simulated second."""
+    rng = random.Random(args.seed)
+    names = ['operation.{0}'.format(i) for i in range(args.operations)]
+    weights = [1 / (i + 1) ** args.skew for i in range(args.operations)]
+    for second in range(args.seconds):
+        spike = args.seconds // 3 <= second < 2 * args.seconds // 3
+        count = args.rate * (10 if spike else 1)
+        yield second, rng.choices(names, weights, k=count)
+
+
+def _phase(second, seconds):
+    return ('before', 'spike', 'after')[min(2, 3 * second // seconds)]
+
+
+def _simulate(sampler, clock, args):
+    rng = random.Random(args.seed + 1)
+    # What the Tracer does for the spans it records.
+    record_span = getattr(sampler, 'record_span', lambda span: None)
+    phases = {}
+    for second, names in _workload(args):
+        stats = phases.setdefault(_phase(second, args.seconds),
+                                  {'per_second': [], 'operations': set()})
+        sampled = 0
+        for i, name in enumerate(names):
+            clock.now = second + i / len(names)
+            if sampler.sampled(rng.getrandbits(64), name):
+                sampled += args.spans_per_trace
+                stats['operations'].add(name)
+                for _ in range(args.spans_per_trace):
+                    record_span(None)
+        stats['per_second'].append(sampled)
+    return phases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=500,
+                        help='spans per second')
+    parser.add_argument('--rate', type=int, default=2000,
+                        help='traces per second outside the spike')
+    parser.add_argument('--spans-per-trace', type=int, default=5)
+    parser.add_argument('--operations', type=int, default=50)
+    parser.add_argument('--skew', type=float, default=1.5,
+                        help='Zipf exponent of the operation mix')
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rarest = set('operation.{0}'.format(i)
+                 for i in range(args.operations - 10, args.operations))
+    print('{0:<13} {1:<7} {2:>10} {3:>10} {4:>11} {5:>7}'.format(
+        'sampler', 'phase', 'mean/s', 'worst/s', 'operations', 'rarest'))
+    for name in ('probabilistic', 'adaptive'):
+        clock = _Clock()
+        if name == 'adaptive':
+            sampler = AdaptiveSampler(args.budget, clock=clock)
+        else:
+            sampler = ProbabilisticSampler(min(1.0, args.budget / (
+                args.rate * args.spans_per_trace)))
+        for phase, stats in sorted(_simulate(sampler, clock, args).items(),
+                                   key=lambda item: ['before', 'spike',
+                                                     'after'].index(item[0])):
+            per_second = stats['per_second']
+            print('{0:<13} {1:<7} {2:>10.1f} {3:>10d} {4:>11d} {5:>7d}'.format(
+                name, phase, sum(per_second) / len(per_second),
+                max(per_second), len(stats['operations']),
+                len(stats['operations'] & rarest)))
+
+
+if __name__ == '__main__':
+    main()
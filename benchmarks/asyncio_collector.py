@@ -0,0 +1,112 @@
+"""An asyncio stand-in for a LightStep collector's protobuf endpoint.
+
+AsyncioMockCollector runs on the event loop of the code under test, so
+asyncio reporting can be exercised without threads. It keeps connections
+alive between reports, like the real collector, and can be told to drop them
+after each response to exercise reconnects.
+
+    async with AsyncioMockCollector() as collector:
+        tracer = AsyncTracer(**collector.tracer_kwargs())
+"""
+import asyncio
+import time
+
+from lightstep.collector_pb2 import ReportRequest, ReportResponse
+
+from .mock_collector import PROTO_PATH, ReceivedReport
+
+
+class AsyncioMockCollector(object):
+    def __init__(self, host='127.0.0.1', port=0):
+        self._host = host
+        self._port = port
+        self._server = None
+        self.reports = []
+        self.keep_spans = False
+        self.spans = []
+        self.connections = 0
+        # Close each connection after answering one report.
+        self.close_after_response = False
+        # HTTP status to answer reports with, and commands to send back.
+        self.status = 200
+        self.commands = []
+
+    @property
+    def host(self):
+        return self._server.sockets[0].getsockname()[0]
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    def tracer_kwargs(self):
+        """Keyword arguments pointing a tracer at this collector."""
+        return {
+            'collector_host': self.host,
+            'collector_port': self.port,
+            'collector_encryption': 'none',
+        }
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._serve, self._host, self._port)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    @property
+    def num_spans(self):
+        return sum(r.num_spans for r in self.reports)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers.get('content-length', 0)))
+
+                status, payload = self._handle(request_line, headers, body)
+                writer.write((
+                    'HTTP/1.1 {0} -\r\n'
+                    'Content-Type: application/octet-stream\r\n'
+                    'Content-Length: {1}\r\n'
+                    '\r\n'
+                ).format(status, len(payload)).encode('latin-1') + payload)
+                await writer.drain()
+                if self.close_after_response:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _handle(self, request_line, headers, body):
+        if request_line.split()[1].decode('latin-1') != PROTO_PATH:
+            return 404, b''
+        if self.status != 200:
+            return self.status, b'injected failure'
+        report = ReportRequest.FromString(body)
+        self.reports.append(ReceivedReport(
+            'proto', headers.get('lightstep-access-token'), len(report.spans),
+            len(body), time.time()))
+        if self.keep_spans:
+            self.spans.extend(report.spans)
+        return 200, ReportResponse(commands=self.commands).SerializeToString()
@@ -0,0 +1,43 @@
+"""Scope management under asyncio: thousands of concurrent tasks, each
+activating a parent and a child span across awaits.
+"""
+import asyncio
+
+from basictracer.tracer import NoopRecorder
+from opentracing.scope_managers.asyncio import AsyncioScopeManager
+from opentracing.scope_managers.contextvars import \
+    ContextVarsScopeManager as OpentracingContextVarsScopeManager
+
+from lightstep.scope_manager import ContextVarsScopeManager
+from lightstep.tracer import _LightstepTracer
+
+from .harness import benchmark
+
+TASKS = 2000
+
+SCOPE_MANAGERS = {
+    'lightstep.contextvars': ContextVarsScopeManager,
+    'opentracing.contextvars': OpentracingContextVarsScopeManager,
+    'opentracing.asyncio': AsyncioScopeManager,
+}
+
+
+async def _task(tracer):
+    with tracer.start_active_span('parent'):
+        await asyncio.sleep(0)
+        with tracer.start_active_span('child'):
+            await asyncio.sleep(0)
+
+
+for _name in sorted(SCOPE_MANAGERS):
+    @benchmark('asyncio.concurrent_tasks', ops_per_call=TASKS,
+               scope_manager=_name)
+    def concurrent_tasks(scope_manager):
+        tracer = _LightstepTracer(False, NoopRecorder(),
+                                  SCOPE_MANAGERS[scope_manager]())
+        loop = asyncio.new_event_loop()
+
+        async def main():
+            await asyncio.gather(*[_task(tracer) for _ in range(TASKS)])
+
+        return lambda: loop.run_until_complete(main())
@@ -0,0 +1,61 @@
+"""Reporting over gRPC against reporting over HTTP, each to an in-process
+stand-in collector (requires the grpcio package).
+"""
+from concurrent import futures
+
+from .bench_recorder import BATCH, _recorder_and_spans, _span_records
+from .fixtures import make_recorder
+from .grpc_collector import GRPCMockCollector
+from .harness import benchmark
+from .mock_collector import MockCollector
+
+CONCURRENCY = 8
+
+# Started on first use and left running until the benchmark process exits.
+_COLLECTORS = {}
+
+
+def _collector(destination):
+    if destination not in _COLLECTORS:
+        if destination == 'grpc':
+            _COLLECTORS[destination] = GRPCMockCollector().start()
+        else:
+            _COLLECTORS[destination] = MockCollector().start()
+    return _COLLECTORS[destination]
+
+
+def _recorder_and_connection(destination):
+    recorder = make_recorder(**_collector(destination).tracer_kwargs())
+    return recorder, recorder._create_connection()
+
+
+for _destination in ('http', 'grpc'):
+    @benchmark('grpc.flush', ops_per_call=BATCH, destination=_destination)
+    def flush(destination):
+        """One flush of BATCH spans, on a kept-alive connection."""
+        records = _span_records(*_recorder_and_spans('http', 10, 2, BATCH))
+        recorder, connection = _recorder_and_connection(destination)
+
+        def run():
+            recorder._span_records = list(records)
+            recorder.flush(connection)
+        return run
+
+    @benchmark('grpc.concurrent_reports', ops_per_call=CONCURRENCY,
+               destination=_destination)
+    def concurrent_reports(destination):
+        """CONCURRENCY threads sending a BATCH span report through one
+        connection: the HTTP connection sends them one at a time, the gRPC
+        channel multiplexes them."""
+        source, spans = _recorder_and_spans('http', 10, 2, BATCH)
+        report = source.converter.create_report(
+            source._runtime, _span_records(source, spans))
+        recorder, connection = _recorder_and_connection(destination)
+        pool = futures.ThreadPoolExecutor(CONCURRENCY)
+
+        def send(_):
+            return connection.report(recorder._auth, report)
+
+        def run():
+            list(pool.map(send, range(CONCURRENCY)))
+        return run
@@ -0,0 +1,52 @@
+"""Benchmarks for span and trace id generation, compared with the
+generators it replaced: util's previous guid_rng based _generate_guid,
+basictracer's generate_id (which the tracer used for span and trace ids) and
+trace_context's inline getrandbits(128). Invert ns/op for ids/sec per
+thread.
+"""
+import random
+
+from basictracer.util import generate_id as basictracer_generate_id
+
+from lightstep import util
+
+from .harness import benchmark
+
+BATCH = 1000
+
+
+def _batch(generate):
+    def run():
+        for _ in range(BATCH):
+            generate()
+    return run
+
+
+@benchmark('ids.generate', ops_per_call=BATCH, generator='lightstep')
+def lightstep(generator):
+    return _batch(util._generate_id)
+
+
+@benchmark('ids.generate', ops_per_call=BATCH, generator='previous')
+def previous(generator):
+    guid_rng = random.Random()
+
+    def _generate_id():
+        return guid_rng.getrandbits(64) - 1
+    return _batch(_generate_id)
+
+
+@benchmark('ids.generate', ops_per_call=BATCH, generator='basictracer')
+def basictracer(generator):
+    return _batch(basictracer_generate_id)
+
+
+@benchmark('ids.generate_128', ops_per_call=BATCH, generator='lightstep')
+def lightstep_128(generator):
+    return _batch(util._generate_trace_id_128)
+
+
+@benchmark('ids.generate_128', ops_per_call=BATCH, generator='getrandbits')
+def getrandbits_128(generator):
+    getrandbits = random.getrandbits
+    return _batch(lambda: getrandbits(128))
@@ -0,0 +1,51 @@
+"""Benchmarks for inject/extract with each supported propagator."""
+from basictracer.context import SpanContext
+from basictracer.text_propagator import TextPropagator
+
+from lightstep.b3_propagator import B3Propagator
+from lightstep.lightstep_binary_propagator import LightStepBinaryPropagator
+from lightstep.trace_context import TraceContextPropagator
+
+from .harness import benchmark
+
+PROPAGATORS = {
+    'b3': B3Propagator,
+    'trace_context': TraceContextPropagator,
+    'lightstep_binary': LightStepBinaryPropagator,
+    'text': TextPropagator,
+}
+
+
+def _context():
+    return SpanContext(
+        trace_id=0x5ba4c1e3b1a3f2d4,
+        span_id=0x1d2c3b4a59687766,
+        baggage={'user': 'benchmark'},
+    )
+
+
+def _carrier(name):
+    return bytearray() if name == 'lightstep_binary' else {}
+
+
+for _name in sorted(PROPAGATORS):
+    @benchmark('propagation.inject', propagator=_name)
+    def inject(propagator):
+        instance = PROPAGATORS[propagator]()
+        new_carrier = lambda: _carrier(propagator)
+
+        def run():
+            # Some propagators consume baggage while injecting, so every call
+            # gets a fresh context.
+            instance.inject(_context(), new_carrier())
+        return run
+
+    @benchmark('propagation.extract', propagator=_name)
+    def extract(propagator):
+        instance = PROPAGATORS[propagator]()
+        carrier = _carrier(propagator)
+        instance.inject(_context(), carrier)
+
+        if propagator == 'lightstep_binary':
+            return lambda: instance.extract(bytearray(carrier))
+        return lambda: instance.extract(dict(carrier))
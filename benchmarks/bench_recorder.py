@@ -0,0 +1,194 @@
+"""Benchmarks for span conversion, buffering and report construction."""
+import itertools
+import tempfile
+import time
+
+from thrift import TSerialization
+
+from lightstep.tail_sampling import TailSampler
+
+from .harness import benchmark
+from .fixtures import finished_span, make_recorder, make_tracer
+from .mock_collector import MockCollector
+from .udp_receiver import UDPReceiver
+
+BATCH = 100
+REPORT_SIZE = 1000
+
+TRANSPORTS = ('http', 'thrift')
+SHAPES = [(0, 0), (10, 0), (10, 5)]
+
+# Removed when the benchmark process exits.
+_RING_DIR = tempfile.TemporaryDirectory(prefix='lightstep-bench-')
+
+# Where recorder.flush reports to, started on first use and left running
+# until the benchmark process exits.
+_DESTINATIONS = {}
+
+
+def _destination(name):
+    if name not in _DESTINATIONS:
+        if name == 'udp':
+            _DESTINATIONS[name] = UDPReceiver(parse=False).start()
+        else:
+            _DESTINATIONS[name] = MockCollector().start()
+    return _DESTINATIONS[name]
+
+
+def _recorder_and_spans(transport, tags, logs, count):
+    recorder = make_recorder(use_thrift=transport == 'thrift')
+    tracer = make_tracer()
+    spans = [finished_span(tracer, tags, logs, i) for i in range(count)]
+    return recorder, spans
+
+
+def _span_records(recorder, spans):
+    for span in spans:
+        recorder.record_span(span)
+    records = recorder._span_records
+    recorder._span_records = []
+    return records
+
+
+for _transport in TRANSPORTS:
+    for _tags, _logs in SHAPES:
+        @benchmark('recorder.record_span', ops_per_call=BATCH,
+                   transport=_transport, tags=_tags, logs=_logs)
+        def record_span(transport, tags, logs):
+            recorder, spans = _recorder_and_spans(transport, tags, logs, BATCH)
+
+            def run():
+                for span in spans:
+                    recorder.record_span(span)
+                recorder._span_records = []
+            return run
+
+    @benchmark('recorder.record_span_inline_flush', ops_per_call=BATCH,
+               transport=_transport)
+    def record_span_inline_flush(transport):
+        """record_span's overhead in inline_flush mode between flushes."""
+        recorder = make_recorder(use_thrift=transport == 'thrift',
+                                 inline_flush=True,
+                                 periodic_flush_seconds=1e9)
+        spans = [finished_span(make_tracer(), 10, 0, i) for i in range(BATCH)]
+
+        def run():
+            for span in spans:
+                recorder.record_span(span)
+            recorder._span_records = []
+        return run
+
+    @benchmark('recorder.record_span_shared_ring', ops_per_call=BATCH,
+               transport=_transport)
+    def record_span_shared_ring(transport):
+        """record_span writing to this process' shared ring."""
+        recorder = make_recorder(use_thrift=transport == 'thrift',
+                                 shared_ring_dir=_RING_DIR.name)
+        spans = [finished_span(make_tracer(), 10, 0, i) for i in range(BATCH)]
+
+        def run():
+            for span in spans:
+                recorder.record_span(span)
+            recorder._rings._own_ring.drain(BATCH)
+        return run
+
+    @benchmark('recorder.construct_report_request', transport=_transport)
+    def construct_report_request(transport):
+        recorder, spans = _recorder_and_spans(transport, 10, 2, REPORT_SIZE)
+        records = _span_records(recorder, spans)
+
+        def run():
+            recorder._span_records = list(records)
+            recorder._construct_report_request()
+        return run
+
+    @benchmark('recorder.serialize_report', transport=_transport)
+    def serialize_report(transport):
+        recorder, spans = _recorder_and_spans(transport, 10, 2, REPORT_SIZE)
+        recorder._span_records = _span_records(recorder, spans)
+        report = recorder._construct_report_request()
+        if transport == 'thrift':
+            return lambda: TSerialization.serialize(report)
+        return report.SerializeToString
+
+
+for _traffic in ('roots', 'children'):
+    @benchmark('recorder.record_span_tail_sampling', ops_per_call=BATCH,
+               traffic=_traffic)
+    def record_span_tail_sampling(traffic):
+        """record_span through a TailSampler keeping 1% of traces, with every
+        span in a trace of its own: local roots, which are decided at once,
+        or children of remote spans, which wait until the sampler's 1000
+        traces are held and the oldest is decided early."""
+        recorder = make_recorder(
+            tail_sampler=TailSampler(sample_rate=0.01, max_traces=1000))
+        tracer = make_tracer()
+        spans = [finished_span(tracer, 10, 0, i) for i in range(BATCH)]
+        if traffic == 'roots':
+            for span in spans:
+                span.parent_id = None
+        trace_ids = itertools.count(1)
+
+        def run():
+            for span in spans:
+                span.context.trace_id = next(trace_ids)
+                recorder.record_span(span)
+            recorder._span_records = []
+        return run
+
+
+for _transport in TRANSPORTS:
+    for _destination_name in ('collector', 'udp'):
+        @benchmark('recorder.flush', ops_per_call=BATCH, transport=_transport,
+                   destination=_destination_name)
+        def flush(transport, destination):
+            """The time flush() holds the flush thread for BATCH spans: a
+            round trip to a local collector, or datagrams sent to a local
+            agent."""
+            kwargs = _destination(destination).tracer_kwargs()
+            recorder, spans = _recorder_and_spans(transport, 10, 2, BATCH)
+            records = _span_records(recorder, spans)
+            recorder = make_recorder(use_thrift=transport == 'thrift',
+                                     **kwargs)
+            connection = recorder._create_connection()
+
+            def run():
+                recorder._span_records = list(records)
+                recorder.flush(connection)
+            return run
+
+
+for _transport in TRANSPORTS:
+    for _mode in ('fanout', 'two_recorders'):
+        @benchmark('recorder.flush_two_destinations', ops_per_call=BATCH,
+                   transport=_transport, mode=_mode)
+        def flush_two_destinations(transport, mode):
+            """Delivering BATCH spans to two local collectors: with
+            destinations, which serializes the report once and sends it on
+            both destinations' threads at once, or with a recorder per
+            collector, flushed one after the other."""
+            use_thrift = transport == 'thrift'
+            collectors = [_destination('collector'),
+                          _destination('second collector')]
+            recorder, spans = _recorder_and_spans(transport, 10, 2, BATCH)
+            records = _span_records(recorder, spans)
+            if mode == 'fanout':
+                recorder = make_recorder(
+                    use_thrift=use_thrift, collector_encryption='none',
+                    destinations=[{'collector_host': c.host,
+                                   'collector_port': c.port}
+                                  for c in collectors])
+                pairs = [(recorder, recorder._create_connection())]
+            else:
+                recorders = [make_recorder(use_thrift=use_thrift,
+                                           **c.tracer_kwargs())
+                             for c in collectors]
+                pairs = [(r, r._create_connection()) for r in recorders]
+
+            def run():
+                for recorder, connection in pairs:
+                    recorder._span_records = list(records)
+                    # With destinations, the deadline makes flush() wait for
+                    # both collectors' responses.
+                    recorder.flush(connection, deadline=time.time() + 30)
+            return run
@@ -0,0 +1,102 @@
+"""Benchmarks for the application-facing tracer API."""
+from basictracer.tracer import NoopRecorder
+
+from lightstep.sampler import AdaptiveSampler, ProbabilisticSampler
+from lightstep.tracer import _LightstepTracer
+
+from .harness import benchmark
+from .fixtures import make_tracer
+
+BATCH = 100
+
+TAG_KEYS = ['tag.{0}'.format(i) for i in range(20)]
+
+
+def _span_batch(tracer, tags, logs):
+    def run():
+        for _ in range(BATCH):
+            span = tracer.start_span('operation')
+            for key in TAG_KEYS[:tags]:
+                span.set_tag(key, 'value')
+            for i in range(logs):
+                span.log_kv({'event': 'log', 'index': i})
+            span.finish()
+        # Keep the buffer from growing across the whole run.
+        tracer.recorder._span_records = []
+    return run
+
+
+for _tags, _logs in [(0, 0), (5, 0), (20, 0), (0, 5), (5, 5)]:
+    for _use_thrift in (False, True):
+        @benchmark('tracer.start_span_finish', ops_per_call=BATCH,
+                   tags=_tags, logs=_logs,
+                   transport='thrift' if _use_thrift else 'http')
+        def start_span_finish(tags, logs, transport):
+            tracer = make_tracer(use_thrift=transport == 'thrift')
+            return _span_batch(tracer, tags, logs)
+
+
+for _tags, _logs in [(0, 0), (5, 5)]:
+    for _rate in (1.0, 0.0):
+        @benchmark('tracer.start_span_finish_sampler', ops_per_call=BATCH,
+                   tags=_tags, logs=_logs, rate=_rate)
+        def start_span_finish_sampler(tags, logs, rate):
+            """With a ProbabilisticSampler: rate=0.0 is the cost of spans of
+            unsampled traces."""
+            tracer = make_tracer(sampler=ProbabilisticSampler(rate))
+            return _span_batch(tracer, tags, logs)
+
+
+@benchmark('sampler.sampled', ops_per_call=BATCH, sampler='probabilistic')
+def sampled_probabilistic(sampler):
+    ids = list(range(BATCH))
+    sampled = ProbabilisticSampler(0.1).sampled
+    return lambda: [sampled(trace_id, 'operation') for trace_id in ids]
+
+
+@benchmark('sampler.sampled', ops_per_call=BATCH, sampler='adaptive')
+def sampled_adaptive(sampler):
+    """Decisions only; rates are adapted once a second, which the run may
+    not reach."""
+    ids = list(range(BATCH))
+    names = ['operation.{0}'.format(i % 10) for i in range(BATCH)]
+    sampled = AdaptiveSampler(100).sampled
+    return lambda: [sampled(trace_id, name)
+                    for trace_id, name in zip(ids, names)]
+
+
+@benchmark('tracer.start_active_span', ops_per_call=BATCH)
+def start_active_span():
+    tracer = make_tracer()
+
+    def run():
+        for _ in range(BATCH):
+            with tracer.start_active_span('operation'):
+                pass
+        tracer.recorder._span_records = []
+    return run
+
+
+@benchmark('tracer.start_active_span_noop_recorder', ops_per_call=BATCH)
+def start_active_span_noop_recorder():
+    """Scope activation and exit alone, without converting the span."""
+    tracer = _LightstepTracer(False, NoopRecorder(), None)
+
+    def run():
+        for _ in range(BATCH):
+            with tracer.start_active_span('operation'):
+                pass
+    return run
+
+
+@benchmark('tracer.start_active_span_nested', ops_per_call=BATCH)
+def start_active_span_nested():
+    tracer = make_tracer()
+
+    def run():
+        with tracer.start_active_span('parent'):
+            for _ in range(BATCH - 1):
+                with tracer.start_active_span('child'):
+                    pass
+        tracer.recorder._span_records = []
+    return run
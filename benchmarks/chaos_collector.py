@@ -0,0 +1,132 @@
+"""A MockCollector that injects faults: latency, error responses, connection
+resets and disable commands, according to a FaultProfile.
+"""
+import math
+import random
+import socket
+import struct
+import time
+
+from lightstep.collector_pb2 import Command, ReportResponse
+from lightstep.crouton import ReportingService, ttypes
+
+from .mock_collector import MockCollector, _process_thrift
+
+
+def constant(seconds):
+    return lambda rng: seconds
+
+
+def uniform(low, high):
+    return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median, sigma=1.0):
+    """Long-tailed latency: half the requests are faster than `median`."""
+    mu = math.log(median)
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+class FaultProfile(object):
+    """Describes how a ChaosCollector misbehaves.
+
+    :param str name: label used in benchmark output
+    :param latency: callable taking a random.Random and returning the seconds
+        to wait before answering, e.g. constant(0.1) or lognormal(0.05)
+    :param float error_rate: fraction of reports answered with error_status
+    :param int error_status: HTTP status used for injected errors
+    :param float reset_rate: fraction of reports whose connection is reset
+        without any response
+    :param bool disable: answer every report with a disable command
+    :param int seed: seed for the fault decisions, for reproducible runs
+    """
+    def __init__(self, name, latency=None, error_rate=0.0, error_status=503,
+                 reset_rate=0.0, disable=False, seed=None):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.reset_rate = reset_rate
+        self.disable = disable
+        self.seed = seed
+
+
+PROFILES = [
+    FaultProfile('healthy'),
+    FaultProfile('slow', latency=lognormal(0.2, 0.5)),
+    FaultProfile('stalled', latency=constant(1.5)),
+    FaultProfile('errors', error_rate=0.5),
+    FaultProfile('resets', reset_rate=0.3),
+    FaultProfile('slow_and_failing', latency=uniform(0.05, 0.5),
+                 error_rate=0.2, reset_rate=0.1),
+    FaultProfile('disable', disable=True),
+]
+
+
+class ChaosCollector(MockCollector):
+    def __init__(self, profile, host='127.0.0.1', port=0):
+        super(ChaosCollector, self).__init__(host, port)
+        self.profile = profile
+        self._rng = random.Random(profile.seed)
+        self.injected_errors = 0
+        self.injected_resets = 0
+
+    def _fault(self, request_handler):
+        """Apply latency, then maybe fail the request. Returns a
+        (status, payload) pair if the request should not be processed.
+        """
+        profile = self.profile
+        with self._lock:
+            delay = profile.latency(self._rng) if profile.latency else 0
+            roll = self._rng.random()
+        if delay:
+            time.sleep(delay)
+        if roll < profile.reset_rate:
+            with self._lock:
+                self.injected_resets += 1
+            _reset(request_handler)
+            return None, None
+        if roll < profile.reset_rate + profile.error_rate:
+            with self._lock:
+                self.injected_errors += 1
+            return profile.error_status, b'injected failure'
+        return None
+
+    def handle_proto_report(self, request_handler, body):
+        fault = self._fault(request_handler)
+        if fault is not None:
+            return fault
+        status, payload = super(ChaosCollector, self).handle_proto_report(
+            request_handler, body)
+        if self.profile.disable:
+            payload = ReportResponse(
+                commands=[Command(disable=True)]).SerializeToString()
+        return status, payload
+
+    def handle_thrift_report(self, request_handler, body):
+        fault = self._fault(request_handler)
+        if fault is not None:
+            return fault
+        if not self.profile.disable:
+            return super(ChaosCollector, self).handle_thrift_report(
+                request_handler, body)
+
+        collector = self
+
+        class Handler(object):
+            def Report(self, auth, request):
+                collector.record('thrift', auth.access_token,
+                                 request.span_records or [], len(body))
+                return ttypes.ReportResponse(
+                    commands=[ttypes.Command(disable=True)])
+
+        return 200, _process_thrift(ReportingService.Processor(Handler()), body)
+
+
+def _reset(request_handler):
+    """Abort the connection with a TCP RST instead of answering."""
+    connection = request_handler.connection
+    connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                          struct.pack('ii', 1, 0))
+    request_handler.close_connection = True
+    connection.close()
@@ -0,0 +1,107 @@
+"""How long the first reports of a new tracer take over TLS, with and without
+prewarm=True and TLS session resumption.
+
+A MockCollector serves TLS with a throwaway self-signed certificate (made
+with the openssl command line tool). For each configuration, fresh tracers
+are created, given a moment to start (as an application would while it
+initializes), and then timed for flush() of their first span, and of a
+second one:
+
+    python -m benchmarks.first_report --transport thrift --runs 20
+
+"before" is this library without prewarming and with the default SSL
+context, so every connection does a full handshake. Note that on loopback
+the handshake costs CPU time only: across a network each full handshake
+also costs one or two round trips more than a resumed one.
+"""
+from __future__ import division, print_function
+
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import time
+
+import lightstep.tls
+
+from .fixtures import make_tracer
+from .mock_collector import MockCollector
+
+
+def _certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=127.0.0.1',
+         '-addext', 'subjectAltName=IP:127.0.0.1'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def _median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def _measure(collector, use_thrift, prewarm, runs, startup_seconds):
+    first, second = [], []
+    for _ in range(runs):
+        tracer = make_tracer(use_thrift=use_thrift, prewarm=prewarm,
+                             collector_host=collector.host,
+                             collector_port=collector.port,
+                             collector_encryption='tls',
+                             periodic_flush_seconds=3600)
+        time.sleep(startup_seconds)
+        for timings in (first, second):
+            tracer.start_span('request').finish()
+            start = time.perf_counter()
+            assert tracer.flush()
+            timings.append(time.perf_counter() - start)
+        tracer.recorder.shutdown(flush=False)
+    return _median(first), _median(second)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transport', choices=['http', 'thrift'],
+                        default='http')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--startup', type=float, default=0.2,
+                        help='seconds between Tracer() and the first span')
+    args = parser.parse_args(argv)
+    if shutil.which('openssl') is None:
+        parser.error('the openssl command line tool is required')
+
+    directory = tempfile.mkdtemp(prefix='lightstep-tls-')
+    try:
+        cert, key = _certificate(directory)
+        # Trusted by requests and by the default SSL contexts alike.
+        os.environ['SSL_CERT_FILE'] = os.environ['REQUESTS_CA_BUNDLE'] = cert
+        collector = MockCollector()
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        collector._server.socket = context.wrap_socket(
+            collector._server.socket, server_side=True)
+        with collector:
+            use_thrift = args.transport == 'thrift'
+            client_context = lightstep.tls._client_context
+            print('{0:<8} {1:>14} {2:>14}'.format(
+                args.transport, 'first report', 'second report'))
+            for name, prewarm, resume in [('before', False, False),
+                                          ('after', True, True)]:
+                lightstep.tls._client_context = \
+                    client_context if resume else (lambda: None)
+                first, second = _measure(collector, use_thrift, prewarm,
+                                         args.runs, args.startup)
+                print('{0:<8} {1:>12.2f}ms {2:>12.2f}ms'.format(
+                    name, first * 1e3, second * 1e3))
+            lightstep.tls._client_context = client_context
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Shared setup for benchmarks: tracers and recorders that never touch the
+network, and finished spans of a given shape.
+"""
+import time
+import warnings
+
+from basictracer.context import SpanContext
+from basictracer.span import BasicSpan, LogData
+
+import lightstep
+import lightstep.recorder
+
+# Large enough that a benchmark batch never hits the buffer limit, which
+# would turn record_span into an early return.
+UNBOUNDED_SPAN_RECORDS = 1 << 30
+
+
+def _quietly(factory, kwargs):
+    kwargs.setdefault('periodic_flush_seconds', 0)
+    kwargs.setdefault('max_span_records', UNBOUNDED_SPAN_RECORDS)
+    with warnings.catch_warnings():
+        # periodic_flush_seconds=0 warns that nothing is flushed, which is
+        # exactly what a benchmark wants.
+        warnings.simplefilter('ignore')
+        return factory(**kwargs)
+
+
+def make_tracer(use_thrift=False, **kwargs):
+    kwargs.update(use_thrift=use_thrift, use_http=not use_thrift)
+    return _quietly(lightstep.Tracer, kwargs)
+
+
+def make_recorder(use_thrift=False, **kwargs):
+    kwargs.update(use_thrift=use_thrift, use_http=not use_thrift)
+    return _quietly(lightstep.recorder.Recorder, kwargs)
+
+
+def finished_span(tracer, tags=0, logs=0, i=0):
+    """A finished BasicSpan with `tags` tags and `logs` logs, which has not
+    been handed to the recorder.
+    """
+    span = BasicSpan(
+        tracer,
+        operation_name='benchmark/{0}'.format(i),
+        context=SpanContext(trace_id=0x1000 + i, span_id=0x2000 + i),
+        parent_id=0x3000 + i,
+        start_time=time.time() - 1,
+    )
+    for t in range(tags):
+        span.tags['tag.{0}'.format(t)] = 'value {0}'.format(t)
+    for l in range(logs):
+        span.logs.append(LogData({'event': 'log {0}'.format(l), 'index': l}))
+    span.duration = 0.25
+    return span
+
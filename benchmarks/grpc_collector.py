@@ -0,0 +1,83 @@
+"""An in-process stand-in for the collector's gRPC CollectorService
+(requires the grpcio package).
+
+GRPCMockCollector answers /lightstep.collector.CollectorService/Report on
+localhost, and records what it receives like MockCollector does. `delay`
+holds every call for that many seconds, which shows whether concurrent
+reports share one connection or wait for each other.
+"""
+import threading
+import time
+from concurrent import futures
+
+import grpc
+
+from lightstep.collector_pb2 import ReportRequest, ReportResponse
+
+from .mock_collector import ReceivedReport
+
+
+class GRPCMockCollector(object):
+    def __init__(self, host='127.0.0.1', port=0, max_workers=16):
+        self._server = grpc.server(
+            futures.ThreadPoolExecutor(max_workers=max_workers))
+        self._server.add_generic_rpc_handlers([
+            grpc.method_handlers_generic_handler(
+                'lightstep.collector.CollectorService', {
+                    'Report': grpc.unary_unary_rpc_method_handler(
+                        self._report,
+                        request_deserializer=ReportRequest.FromString,
+                        response_serializer=ReportResponse.SerializeToString),
+                }),
+        ])
+        self.host = host
+        self.port = self._server.add_insecure_port('{0}:{1}'.format(host, port))
+        self._lock = threading.Lock()
+        self.reports = []
+        self.keep_spans = False
+        self.spans = []
+        self.peers = set()
+        self.delay = 0
+
+    def tracer_kwargs(self):
+        """Keyword arguments pointing a lightstep.Tracer at this collector."""
+        return {
+            'collector_host': self.host,
+            'collector_port': self.port,
+            'collector_encryption': 'none',
+            'use_grpc': True,
+        }
+
+    def start(self):
+        self._server.start()
+        return self
+
+    def stop(self):
+        self._server.stop(None).wait()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def num_spans(self):
+        with self._lock:
+            return sum(r.num_spans for r in self.reports)
+
+    def _report(self, report, context):
+        if self.delay:
+            time.sleep(self.delay)
+        metadata = dict(context.invocation_metadata())
+        access_token = metadata.get('lightstep-access-token',
+                                    report.auth.access_token)
+        with self._lock:
+            # One peer address per client connection.
+            self.peers.add(context.peer())
+            self.reports.append(ReceivedReport(
+                'grpc', access_token, len(report.spans), report.ByteSize(),
+                time.time()))
+            if self.keep_spans:
+                self.spans.extend(report.spans)
+        return ReportResponse()
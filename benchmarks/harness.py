@@ -0,0 +1,160 @@
+"""A small, dependency free microbenchmark harness.
+
+Benchmarks register themselves with the @benchmark decorator. A benchmark
+function does its (untimed) setup and returns the zero-argument callable
+that gets timed. Results are written as JSON so that a later run can be
+compared against a saved baseline.
+"""
+from __future__ import print_function, division
+
+import fnmatch
+import gc
+import json
+import platform
+import sys
+import time
+import timeit
+
+from lightstep import version as tracer_version
+
+_BENCHMARKS = []
+
+# Each repeat runs for at least this many seconds, so that timer resolution
+# and loop overhead stay well below the per-call cost being measured.
+MIN_REPEAT_SECONDS = 0.2
+DEFAULT_REPEATS = 5
+
+# A benchmark regresses when its median gets this much slower.
+DEFAULT_THRESHOLD = 0.10
+
+
+class Benchmark(object):
+    def __init__(self, name, setup, ops_per_call):
+        self.name = name
+        self.setup = setup
+        self.ops_per_call = ops_per_call
+
+
+def benchmark(name, ops_per_call=1, **params):
+    """Register a benchmark.
+
+    `params` are passed to the decorated setup function and appended to the
+    benchmark name, so the same setup can be registered once per variant.
+    `ops_per_call` is the number of operations a single call of the returned
+    callable performs; results are reported per operation.
+    """
+    if params:
+        name = '{0}[{1}]'.format(name, ','.join(
+            '{0}={1}'.format(k, v) for k, v in sorted(params.items())))
+
+    def register(setup):
+        _BENCHMARKS.append(Benchmark(
+            name, lambda: setup(**params), ops_per_call))
+        return setup
+    return register
+
+
+def load_benchmarks():
+    """Import the benchmark modules so that they register themselves."""
+    from . import (  # noqa
+        bench_asyncio, bench_ids, bench_propagation, bench_recorder,
+        bench_tracer)
+    try:
+        from . import bench_grpc  # noqa
+    except ImportError:
+        # grpcio is optional.
+        pass
+    return list(_BENCHMARKS)
+
+
+def _calibrate(func):
+    """Find a loop count for which one repeat lasts MIN_REPEAT_SECONDS."""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= MIN_REPEAT_SECONDS:
+            return number
+        # Grow geometrically, but aim straight for the target once the timer
+        # has something meaningful to say.
+        if elapsed > 0.01:
+            number = int(number * MIN_REPEAT_SECONDS / elapsed) + 1
+        else:
+            number *= 10
+
+
+def run_benchmark(bench, repeats=DEFAULT_REPEATS):
+    func = bench.setup()
+    number = _calibrate(func)
+    # timeit disables the garbage collector while timing, so collect first to
+    # start every repeat from the same heap state.
+    samples = []
+    for _ in range(repeats):
+        gc.collect()
+        elapsed = timeit.timeit(func, number=number)
+        samples.append(elapsed * 1e9 / (number * bench.ops_per_call))
+
+    ordered = sorted(samples)
+    return {
+        'ns_per_op': ordered[len(ordered) // 2],
+        'ns_per_op_min': ordered[0],
+        'samples': samples,
+        'loops': number,
+    }
+
+
+def run(pattern='*', repeats=DEFAULT_REPEATS, out=sys.stdout):
+    results = {}
+    for bench in load_benchmarks():
+        if not fnmatch.fnmatch(bench.name, pattern):
+            continue
+        result = run_benchmark(bench, repeats)
+        results[bench.name] = result
+        print('{0:<60} {1:>12.0f} ns/op {2:>14,.0f} ops/s'.format(
+            bench.name, result['ns_per_op'], 1e9 / result['ns_per_op']),
+            file=out)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'lightstep': tracer_version.LIGHTSTEP_PYTHON_TRACER_VERSION,
+            'timestamp': time.time(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, out=sys.stdout):
+    """Print a comparison of two result sets and return the names of the
+    benchmarks that regressed by more than `threshold`.
+    """
+    regressions = []
+    base_results = baseline['results']
+    for name, result in sorted(current['results'].items()):
+        if name not in base_results:
+            print('{0:<60} {1:>12}'.format(name, 'new'), file=out)
+            continue
+        # The fastest repeat is the least affected by other load on the
+        # machine, so it is what gets compared.
+        before = base_results[name]['ns_per_op_min']
+        after = result['ns_per_op_min']
+        change = (after - before) / before
+        flag = ''
+        if change > threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = 'improved'
+        print('{0:<60} {1:>10.0f} -> {2:>10.0f} ns/op {3:>+8.1%} {4}'.format(
+            name, before, after, change, flag), file=out)
+    return regressions
+
+
+def write_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,102 @@
+"""Measures how long `import lightstep` takes, and what selecting each
+transport adds on top of it.
+
+Every sample runs in a fresh interpreter with `python -X importtime`, so
+module caches from earlier samples never leak into later ones. Example:
+
+    python -m benchmarks.import_time --runs 20
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+
+SCENARIOS = {
+    'import': 'import lightstep',
+    'tracer_http': (
+        'import lightstep; '
+        'lightstep.Tracer(periodic_flush_seconds=0, use_http=True)'
+    ),
+    'tracer_thrift': (
+        'import lightstep; '
+        'lightstep.Tracer(periodic_flush_seconds=0, use_http=False, use_thrift=True)'
+    ),
+}
+
+# The modules each transport is expected to pull in. Reported so that an
+# accidental eager import shows up in the benchmark output, not just in time.
+HEAVY_MODULES = ['google.protobuf', 'thrift', 'requests', 'jsonpickle']
+
+
+def _import_sample(statement, startup_modules=frozenset()):
+    """Run `statement` in a fresh interpreter and return (total_us, modules),
+    where total_us is the summed cumulative import time of top level imports
+    that are not part of interpreter startup.
+    """
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', statement],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True)
+    _, err = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError('benchmark statement failed:\n' + err)
+
+    total_us = 0
+    modules = set()
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        # Nested imports are indented below their parent; only count the
+        # top level so nothing is counted twice.
+        if not name.startswith('  ') and name.strip() not in startup_modules:
+            total_us += int(cumulative)
+    return total_us, modules
+
+
+def run(runs):
+    _, startup_modules = _import_sample('pass')
+    results = {}
+    for name, statement in sorted(SCENARIOS.items()):
+        samples = []
+        modules = set()
+        for _ in range(runs):
+            total_us, modules = _import_sample(statement, startup_modules)
+            samples.append(total_us)
+        samples.sort()
+        results[name] = {
+            'median_ms': samples[len(samples) // 2] / 1000.0,
+            'min_ms': samples[0] / 1000.0,
+            'heavy_modules': [m for m in HEAVY_MODULES if m in modules],
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10,
+                        help='fresh interpreters to sample per scenario')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the results to PATH as JSON')
+    args = parser.parse_args(argv)
+
+    if sys.version_info < (3, 7):
+        parser.error('-X importtime requires Python 3.7 or newer')
+
+    results = run(args.runs)
+    for name, result in sorted(results.items()):
+        print('{0:<16} median {1:8.2f} ms   min {2:8.2f} ms   loads: {3}'.format(
+            name, result['median_ms'], result['min_ms'],
+            ', '.join(result['heavy_modules']) or '-'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""End-to-end load harness: drives a real Tracer against a MockCollector.
+
+N application threads create spans at a combined target rate while the
+recorder buffers and flushes them in the background, exactly as it would in
+production. At the end the harness reports how many spans the collector
+accepted, the drop rate, report sizes, flush latency and the CPU the tracer
+used. Useful for sizing max_span_records and periodic_flush_seconds:
+
+    python -m benchmarks.load --threads 8 --rate 20000 --duration 10 \\
+        --max-span-records 5000 --flush-period 1
+"""
+from __future__ import division, print_function
+
+import argparse
+import json
+import threading
+import time
+import tracemalloc
+import warnings
+
+import lightstep
+
+from .mock_collector import MockCollector
+
+TAG_KEYS = ['tag.{0}'.format(i) for i in range(64)]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _FlushTimer(object):
+    """Wraps Recorder._flush_worker to time every flush, wherever it runs."""
+    def __init__(self, recorder):
+        self.latencies = []
+        self.cpu_seconds = 0.0
+        self._flush_worker = recorder._flush_worker
+        recorder._flush_worker = self
+
+    def __call__(self, connection, *args):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return self._flush_worker(connection, *args)
+        finally:
+            self.cpu_seconds += time.thread_time() - cpu_start
+            self.latencies.append(time.perf_counter() - start)
+
+
+class _RecordSpanTimer(object):
+    """Wraps Recorder.record_span to time it on the application threads.
+
+    Only every `sample_every`th call is timed, to keep the timer itself from
+    dominating the measurement.
+    """
+    def __init__(self, recorder, sample_every=10):
+        self.latencies = []
+        self._sample_every = sample_every
+        self._calls = 0
+        self._record_span = recorder.record_span
+        recorder.record_span = self
+
+    def __call__(self, span):
+        self._calls += 1
+        if self._calls % self._sample_every:
+            return self._record_span(span)
+        start = time.perf_counter()
+        try:
+            return self._record_span(span)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def _generate(tracer, rate, deadline, tags, logs, result):
+    interval = 1.0 / rate
+    created = 0
+    cpu_start = time.thread_time()
+    next_at = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        if now < next_at:
+            time.sleep(next_at - now)
+        next_at += interval
+
+        span = tracer.start_span('load')
+        for key in TAG_KEYS[:tags]:
+            span.set_tag(key, 'value')
+        for i in range(logs):
+            span.log_kv({'event': 'load', 'index': i})
+        span.finish()
+        created += 1
+    result['created'] = created
+    result['cpu_seconds'] = time.thread_time() - cpu_start
+
+
+def run_load(collector, transport='http', threads=4, rate=2000, duration=5.0,
+             max_span_records=1000, periodic_flush_seconds=2.5, tags=5,
+             logs=1, measure_memory=False, **tracer_kwargs):
+    """Drive `threads` threads creating `rate` spans/sec in total for
+    `duration` seconds against `collector`, and return the measurements.
+
+    With measure_memory, tracemalloc tracks how much the heap grew over the
+    run. It slows everything down, so CPU figures are not comparable with
+    runs that do not measure memory.
+    """
+    collector.clear()
+    kwargs = collector.tracer_kwargs()
+    kwargs.update(tracer_kwargs)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        tracer = lightstep.Tracer(
+            use_thrift=transport == 'thrift',
+            use_http=transport != 'thrift',
+            max_span_records=max_span_records,
+            periodic_flush_seconds=periodic_flush_seconds,
+            **kwargs)
+    flush_timer = _FlushTimer(tracer.recorder)
+    record_timer = _RecordSpanTimer(tracer.recorder)
+    if measure_memory:
+        tracemalloc.start()
+        memory_start = tracemalloc.get_traced_memory()[0]
+
+    thread_results = [{} for _ in range(threads)]
+    start = time.perf_counter()
+    deadline = start + duration
+    workers = [
+        threading.Thread(target=_generate,
+                         args=(tracer, rate / threads, deadline, tags, logs, r))
+        for r in thread_results
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    if measure_memory:
+        # Sampled before the final flush, while the buffer is still full.
+        memory_end, memory_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # Report whatever is still buffered, then stop the flush thread.
+    tracer.flush()
+    tracer.recorder.shutdown(flush=False)
+
+    created = sum(r['created'] for r in thread_results)
+    app_cpu = sum(r['cpu_seconds'] for r in thread_results)
+    accepted = collector.num_spans
+    report_sizes = [r.num_bytes for r in collector.reports if r.num_spans]
+    result = {
+        'transport': transport,
+        'threads': threads,
+        'target_rate': rate,
+        'duration_seconds': elapsed,
+        'spans_created': created,
+        'spans_accepted': accepted,
+        'accepted_per_second': accepted / elapsed,
+        'drop_rate': (created - accepted) / created if created else 0.0,
+        'reports': len(collector.reports),
+        'report_bytes_mean': (sum(report_sizes) / len(report_sizes)
+                              if report_sizes else 0),
+        'report_bytes_max': max(report_sizes) if report_sizes else 0,
+        'flushes': len(flush_timer.latencies),
+        'flush_latency_p50_ms': _percentile(flush_timer.latencies, 0.5) * 1e3,
+        'flush_latency_p99_ms': _percentile(flush_timer.latencies, 0.99) * 1e3,
+        'flush_latency_max_ms': max(flush_timer.latencies or [0]) * 1e3,
+        # CPU spent creating, converting and buffering spans on application
+        # threads, and serializing and sending them on the flush thread.
+        'app_cpu_us_per_span': app_cpu * 1e6 / created if created else 0.0,
+        'flush_cpu_us_per_span': (flush_timer.cpu_seconds * 1e6 / accepted
+                                  if accepted else 0.0),
+        'record_span_p50_us': _percentile(record_timer.latencies, 0.5) * 1e6,
+        'record_span_p99_us': _percentile(record_timer.latencies, 0.99) * 1e6,
+        'record_span_max_us': max(record_timer.latencies or [0]) * 1e6,
+    }
+    if measure_memory:
+        result['memory_growth_kb'] = (memory_end - memory_start) / 1024
+        result['memory_peak_kb'] = (memory_peak - memory_start) / 1024
+    return result
+
+
+def print_result(result):
+    width = max(len(k) for k in result)
+    for key in sorted(result):
+        value = result[key]
+        if isinstance(value, float):
+            value = '{0:.3f}'.format(value)
+        print('{0:<{1}}  {2}'.format(key, width, value))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transport', choices=['http', 'thrift'],
+                        default='http')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2000,
+                        help='target spans/sec across all threads')
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='seconds to generate load for')
+    parser.add_argument('--max-span-records', type=int, default=1000)
+    parser.add_argument('--flush-period', type=float, default=2.5,
+                        help='periodic_flush_seconds for the tracer')
+    parser.add_argument('--tags', type=int, default=5, help='tags per span')
+    parser.add_argument('--logs', type=int, default=1, help='logs per span')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the result to PATH as JSON')
+    args = parser.parse_args(argv)
+
+    with MockCollector() as collector:
+        result = run_load(collector,
+                          transport=args.transport,
+                          threads=args.threads,
+                          rate=args.rate,
+                          duration=args.duration,
+                          max_span_records=args.max_span_records,
+                          periodic_flush_seconds=args.flush_period,
+                          tags=args.tags,
+                          logs=args.logs)
+    print_result(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Measures how many bytes a buffered span costs in each converter's form.
+
+Spans are created, recorded and then dropped while tracemalloc is tracing,
+so what remains allocated is exactly what the recorder's buffer keeps alive,
+including strings it shares with the original spans.
+
+    python -m benchmarks.memory --spans 2000
+"""
+from __future__ import division, print_function
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from .fixtures import finished_span, make_recorder, make_tracer
+
+SHAPES = [(0, 0), (5, 0), (20, 0), (5, 2), (20, 10)]
+
+
+def bytes_per_span(transport, tags, logs, spans):
+    recorder = make_recorder(use_thrift=transport == 'thrift')
+    tracer = make_tracer()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(spans):
+            recorder.record_span(finished_span(tracer, tags, logs, i))
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(recorder._span_records) == spans
+    return (after - before) / spans
+
+
+def run(spans, shapes=SHAPES):
+    results = []
+    for tags, logs in shapes:
+        row = {'tags': tags, 'logs': logs}
+        for transport in ('http', 'thrift'):
+            row[transport] = bytes_per_span(transport, tags, logs, spans)
+        results.append(row)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spans', type=int, default=1000,
+                        help='spans to buffer per measurement')
+    parser.add_argument('--json', metavar='PATH')
+    args = parser.parse_args(argv)
+
+    results = run(args.spans)
+    print('{0:>5} {1:>5} {2:>14} {3:>14}'.format(
+        'tags', 'logs', 'http B/span', 'thrift B/span'))
+    for row in results:
+        print('{tags:>5} {logs:>5} {http:>14.0f} {thrift:>14.0f}'.format(**row))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
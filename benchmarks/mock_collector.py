@@ -0,0 +1,170 @@
+"""An in-process stand-in for a LightStep collector.
+
+MockCollector speaks both report endpoints the tracer uses:
+
+* POST /api/v2/reports          protobuf ReportRequest -> ReportResponse
+* POST /_rpc/v1/reports/binary  thrift ReportingService.Report
+
+It binds to localhost only, so benchmarks and tests run entirely offline.
+Subclasses can change how reports are answered by overriding
+handle_proto_report() and handle_thrift_report().
+"""
+from __future__ import division
+
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from thrift.protocol import TBinaryProtocol
+from thrift.transport import TTransport
+
+from lightstep.collector_pb2 import ReportRequest, ReportResponse
+from lightstep.crouton import ReportingService, ttypes
+
+PROTO_PATH = '/api/v2/reports'
+THRIFT_PATH = '/_rpc/v1/reports/binary'
+
+
+class ReceivedReport(object):
+    """What the collector saw of a single report."""
+    def __init__(self, kind, access_token, num_spans, num_bytes, received_at):
+        self.kind = kind
+        self.access_token = access_token
+        self.num_spans = num_spans
+        self.num_bytes = num_bytes
+        self.received_at = received_at
+
+
+class MockCollector(object):
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _Server((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.collector = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self.reports = []
+        self.keep_spans = False
+        self.spans = []
+        self.connections = 0
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def tracer_kwargs(self):
+        """Keyword arguments pointing a lightstep.Tracer at this collector."""
+        return {
+            'collector_host': self.host,
+            'collector_port': self.port,
+            'collector_encryption': 'none',
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='Mock Collector')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def num_spans(self):
+        with self._lock:
+            return sum(r.num_spans for r in self.reports)
+
+    def clear(self):
+        with self._lock:
+            self.reports = []
+            self.spans = []
+
+    def record(self, kind, access_token, spans, num_bytes):
+        with self._lock:
+            self.reports.append(ReceivedReport(
+                kind, access_token, len(spans), num_bytes, time.time()))
+            if self.keep_spans:
+                self.spans.extend(spans)
+
+    def handle_proto_report(self, request_handler, body):
+        """Answer a protobuf report. Returns (status, response bytes)."""
+        report = ReportRequest.FromString(body)
+        access_token = request_handler.headers.get(
+            'Lightstep-Access-Token', report.auth.access_token)
+        self.record('proto', access_token, report.spans, len(body))
+        return 200, ReportResponse().SerializeToString()
+
+    def handle_thrift_report(self, request_handler, body):
+        """Answer a thrift report. Returns (status, response bytes)."""
+        collector = self
+
+        class Handler(object):
+            def Report(self, auth, request):
+                collector.record('thrift', auth.access_token,
+                                 request.span_records or [], len(body))
+                return ttypes.ReportResponse()
+
+        return 200, _process_thrift(ReportingService.Processor(Handler()), body)
+
+
+def _process_thrift(processor, body):
+    in_transport = TTransport.TMemoryBuffer(body)
+    out_transport = TTransport.TMemoryBuffer()
+    processor.process(TBinaryProtocol.TBinaryProtocol(in_transport),
+                      TBinaryProtocol.TBinaryProtocol(out_transport))
+    return out_transport.getvalue()
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that give up on a slow report (e.g. on a deadline) are
+        # expected; anything else is still printed.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        collector = self.server.collector
+        with collector._lock:
+            collector.connections += 1
+
+    def do_POST(self):
+        collector = self.server.collector
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == PROTO_PATH:
+            status, payload = collector.handle_proto_report(self, body)
+            content_type = 'application/octet-stream'
+        elif self.path == THRIFT_PATH:
+            status, payload = collector.handle_thrift_report(self, body)
+            content_type = 'application/x-thrift'
+        else:
+            status, payload, content_type = 404, b'', 'text/plain'
+        if status is None:
+            # The handler already dealt with the connection itself.
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,90 @@
+"""Throughput and memory of python -m lightstep.replay on a large spool.
+
+Writes a spool of --megabytes of protobuf reports (of 100 spans each) with
+the file exporter, then replays it to a local MockCollector at each
+--concurrency, printing reports per second and the peak of the Python heap
+while replaying:
+
+    python -m benchmarks.replay --megabytes 256 --concurrency 1 4
+
+The collector does not parse the reports, so that it does not compete with
+the replay for the GIL. Segments are memory-mapped: their pages count towards
+the RSS while they are read, but not towards the heap, and the kernel may
+drop them again at any time.
+"""
+from __future__ import division, print_function
+
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from lightstep.collector_pb2 import Auth, ReportResponse
+from lightstep.file_exporter import _FileConnection
+from lightstep.replay import Replayer
+
+from .fixtures import finished_span, make_recorder, make_tracer
+from .mock_collector import MockCollector
+
+
+class _SinkCollector(MockCollector):
+    def handle_proto_report(self, request_handler, body):
+        self.record('proto', request_handler.headers.get(
+            'Lightstep-Access-Token'), [], len(body))
+        return 200, ReportResponse().SerializeToString()
+
+
+def _write_spool(directory, megabytes):
+    recorder = make_recorder()
+    tracer = make_tracer()
+    for i in range(100):
+        recorder.record_span(finished_span(tracer, 10, 2, i))
+    report = recorder._construct_report_request()
+    payload = report.SerializeToString()
+    connection = _FileConnection(directory, False)
+    connection.open()
+    auth = Auth(access_token='replay-token')
+    while connection.stats['bytes_written'] < megabytes << 20:
+        connection.report(auth, report, payload)
+    connection.close()
+    return connection.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--megabytes', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix='lightstep-spool-')
+    try:
+        stats = _write_spool(directory, args.megabytes)
+        print('spool: {0} reports in {1} segments, {2:.0f}MB'.format(
+            stats['reports_written'], stats['segments_written'],
+            stats['bytes_written'] / (1 << 20)))
+        with _SinkCollector() as collector:
+            for concurrency in args.concurrency:
+                collector.clear()
+                tracemalloc.start()
+                replayer = Replayer(collector_host=collector.host,
+                                    collector_port=collector.port,
+                                    collector_encryption='none',
+                                    concurrency=concurrency)
+                start = time.perf_counter()
+                assert replayer.run([directory])
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print('concurrency {0}: {1:8.0f} reports/s {2:6.1f}MB/s'
+                      '   peak heap {3:.1f}MB'.format(
+                          concurrency,
+                          replayer.stats['reports_sent'] / elapsed,
+                          replayer.stats['bytes_sent'] / elapsed / (1 << 20),
+                          peak / (1 << 20)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Resilience and backpressure scenarios: runs the load harness against a
+ChaosCollector once per fault profile and tabulates span loss, memory growth
+and the latency the application threads see in record_span and flush.
+
+    python -m benchmarks.resilience --duration 5
+    python -m benchmarks.resilience --profile errors --profile resets
+"""
+from __future__ import print_function
+
+import argparse
+import json
+
+from .chaos_collector import PROFILES, ChaosCollector
+from .load import run_load
+
+COLUMNS = [
+    ('profile', '{0:<18}'),
+    ('drop_rate', '{0:>9.1%}'),
+    ('memory_growth_kb', '{0:>12.0f}'),
+    ('memory_peak_kb', '{0:>12.0f}'),
+    ('record_span_p99_us', '{0:>12.0f}'),
+    ('record_span_max_us', '{0:>12.0f}'),
+    ('flush_latency_p50_ms', '{0:>12.0f}'),
+    ('flush_latency_max_ms', '{0:>12.0f}'),
+]
+
+
+def run(profiles, **load_kwargs):
+    results = []
+    for profile in profiles:
+        with ChaosCollector(profile) as collector:
+            result = run_load(collector, measure_memory=True, **load_kwargs)
+            result['profile'] = profile.name
+            result['injected_errors'] = collector.injected_errors
+            result['injected_resets'] = collector.injected_resets
+        results.append(result)
+    return results
+
+
+def print_table(results):
+    print(' '.join('{0:>12}'.format(name[:12]) if i else '{0:<18}'.format(name)
+                   for i, (name, _) in enumerate(COLUMNS)))
+    for result in results:
+        print(' '.join(fmt.format(result[name]) for name, fmt in COLUMNS))
+
+
+def main(argv=None):
+    names = [p.name for p in PROFILES]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', action='append', choices=names,
+                        help='fault profile to run (default: all)')
+    parser.add_argument('--transport', choices=['http', 'thrift'],
+                        default='http')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=500)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--flush-period', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=2.0,
+                        help='timeout_seconds for the tracer')
+    parser.add_argument('--json', metavar='PATH')
+    args = parser.parse_args(argv)
+
+    profiles = [p for p in PROFILES
+                if args.profile is None or p.name in args.profile]
+    results = run(profiles,
+                  transport=args.transport,
+                  threads=args.threads,
+                  rate=args.rate,
+                  duration=args.duration,
+                  periodic_flush_seconds=args.flush_period,
+                  timeout_seconds=args.timeout)
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Accelerated soak test for the recorder's buffer.
+
+Pushes millions of spans through record_span and flush against an in-memory
+connection that cycles through successful and failed reports, so the
+restore path (_restore_spans) is exercised constantly. Heap size is sampled
+with tracemalloc throughout; the run fails (exit status 1) if memory keeps
+growing after the warm-up instead of staying bounded.
+
+    python -m benchmarks.soak --spans 2000000 --transport thrift
+"""
+from __future__ import division, print_function
+
+import argparse
+import itertools
+import sys
+import time
+import tracemalloc
+
+from .fixtures import finished_span, make_recorder, make_tracer
+
+# Outcomes of consecutive reports. Runs of failures make restored spans pile
+# up against max_span_records before a success drains them.
+DEFAULT_PATTERN = 'ok,fail,fail,ok,fail,fail,fail,ok'
+
+
+class CyclingConnection(object):
+    """A connection whose reports succeed or fail following a pattern."""
+    def __init__(self, converter, pattern):
+        self._converter = converter
+        self._outcomes = itertools.cycle(pattern)
+        self.ready = True
+        self.delivered = 0
+        self.failed_reports = 0
+
+    def open(self):
+        self.ready = True
+
+    def report(self, auth, report):
+        if next(self._outcomes) == 'fail':
+            self.failed_reports += 1
+            raise Exception('injected report failure')
+        self.delivered += self._converter.num_span_records(report)
+        return None
+
+    def close(self):
+        pass
+
+
+def soak(transport='http', spans=1000000, batch=400, max_span_records=1000,
+         pattern=DEFAULT_PATTERN.split(','), checkpoints=50, warmup=5,
+         tolerance=0.10, tags=5, logs=1, out=sys.stdout):
+    """Run the soak and return (passed, result)."""
+    recorder = make_recorder(use_thrift=transport == 'thrift',
+                             max_span_records=max_span_records)
+    tracer = make_tracer()
+    connection = CyclingConnection(recorder.converter, pattern)
+    # Converting is what costs memory, not creating the BasicSpans, so the
+    # same finished spans are recorded over and over.
+    batch_spans = [finished_span(tracer, tags, logs, i) for i in range(batch)]
+
+    cycles = max(1, spans // batch)
+    # Every window spans whole repetitions of the pattern, so each one sees
+    # the buffer at its fullest.
+    window = max(len(pattern),
+                 cycles // checkpoints // len(pattern) * len(pattern))
+    samples = []
+    window_peak = 0
+    tracemalloc.start()
+    start = time.time()
+    try:
+        for cycle in range(1, cycles + 1):
+            for span in batch_spans:
+                recorder.record_span(span)
+            recorder.flush(connection)
+            window_peak = max(window_peak, tracemalloc.get_traced_memory()[0])
+            if cycle % window == 0:
+                samples.append(window_peak)
+                window_peak = 0
+                print('{0:>10} spans  {1:>10.0f} KiB'.format(
+                    cycle * batch, samples[-1] / 1024), file=out)
+    finally:
+        tracemalloc.stop()
+    elapsed = time.time() - start
+
+    steady = max(samples[:warmup]) if len(samples) > warmup else samples[-1]
+    peak = max(samples[warmup:] or samples)
+    passed = peak <= steady * (1 + tolerance)
+    return passed, {
+        'transport': transport,
+        'spans_recorded': cycles * batch,
+        'spans_delivered': connection.delivered,
+        'failed_reports': connection.failed_reports,
+        'spans_per_second': cycles * batch / elapsed,
+        'warmup_peak_kib': steady / 1024,
+        'peak_kib': peak / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transport', choices=['http', 'thrift'],
+                        default='http')
+    parser.add_argument('--spans', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=400,
+                        help='spans recorded between flushes')
+    parser.add_argument('--max-span-records', type=int, default=1000)
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN,
+                        help='comma separated report outcomes (ok/fail)')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed growth over the warm-up peak')
+    args = parser.parse_args(argv)
+
+    passed, result = soak(transport=args.transport,
+                          spans=args.spans,
+                          batch=args.batch,
+                          max_span_records=args.max_span_records,
+                          pattern=args.pattern.split(','),
+                          tolerance=args.tolerance)
+    for key in sorted(result):
+        print('{0:<18} {1}'.format(key, result[key]))
+    if not passed:
+        print('FAIL: memory grew by more than {0:.0%} after warm-up'.format(
+            args.tolerance))
+        return 1
+    print('PASS: memory stayed bounded')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
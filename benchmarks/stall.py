@@ -0,0 +1,161 @@
+"""How long a flush keeps a cooperative (gevent/eventlet) hub from running
+other greenlets, with and without the recorder's cooperative mode.
+
+Under monkey-patching a greenlet only gives up the hub when it yields: at a
+cooperative yield point, or while waiting on the network. The stall is the
+longest stretch of a flush between two such points. By default this is
+measured directly by timestamping every yield point of flushes against an
+in-memory connection, which needs neither gevent nor a network:
+
+    python -m benchmarks.stall --spans 1000 5000 --transport http
+
+With --gevent (requires gevent) the process is monkey-patched instead, and a
+ticker greenlet waking every millisecond measures how late the hub lets it
+run while flushes to a MockCollector are in progress.
+"""
+from __future__ import division, print_function
+
+import argparse
+import time
+
+from .fixtures import finished_span, make_recorder, make_tracer
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _YieldPoints(object):
+    """Timestamps every point at which a flush lets the hub run."""
+    def __init__(self):
+        self.stalls = []
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def mark(self):
+        now = time.perf_counter()
+        self.stalls.append(now - self._last)
+        self._last = now
+
+
+class _InMemoryConnection(object):
+    """Serializes reports like the real connections do, and counts the send
+    as a yield point, as a network write would be under monkey-patching."""
+    def __init__(self, use_thrift, yield_points):
+        self._yield_points = yield_points
+        if use_thrift:
+            from thrift.TSerialization import serialize
+            self._serialize = serialize
+        else:
+            self._serialize = lambda report: report.SerializeToString()
+        self.ready = True
+
+    def open(self):
+        pass
+
+    def report(self, auth, report, payload=None):
+        if payload is None:
+            payload = self._serialize(report)
+        self._yield_points.mark()
+        return None
+
+    def close(self):
+        pass
+
+
+def measure(transport, cooperative, spans, flushes=5, tags=5, logs=1):
+    """Return the stalls (in seconds) seen over `flushes` flushes of `spans`
+    spans each."""
+    import lightstep.util
+
+    yield_points = _YieldPoints()
+    recorder = make_recorder(use_thrift=transport == 'thrift',
+                             cooperative=cooperative)
+    connection = _InMemoryConnection(recorder.use_thrift, yield_points)
+    tracer = make_tracer()
+    batch = [finished_span(tracer, tags, logs, i) for i in range(spans)]
+
+    original_yield = lightstep.util._cooperative_yield
+    lightstep.util._cooperative_yield = yield_points.mark
+    try:
+        for _ in range(flushes):
+            for span in batch:
+                recorder.record_span(span)
+            yield_points.start()
+            recorder.flush(connection)
+            yield_points.mark()
+    finally:
+        lightstep.util._cooperative_yield = original_yield
+    return yield_points.stalls
+
+
+def measure_gevent(transport, cooperative, spans, flushes=5, tags=5, logs=1):
+    """Like measure(), but with a real hub: returns how late a 1ms ticker
+    greenlet woke up while flushes ran."""
+    import gevent
+
+    from .mock_collector import MockCollector
+
+    lateness = []
+    flushing = [True]
+
+    def ticker():
+        while flushing[0]:
+            expected = time.perf_counter() + 0.001
+            gevent.sleep(0.001)
+            lateness.append(max(0.0, time.perf_counter() - expected))
+
+    with MockCollector() as collector:
+        recorder = make_recorder(use_thrift=transport == 'thrift',
+                                 cooperative=cooperative,
+                                 periodic_flush_seconds=3600,
+                                 **collector.tracer_kwargs())
+        tracer = make_tracer()
+        batch = [finished_span(tracer, tags, logs, i) for i in range(spans)]
+        tick = gevent.spawn(ticker)
+        for _ in range(flushes):
+            for span in batch:
+                recorder.record_span(span)
+            gevent.spawn(recorder.flush).join()
+        flushing[0] = False
+        tick.join()
+        recorder.shutdown(flush=False)
+    return lateness
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transport', choices=['http', 'thrift'],
+                        nargs='+', default=['http', 'thrift'])
+    parser.add_argument('--spans', type=int, nargs='+',
+                        default=[100, 1000, 5000],
+                        help='spans per flush')
+    parser.add_argument('--flushes', type=int, default=5)
+    parser.add_argument('--gevent', action='store_true',
+                        help='monkey-patch with gevent and measure the hub')
+    args = parser.parse_args(argv)
+
+    run = measure
+    if args.gevent:
+        from gevent import monkey
+        monkey.patch_all()
+        run = measure_gevent
+
+    print('{0:<9} {1:>7} {2:<12} {3:>10} {4:>10} {5:>8}'.format(
+        'transport', 'spans', 'mode', 'max ms', 'p99 ms', 'yields'))
+    for transport in args.transport:
+        for spans in args.spans:
+            for cooperative in (False, True):
+                stalls = run(transport, cooperative, spans, args.flushes)
+                print('{0:<9} {1:>7} {2:<12} {3:>10.3f} {4:>10.3f} {5:>8}'.format(
+                    transport, spans,
+                    'cooperative' if cooperative else 'default',
+                    max(stalls) * 1e3, _percentile(stalls, 0.99) * 1e3,
+                    len(stalls)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""An in-process receiver for the datagrams of the UDP transport
+(agent_udp_address).
+
+UDPReceiver binds to localhost only and records each datagram as a
+ReceivedReport, like MockCollector does for HTTP reports. With parse=False it
+only counts datagrams and bytes, so that a benchmark's receiving thread does
+not compete with the code under test for the GIL.
+"""
+import io
+import socket
+import threading
+import time
+
+from thrift.TSerialization import deserialize
+
+from lightstep import framing
+from lightstep.collector_pb2 import ReportRequest
+from lightstep.crouton import ttypes
+
+from .mock_collector import ReceivedReport
+
+
+class UDPReceiver(object):
+    def __init__(self, host='127.0.0.1', port=0, parse=True):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self._socket.bind((host, port))
+        self._socket.settimeout(0.1)
+        self._parse = parse
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self.reports = []
+        self.spans = []
+        self.datagrams = 0
+        self.num_bytes = 0
+        self.max_datagram_bytes = 0
+
+    @property
+    def host(self):
+        return self._socket.getsockname()[0]
+
+    @property
+    def port(self):
+        return self._socket.getsockname()[1]
+
+    def tracer_kwargs(self):
+        """Keyword arguments pointing a lightstep.Tracer at this receiver."""
+        return {'agent_udp_address': '{0}:{1}'.format(self.host, self.port)}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._receive,
+                                        name='UDP Receiver')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._socket.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def num_spans(self):
+        with self._lock:
+            return sum(r.num_spans for r in self.reports)
+
+    def _receive(self):
+        while not self._stopped.is_set():
+            try:
+                datagram = self._socket.recv(1 << 16)
+            except socket.timeout:
+                continue
+            with self._lock:
+                self.datagrams += 1
+                self.num_bytes += len(datagram)
+                self.max_datagram_bytes = max(self.max_datagram_bytes,
+                                              len(datagram))
+            if self._parse:
+                self._record(datagram)
+
+    def _record(self, datagram):
+        kind, access_token, payload = framing.read_frame(
+            io.BytesIO(datagram).read)
+        if kind == framing.KIND_PROTO:
+            spans = list(ReportRequest.FromString(payload).spans)
+            kind = 'proto'
+        else:
+            report = deserialize(ttypes.ReportRequest(), payload)
+            spans = report.span_records or []
+            kind = 'thrift'
+        with self._lock:
+            self.reports.append(ReceivedReport(
+                kind, access_token, len(spans), len(datagram), time.time()))
+            self.spans.extend(spans)
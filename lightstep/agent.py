@@ -0,0 +1,349 @@
+"""
+A local forwarding agent for LightStep reports.
+
+Tracers created with agent_socket=PATH write their reports to the agent over
+a Unix domain socket instead of sending them to the collector themselves;
+tracers created with agent_udp_address=HOST:PORT send them as datagrams.
+The agent buffers the spans it receives from every local process, and once
+per flush period forwards them upstream as one report per reporting process
+and access token, over a single kept-alive connection per protocol:
+
+    python -m lightstep.agent --socket /run/lightstep.sock \\
+        --udp 127.0.0.1:6831 \\
+        --collector-host collector.lightstep.com --collector-port 443
+
+Listening on a Unix domain socket requires a POSIX system.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import signal
+import socket
+import threading
+import traceback
+
+from six.moves import socketserver
+
+from . import constants
+from . import framing
+from . import util
+
+
+class _Batch(object):
+    """The spans buffered for one reporting process and access token."""
+    def __init__(self, key, kind, access_token, reporter):
+        self.key = key
+        self.kind = kind
+        self.access_token = access_token
+        self.reporter = reporter
+        self.spans = []
+
+
+class Agent(object):
+    """Accepts framed reports on socket_path and udp_address and forwards
+    them upstream.
+
+    :param str socket_path: the Unix domain socket to listen on, if any
+    :param str collector_host: LightStep collector hostname
+    :param int collector_port: LightStep collector port
+    :param str collector_encryption: one of 'tls' or 'none'
+    :param float flush_period: seconds between upstream reports
+    :param int max_spans: spans buffered across all processes; further spans
+        are dropped until the next flush
+    :param float timeout_seconds: timeout for upstream reports
+    :param int verbosity: 1 to print upstream errors
+    :param str udp_address: 'host:port' to listen on for datagrams, if any
+    """
+    def __init__(self,
+                 socket_path=None,
+                 collector_host='collector.lightstep.com',
+                 collector_port=443,
+                 collector_encryption='tls',
+                 flush_period=constants.FLUSH_PERIOD_SECS,
+                 max_spans=10 * constants.DEFAULT_MAX_SPAN_RECORDS,
+                 timeout_seconds=30,
+                 verbosity=0,
+                 udp_address=None):
+        if socket_path is None and udp_address is None:
+            raise Exception('socket_path or udp_address is required')
+        self._socket_path = socket_path
+        self._udp_address = udp_address
+        self._secure = collector_encryption != 'none'
+        self._collector_host = collector_host
+        self._collector_port = collector_port
+        self._flush_period = flush_period
+        self._max_spans = max_spans
+        self._timeout_seconds = timeout_seconds
+        self._verbosity = verbosity
+
+        self._lock = threading.Lock()
+        self._batches = {}
+        self._num_spans = 0
+        self._connections = {}
+        self._servers = []
+        self._threads = []
+        self._stopped = threading.Event()
+        self.stats = {
+            'frames_received': 0,
+            'frame_errors': 0,
+            'spans_received': 0,
+            'spans_dropped': 0,
+            'reports_sent': 0,
+            'report_errors': 0,
+        }
+
+    @property
+    def udp_port(self):
+        """The port datagrams are received on (useful with port 0)."""
+        for server in self._servers:
+            if isinstance(server, _UDPServer):
+                return server.server_address[1]
+        return None
+
+    def start(self):
+        if self._socket_path is not None:
+            if os.path.exists(self._socket_path):
+                # Left behind by an agent that did not shut down cleanly.
+                os.unlink(self._socket_path)
+            self._servers.append(_Server(self._socket_path, _Handler))
+        if self._udp_address is not None:
+            host, port = self._udp_address.rsplit(':', 1)
+            self._servers.append(
+                _UDPServer((host.strip('[]'), int(port)), _DatagramHandler))
+        targets = [(self._flush_periodically, 'Agent Flush')]
+        for server in self._servers:
+            server.agent = self
+            targets.append((server.serve_forever, 'Agent Server'))
+        for target, name in targets:
+            thread = threading.Thread(target=target, name=name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, flush=True):
+        self._stopped.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if flush:
+            self.flush()
+        for connection in self._connections.values():
+            connection.close()
+        if self._socket_path is not None and os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def receive(self, kind, access_token, payload):
+        """Buffer the spans of one framed report."""
+        if kind == framing.KIND_PROTO:
+            from lightstep.collector_pb2 import ReportRequest
+            report = ReportRequest.FromString(payload)
+            reporter, reporter_id, spans = \
+                report.reporter, report.reporter.reporter_id, report.spans
+        else:
+            from thrift.TSerialization import deserialize
+            from lightstep.crouton import ttypes
+            report = deserialize(ttypes.ReportRequest(), payload)
+            reporter, spans = report.runtime, report.span_records or []
+            reporter_id = reporter.guid if reporter is not None else None
+
+        key = (kind, access_token, reporter_id)
+        with self._lock:
+            self.stats['frames_received'] += 1
+            self.stats['spans_received'] += len(spans)
+            room = max(0, self._max_spans - self._num_spans)
+            if len(spans) > room:
+                self.stats['spans_dropped'] += len(spans) - room
+                spans = spans[:room]
+            if not spans:
+                return
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = self._batches[key] = _Batch(key, kind, access_token,
+                                                    reporter)
+            batch.spans.extend(spans)
+            self._num_spans += len(spans)
+
+    def flush(self):
+        """Forward everything buffered. Returns whether all reports were
+        accepted."""
+        with self._lock:
+            batches = list(self._batches.values())
+            self._batches = {}
+            self._num_spans = 0
+
+        ok = True
+        for batch in batches:
+            try:
+                self._connection(batch.kind).report(*self._report(batch))
+                with self._lock:
+                    self.stats['reports_sent'] += 1
+            except Exception as e:
+                ok = False
+                with self._lock:
+                    self.stats['report_errors'] += 1
+                    self._restore(batch)
+                if self._verbosity >= 1:
+                    print('[LightStep Agent]: report failed: {0}, stack trace: {1}'.format(
+                        e, traceback.format_exc()))
+        return ok
+
+    def _restore(self, batch):
+        """Put the spans of a failed report back, as far as they fit."""
+        room = max(0, self._max_spans - self._num_spans)
+        spans = list(batch.spans)[:room]
+        if not spans:
+            return
+        current = self._batches.get(batch.key)
+        if current is not None:
+            spans.extend(current.spans)
+        batch.spans = spans
+        self._batches[batch.key] = batch
+        self._num_spans += len(spans)
+
+    def _report(self, batch):
+        """The (auth, report) arguments for the upstream connection."""
+        if batch.kind == framing.KIND_PROTO:
+            from lightstep.collector_pb2 import Auth, ReportRequest
+            auth = Auth(access_token=batch.access_token)
+            return auth, ReportRequest(reporter=batch.reporter, auth=auth,
+                                       spans=batch.spans)
+        from lightstep.crouton import ttypes
+        return (ttypes.Auth(batch.access_token),
+                ttypes.ReportRequest(batch.reporter, batch.spans, None))
+
+    def _connection(self, kind):
+        connection = self._connections.get(kind)
+        if connection is None:
+            use_thrift = kind == framing.KIND_THRIFT
+            url = util._collector_url_from_hostport(
+                self._secure, self._collector_host, self._collector_port,
+                use_thrift)
+            if use_thrift:
+                from lightstep.thrift_connection import _ThriftConnection
+                connection = _ThriftConnection(url)
+            else:
+                from lightstep.http_connection import _HTTPConnection
+                connection = _HTTPConnection(url, self._timeout_seconds)
+            self._connections[kind] = connection
+        if not connection.ready:
+            connection.open()
+        return connection
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self._flush_period):
+            self.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        agent = self.server.agent
+        while True:
+            try:
+                frame = framing.read_frame(self.rfile.read)
+            except (framing.FrameError, OSError):
+                frame = False
+            if not frame:
+                if frame is False:
+                    with agent._lock:
+                        agent.stats['frame_errors'] += 1
+                return
+            try:
+                agent.receive(*frame)
+            except Exception:
+                with agent._lock:
+                    agent.stats['frame_errors'] += 1
+
+
+class _UDPServer(socketserver.UDPServer):
+    # Datagrams are small and cheap to parse; a large receive buffer absorbs
+    # the burst of datagrams of a flush.
+    receive_buffer_bytes = 4 << 20
+
+    def __init__(self, address, handler):
+        family = socket.getaddrinfo(address[0], address[1], 0,
+                                    socket.SOCK_DGRAM)[0][0]
+        self.address_family = family
+        socketserver.UDPServer.__init__(self, address, handler)
+
+    def server_bind(self):
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                                   self.receive_buffer_bytes)
+        except (OSError, socket.error):
+            pass
+        socketserver.UDPServer.server_bind(self)
+
+
+class _DatagramHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        agent = self.server.agent
+        try:
+            frame = framing.read_frame(io.BytesIO(self.request[0]).read)
+            agent.receive(*frame)
+        except Exception:
+            with agent._lock:
+                agent.stats['frame_errors'] += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--socket',
+                        help='Unix domain socket to listen on')
+    parser.add_argument('--udp', metavar='HOST:PORT',
+                        help='address to listen on for datagrams')
+    parser.add_argument('--collector-host', default='collector.lightstep.com')
+    parser.add_argument('--collector-port', type=int, default=443)
+    parser.add_argument('--collector-encryption', choices=['tls', 'none'],
+                        default='tls')
+    parser.add_argument('--flush-period', type=float,
+                        default=constants.FLUSH_PERIOD_SECS,
+                        help='seconds between upstream reports')
+    parser.add_argument('--max-spans', type=int,
+                        default=10 * constants.DEFAULT_MAX_SPAN_RECORDS,
+                        help='spans buffered before new ones are dropped')
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='timeout for upstream reports, in seconds')
+    parser.add_argument('-v', '--verbose', action='count', default=0)
+    args = parser.parse_args(argv)
+    if args.socket is None and args.udp is None:
+        parser.error('--socket or --udp is required')
+
+    agent = Agent(args.socket,
+                  collector_host=args.collector_host,
+                  collector_port=args.collector_port,
+                  collector_encryption=args.collector_encryption,
+                  flush_period=args.flush_period,
+                  max_spans=args.max_spans,
+                  timeout_seconds=args.timeout,
+                  verbosity=args.verbose,
+                  udp_address=args.udp)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    agent.start()
+    try:
+        while not stopped.wait(3600):
+            pass
+    except KeyboardInterrupt:
+        pass
+    agent.stop()
+    if args.verbose:
+        print('[LightStep Agent]: {0}'.format(agent.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+""" Connection class that POSTs Proto Report Requests from an asyncio event
+    loop, using asyncio streams over a kept-alive HTTP/1.1 connection.
+"""
+import asyncio
+import ssl
+from urllib.parse import urlparse
+
+from lightstep.collector_pb2 import ReportResponse
+
+
+class _StaleConnection(ConnectionError):
+    """The collector closed a kept-alive connection before answering."""
+
+
+class _AsyncHTTPConnection(object):
+    """Instances of _AsyncHTTPConnection send reports to the collector without
+    blocking the event loop they are used from.
+
+    The connection is opened on the first report and kept open between
+    reports; it is re-established transparently if the collector closed it
+    while idle.
+    """
+    def __init__(self, collector_url, timeout_seconds, ssl_context=None):
+        url = urlparse(collector_url)
+        secure = url.scheme == 'https'
+        self._host = url.hostname
+        self._port = url.port or (443 if secure else 80)
+        self._path = url.path or '/'
+        self._ssl = (ssl_context or ssl.create_default_context()) if secure else None
+        self._timeout_seconds = timeout_seconds
+        self._reader = None
+        self._writer = None
+        self._loop = None
+        self._lock = None
+        self.ready = True
+
+    def open(self):
+        """The connection is established lazily by report()."""
+        pass
+
+    # May throw an Exception on failure.
+    async def report(self, auth, report):
+        """Report to the server."""
+        report.auth.access_token = auth.access_token
+        body = report.SerializeToString()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Streams and locks belong to the loop that created them.
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._reader = None
+            self._writer = None
+        async with self._lock:
+            try:
+                return await asyncio.wait_for(
+                    self._post(auth.access_token, body), self._timeout_seconds)
+            except BaseException:
+                # Whatever state the stream is in, it cannot be reused.
+                self._disconnect()
+                raise
+
+    async def _post(self, access_token, body):
+        request = (
+            'POST {0} HTTP/1.1\r\n'
+            'Host: {1}:{2}\r\n'
+            'Content-Type: application/octet-stream\r\n'
+            'Accept: application/octet-stream\r\n'
+            'Lightstep-Access-Token: {3}\r\n'
+            'Content-Length: {4}\r\n'
+            '\r\n'
+        ).format(self._path, self._host, self._port, access_token,
+                 len(body)).encode('latin-1') + body
+
+        reused = self._writer is not None
+        if not reused:
+            await self._connect()
+        try:
+            return await self._exchange(request)
+        except ConnectionError:
+            if not reused:
+                raise
+            # The collector dropped the idle connection; try a fresh one once.
+            self._disconnect()
+            await self._connect()
+            return await self._exchange(request)
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self._host, self._port, ssl=self._ssl,
+            server_hostname=self._host if self._ssl else None)
+
+    async def _exchange(self, request):
+        self._writer.write(request)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise _StaleConnection()
+        status = int(status_line.split(None, 2)[1])
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            content = await self._reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self._read_chunked()
+        else:
+            content = await self._reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            self._disconnect()
+
+        # An error page does not parse as a ReportResponse reliably, so treat
+        # error statuses as failed reports explicitly.
+        if not 200 <= status < 300:
+            raise Exception('collector responded with HTTP status {0}'.format(status))
+        resp = ReportResponse()
+        resp.ParseFromString(content)
+        return resp
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self._reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                # Skip any trailers.
+                while (await self._reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self._reader.readexactly(size))
+            await self._reader.readline()
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        """Close the connection to the server."""
+        self.ready = False
+        writer = self._writer
+        self._disconnect()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
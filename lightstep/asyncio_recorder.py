@@ -0,0 +1,157 @@
+"""
+A Recorder that reports from the asyncio event loop instead of a thread.
+
+Requires Python 3.7 or newer and reports protobuf over HTTP only. Spans are
+converted and buffered exactly as by Recorder; flushing runs in an asyncio
+task on the loop that recorded the first span, and sends reports with
+non-blocking sockets. flush() and shutdown() are coroutines.
+"""
+import asyncio
+import atexit
+import ssl
+import traceback
+
+from .asyncio_connection import _AsyncHTTPConnection
+from .recorder import Recorder
+
+# Recorder options that need a flush thread, or a transport other than
+# HTTP, neither of which AsyncRecorder has.
+_UNSUPPORTED_OPTIONS = (
+    'inline_flush',
+    'serverless',
+    'prewarm',
+    'shared_ring_dir',
+    'agent_socket',
+    'agent_udp_address',
+    'use_grpc',
+    'collector_endpoints',
+    'destinations',
+    'export_dir',
+)
+
+
+class AsyncRecorder(Recorder):
+    """AsyncRecorder translates, buffers, and reports basictracer.BasicSpans
+    from an asyncio event loop.
+
+    Accepts the same arguments as Recorder, except use_thrift and the
+    options of other transports and flush modes (see _UNSUPPORTED_OPTIONS),
+    which raise an Exception rather than being ignored.
+    """
+    def __init__(self, certificate_verification=True, use_thrift=False,
+                 use_http=True, **kwargs):
+        if use_thrift or not use_http:
+            raise Exception('AsyncRecorder only supports use_http')
+        unsupported = [option for option in _UNSUPPORTED_OPTIONS
+                       if kwargs.get(option)]
+        if unsupported:
+            raise Exception('AsyncRecorder does not support {0}'.format(
+                ', '.join(unsupported)))
+        super(AsyncRecorder, self).__init__(
+            certificate_verification=certificate_verification,
+            use_thrift=False, use_http=True, **kwargs)
+        # shutdown() is a coroutine, which atexit cannot run. Applications
+        # should `await recorder.shutdown()` (or leave an `async with
+        # tracer` block) before their loop stops.
+        atexit.unregister(self.shutdown)
+
+        self._ssl_context = None
+        if not certificate_verification:
+            self._ssl_context = ssl.create_default_context()
+            self._ssl_context.check_hostname = False
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+        self._flush_task = None
+
+    def _maybe_init_flush_thread(self):
+        """Start the periodic flush task on the running event loop, unless
+        periodic flushes are disabled or the task is already running.
+
+        Outside of a running loop nothing is started; the task starts with the
+        first span recorded (or flush) from within one.
+        """
+        task = self._flush_task
+        if task is not None and not task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        if self._flush_connection is None:
+            self._flush_connection = _AsyncHTTPConnection(
+                self._collector_url, self._timeout_seconds, self._ssl_context)
+        if self._periodic_flush_seconds > 0:
+            self._flush_task = loop.create_task(self._flush_periodically())
+
+    async def flush(self, connection=None):
+        """Immediately send unreported data to the server.
+
+        Returns whether the data was successfully flushed.
+        """
+        if self._disabled_runtime:
+            return False
+
+        if connection is None:
+            self._maybe_init_flush_thread()
+            connection = self._flush_connection
+        return await self._flush_worker(connection)
+
+    async def shutdown(self, flush=True):
+        """Optionally flush the remaining spans, then stop the flush task,
+        close the connection and disable the Recorder.
+
+        Returns whether the data was successfully flushed.
+        """
+        if self._disabled_runtime:
+            return False
+
+        flushed = False
+        if flush:
+            self._release_tail_sampled(everything=True)
+            flushed = await self.flush()
+
+        self._disabled_runtime = True
+
+        task = self._flush_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        if self._flush_connection:
+            await self._flush_connection.close()
+
+        return flushed
+
+    async def _flush_periodically(self):
+        """Periodically send reports to the server.
+
+        Runs as an asyncio task (self._flush_task).
+        """
+        while not self._disabled_runtime:
+            await self._flush_worker(self._flush_connection)
+            await asyncio.sleep(self._periodic_flush_seconds)
+
+    async def _flush_worker(self, connection):
+        """Use the given connection to transmit the current spans as a report
+        request."""
+        if connection is None:
+            return False
+
+        self._release_tail_sampled()
+        report_request = self._construct_report_request()
+        try:
+            self._finest("Attempting to send report to collector: {0}", (report_request,))
+            resp = await connection.report(self._auth, report_request)
+            self._finest("Received response from collector: {0}", (resp,))
+
+            for command in resp.commands:
+                if command.disable:
+                    await self.shutdown(flush=False)
+            # Return whether we sent any span data
+            return self.converter.num_span_records(report_request) > 0
+
+        except Exception as e:
+            self._fine(
+                "Caught exception during report: {0}, stack trace: {1}",
+                (e, traceback.format_exc())
+            )
+            self._restore_spans(report_request)
+            return False
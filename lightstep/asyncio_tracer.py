@@ -0,0 +1,58 @@
+"""
+LightStep's OpenTracing implementation for asyncio applications.
+
+Requires Python 3.7 or newer. Spans are reported from the event loop by an
+AsyncRecorder, and the active Scope is tracked with contextvars:
+
+    tracer = lightstep.asyncio_tracer.AsyncTracer(access_token=...)
+    async with tracer:
+        with tracer.start_active_span('request'):
+            ...
+        await tracer.flush()
+"""
+from __future__ import absolute_import
+
+from .asyncio_recorder import AsyncRecorder
+from .scope_manager import ContextVarsScopeManager
+from .tracer import _LightstepTracer
+
+
+def AsyncTracer(**kwargs):
+    """Instantiates LightStep's OpenTracing implementation for asyncio.
+
+    Accepts the same arguments as lightstep.Tracer(), except use_thrift and
+    those AsyncRecorder does not support. The scope_manager defaults to a
+    ContextVarsScopeManager.
+    """
+    enable_binary_format = not kwargs.pop('disable_binary_format', False)
+    scope_manager = kwargs.pop('scope_manager', None)
+    if scope_manager is None:
+        scope_manager = ContextVarsScopeManager()
+    sampler = kwargs.pop('sampler', None)
+
+    return _AsyncLightstepTracer(enable_binary_format,
+                                 AsyncRecorder(**kwargs),
+                                 scope_manager,
+                                 sampler)
+
+
+class _AsyncLightstepTracer(_LightstepTracer):
+    async def flush(self):
+        """Force a flush of buffered Span data to the LightStep collector.
+
+        Returns whether any span data was sent.
+        """
+        return await self.recorder.flush()
+
+    async def shutdown(self):
+        """Flush the remaining Span data and stop reporting."""
+        return await self.recorder.shutdown()
+
+    def __enter__(self):
+        raise TypeError('use "async with" with an asyncio tracer')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.flush()
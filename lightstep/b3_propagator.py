@@ -6,6 +6,9 @@ from basictracer.context import SpanContext
 from opentracing import SpanContext as OTSpanContext
 from opentracing import SpanContextCorruptedException
 
+from lightstep.sampler import _UndecidedSpanContext
+from lightstep.util import _generate_id
+
 _LOG = getLogger(__name__)
 _SINGLE_HEADER = "b3"
 # Lower case is used here as the B3 specification recommends
@@ -16,13 +19,28 @@ _SAMPLED = "x-b3-sampled"
 _FLAGS = "x-b3-flags"
 
 
+def _is_sampled(value):
+    return str(value).lower() in ("1", "true", "d")
+
+
 class B3Propagator(Propagator):
     """
     Propagator for the B3 HTTP header format.
 
     See: https://github.com/openzipkin/b3-propagation
+
+    Extracted contexts carry the upstream sampling decision (x-b3-sampled, or
+    x-b3-flags: 1 for debug), so that a trace the caller did not sample is
+    not recorded here either. A context without one is left to the Tracer's
+    sampler.
+
+    :param bool honor_sampled: if False, the upstream decision is ignored
+        and the Tracer's sampler decides on every extracted trace
     """
 
+    def __init__(self, honor_sampled=True):
+        self._honor_sampled = honor_sampled
+
     def inject(self, span_context, carrier):
 
         traceid = span_context.trace_id
@@ -39,9 +57,14 @@ class B3Propagator(Propagator):
             carrier[_FLAGS] = str(flags)
 
         sampled = baggage.pop(_SAMPLED, None)
+        if sampled is not None and flags != 1 and \
+                not isinstance(span_context, _UndecidedSpanContext) and \
+                _is_sampled(sampled) != bool(span_context.sampled):
+            # Decided here since it was received, e.g. by sampling.priority.
+            sampled = None
 
         if sampled is None:
-            carrier[_SAMPLED] = "1"
+            carrier[_SAMPLED] = "0" if span_context.sampled is False else "1"
         else:
             if flags == 1:
                 _LOG.warning(
@@ -92,6 +115,7 @@ class B3Propagator(Propagator):
 
         carrier = case_insensitive_carrier
         baggage = {}
+        traceid = spanid = sampled = flags = None
 
         if _SINGLE_HEADER in carrier.keys():
             fields = carrier.pop(_SINGLE_HEADER).split("-", 4)
@@ -108,7 +132,7 @@ class B3Propagator(Propagator):
                 baggage[_PARENTSPANID] = int(parent_spanid, 16)
             if sampled == "d":
                 baggage[_FLAGS] = 1
-            else:
+            elif sampled is not None:
                 baggage[_SAMPLED] = int(sampled, 16)
         else:
             traceid = carrier.pop(_TRACEID, None)
@@ -139,8 +163,30 @@ class B3Propagator(Propagator):
             if baggage == OTSpanContext.EMPTY_BAGGAGE:
                 baggage = None
 
-        return SpanContext(
+        context = SpanContext
+        decision = True
+        if not self._honor_sampled:
+            context = _UndecidedSpanContext
+        elif flags is not None and _is_sampled(flags):
+            decision = True
+        elif sampled is not None:
+            decision = _is_sampled(sampled)
+        else:
+            context = _UndecidedSpanContext
+
+        if traceid is None or spanid is None:
+            # Only the sampling state was propagated ("b3: 0"): a new trace,
+            # which follows it.
+            return context(
+                trace_id=_generate_id(),
+                span_id=_generate_id(),
+                baggage=baggage,
+                sampled=decision
+            )
+
+        return context(
             trace_id=int(traceid, 16),
             span_id=int(spanid, 16),
-            baggage=baggage
+            baggage=baggage,
+            sampled=decision
         )
@@ -4,6 +4,58 @@
 FLUSH_THREAD_NAME = 'Flush Thread'
 FLUSH_PERIOD_SECS = 2.5
 DEFAULT_MAX_SPAN_RECORDS = 1000
+# The default timeout of a report, and that with inline_flush, where the
+# application call that flushes may have to wait for the report.
+DEFAULT_TIMEOUT_SECS = 30
+INLINE_FLUSH_TIMEOUT_SECS = 1.0
+# Size of each process' ring with shared_ring_dir.
+DEFAULT_SHARED_RING_BYTES = 4 << 20
+# In cooperative mode, the number of spans serialized between two yields to
+# other greenlets.
+COOPERATIVE_CHUNK_SPANS = 50
+# Largest datagram sent with agent_udp_address: an Ethernet MTU of 1500 bytes
+# less the IPv4 and UDP headers, so that datagrams are never fragmented.
+DEFAULT_UDP_DATAGRAM_BYTES = 1472
+# With use_grpc, the interval of keepalive pings on the collector channel.
+GRPC_KEEPALIVE_SECS = 30
+# With collector_endpoints, how long resolved addresses are cached, and when
+# and for how long an endpoint is ejected from the pool.
+DNS_TTL_SECS = 30
+SATELLITE_EJECT_AFTER_FAILURES = 3
+SATELLITE_EJECT_ERROR_RATE = 0.5
+SATELLITE_EJECT_SECONDS = 5
+SATELLITE_MAX_EJECT_SECONDS = 60
+# With destinations, the reports waiting for each destination, and the bounds
+# of the backoff between retries of a failed report.
+FANOUT_MAX_PENDING_REPORTS = 16
+FANOUT_MIN_BACKOFF_SECS = 1
+FANOUT_MAX_BACKOFF_SECS = 30
+# With export_dir, the size segment files are capped at, and the buffer their
+# writes go through.
+DEFAULT_EXPORT_SEGMENT_BYTES = 64 << 20
+EXPORT_WRITE_BUFFER_BYTES = 1 << 20
+# The first backoff of python -m lightstep.replay between retries of a report.
+REPLAY_RETRY_SECS = 1
+
+# AdaptiveSampler: the rate every operation is sampled at, how often rates are
+# adapted, how many operation names are tracked, how fast estimates come down
+# (the weight of the latest window), and how many windows without a trace an
+# operation is forgotten after.
+ADAPTIVE_MIN_TRACES_PER_SEC = 0.1
+ADAPTIVE_WINDOW_SECS = 1.0
+ADAPTIVE_MAX_OPERATIONS = 1000
+ADAPTIVE_DECAY = 0.8
+ADAPTIVE_FORGET_AFTER_WINDOWS = 300
+
+# TailSampler: how long spans wait for their trace's root span, and how many
+# traces and spans are held at most.
+TAIL_DECISION_WAIT_SECS = 5.0
+TAIL_MAX_TRACES = 10000
+TAIL_MAX_SPANS = 100000
+
+# LightStep requires trace_ids to be 64 bits long; longer ids (such as 128 bit
+# ids received through trace context headers) are truncated to their low bits.
+TRACE_ID_MASK = (1 << 64) - 1
 
 # Reserved Span keys
 PARENT_SPAN_GUID = 'parent_span_guid'
@@ -32,7 +32,9 @@ class Converter(object):
         pass
 
     @abstractmethod
-    def create_report(self, runtime, span_records):
+    def create_report(self, runtime, span_records, chunk_spans=None, pause=None):
+        """Build a report request. If pause is given, it is called after
+        every chunk_spans spans."""
         pass
 
     @abstractmethod
@@ -50,3 +52,20 @@ class Converter(object):
     @abstractmethod
     def get_span_name(self, span_record):
         pass
+
+    @abstractmethod
+    def serialize_span_record(self, span_record):
+        """Encode a single span record as bytes, e.g. for a shared ring."""
+        pass
+
+    @abstractmethod
+    def parse_span_record(self, data):
+        """Decode a span record encoded by serialize_span_record."""
+        pass
+
+    def serialize_report(self, auth, report_request, chunk_spans, pause):
+        """Serialize report_request for the wire, calling pause() after every
+        chunk_spans spans. Returns None if the format cannot be serialized
+        incrementally, in which case the connection serializes it.
+        """
+        return None
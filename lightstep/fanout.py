@@ -0,0 +1,285 @@
+""" A connection that sends every report to several destinations (e.g. an
+    old and a new project during a migration), converting and serializing
+    each report only once.
+
+    Both encodings allow the same trick: a message is the concatenation of
+    its fields, so the report is serialized once, without auth, and each
+    destination adds its own auth field to those bytes.
+"""
+import collections
+import threading
+import traceback
+
+from . import constants
+from . import util
+
+
+class _Destination(object):
+    """One destination: its connection, its queue of pending reports, and
+    the thread that sends them.
+
+    Reports that fail are retried with an exponential backoff. At most
+    max_pending reports wait for a destination; beyond that the oldest is
+    dropped, so a destination that is down costs bounded memory.
+    """
+    def __init__(self, name, access_token, connection, use_thrift,
+                 max_pending, verbosity):
+        self.name = name
+        self._connection = connection
+        self._use_thrift = use_thrift
+        self._max_pending = max_pending
+        self._verbosity = verbosity
+        if use_thrift:
+            from lightstep.crouton import ttypes
+            from lightstep.crouton.ReportingService import Report_args
+            from thrift.Thrift import TMessageType
+            self._auth = ttypes.Auth(access_token)
+
+            def write_call(protocol):
+                protocol.writeMessageBegin('Report', TMessageType.CALL, 0)
+                Report_args(auth=self._auth).write(protocol)
+                protocol.writeMessageEnd()
+            # The start of the Report call, up to and including its auth
+            # field: the struct's stop byte is left to the report's bytes.
+            self._call_head = _serialize_thrift(write_call)[:-1]
+            self._placeholder = None
+        else:
+            from lightstep.collector_pb2 import Auth, ReportRequest
+            self._auth = Auth(access_token=access_token)
+            # Appending a serialized field to a message sets that field, so
+            # this turns the shared serialization of a report into this
+            # destination's.
+            self._auth_field = ReportRequest(auth=self._auth).SerializeToString()
+            # Passed along with the payload, which _HTTPConnection sends as
+            # is; only its auth field gets set.
+            self._placeholder = ReportRequest()
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._in_flight = False
+        self._closed = False
+        self._disabled = False
+        self._backoff = 0
+        self._thread = None
+        self.stats = {
+            'reports_sent': 0,
+            'report_errors': 0,
+            'reports_dropped': 0,
+            'spans_sent': 0,
+        }
+
+    def put(self, data, num_spans):
+        """Queue a report for sending; `data` is its serialization without
+        auth."""
+        with self._cond:
+            if self._closed or self._disabled:
+                return
+            if len(self._pending) >= self._max_pending:
+                self._pending.popleft()
+                self.stats['reports_dropped'] += 1
+            self._pending.append((data, num_spans))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='Fan-out {0}'.format(self.name))
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """Wait until everything queued was sent (or given up on). Returns
+        whether it was."""
+        deadline = util._monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = deadline - util._monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self):
+        """Drop what is still pending and let the thread exit."""
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def join(self, timeout):
+        """Wait up to timeout seconds for the thread, which closes the
+        connection as it exits: closing it here would wait for a send still
+        in flight."""
+        with self._cond:
+            thread = self._thread
+        if thread is None:
+            self._connection.close()
+        else:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    break
+                item = self._pending.popleft()
+                self._in_flight = True
+            ok = self._send(*item)
+            with self._cond:
+                self._in_flight = False
+                if ok:
+                    self._backoff = 0
+                elif not self._closed and not self._disabled:
+                    if len(self._pending) < self._max_pending:
+                        self._pending.appendleft(item)
+                    else:
+                        self.stats['reports_dropped'] += 1
+                    self._backoff = min(
+                        constants.FANOUT_MAX_BACKOFF_SECS,
+                        max(constants.FANOUT_MIN_BACKOFF_SECS,
+                            2 * self._backoff))
+                    # Woken early by close().
+                    self._cond.notify_all()
+                    self._cond.wait(self._backoff)
+                self._cond.notify_all()
+        self._connection.close()
+
+    def _send(self, data, num_spans):
+        try:
+            if not self._connection.ready:
+                self._connection.open()
+            if self._use_thrift:
+                data = self._call_head + data
+            else:
+                data = data + self._auth_field
+            response = self._connection.report(
+                self._auth, self._placeholder, data)
+        except Exception as e:
+            with self._cond:
+                self.stats['report_errors'] += 1
+            if self._verbosity >= 1:
+                print('[LightStep Tracer]: report to {0} failed: {1}, stack trace: {2}'.format(
+                    self.name, e, traceback.format_exc()))
+            return False
+        with self._cond:
+            self.stats['reports_sent'] += 1
+            self.stats['spans_sent'] += num_spans
+            if response is not None and any(
+                    command.disable for command in response.commands or []):
+                # Stop reporting to this destination only.
+                self._disabled = True
+                self._pending.clear()
+        return True
+
+
+class _FanOutConnection(object):
+    """A connection that hands each report to every destination.
+
+    Reports are serialized once, and each destination only adds its own
+    auth field to the shared bytes; the destinations' threads share nothing
+    else of a report. Each destination sends from its own thread, with its
+    own access token, retry state and stats, so a slow or failing
+    destination does not hold up the others or the flush thread.
+
+    report() returns as soon as the report is queued, unless a `timeout` is
+    given (e.g. by flush(deadline=...)): it then waits up to that long for
+    every destination to send it. It never raises, since the report must not
+    be sent again to destinations that already have it, and returns an empty
+    response: collector commands only apply to their own destination.
+
+    :param list destinations: dicts with any of access_token,
+        collector_host, collector_port and collector_encryption, defaulting
+        to those given in `defaults`
+    """
+    def __init__(self, destinations, defaults, use_thrift, timeout_seconds,
+                 max_pending=None, verbosity=0):
+        if not destinations:
+            raise Exception('destinations must not be empty')
+        if max_pending is None:
+            max_pending = constants.FANOUT_MAX_PENDING_REPORTS
+        self._use_thrift = use_thrift
+        self._timeout_seconds = timeout_seconds
+        self._destinations = []
+        for options in destinations:
+            config = dict(defaults)
+            config.update(options)
+            url = util._collector_url_from_hostport(
+                config['collector_encryption'] != 'none',
+                config['collector_host'], config['collector_port'],
+                use_thrift)
+            if use_thrift:
+                from lightstep.thrift_connection import _ThriftConnection
+                connection = _ThriftConnection(url)
+            else:
+                from lightstep.http_connection import _HTTPConnection
+                connection = _HTTPConnection(url, timeout_seconds)
+            self._destinations.append(_Destination(
+                url, config['access_token'], connection, use_thrift,
+                max_pending, verbosity))
+        self.ready = True
+
+    @property
+    def stats(self):
+        stats = []
+        for destination in self._destinations:
+            with destination._cond:
+                entry = dict(destination.stats)
+            entry['destination'] = destination.name
+            stats.append(entry)
+        return {'destinations': stats}
+
+    def open(self):
+        """Destinations connect on their own threads."""
+        pass
+
+    def report(self, *args, **kwargs):
+        """Queue a report for every destination.
+
+        An already serialized report (third argument) is only used for
+        protobuf, and may include the recorder's auth field, which each
+        destination's overrides.
+        """
+        report = args[1]
+        if self._use_thrift:
+            from lightstep.crouton.ReportingService import Report_args
+            num_spans = len(report.span_records or [])
+            # The request field and the stop byte of the Report call.
+            data = _serialize_thrift(Report_args(request=report).write)
+        else:
+            num_spans = len(report.spans)
+            data = args[2] if len(args) > 2 else report.SerializeToString()
+        for destination in self._destinations:
+            destination.put(data, num_spans)
+
+        timeout = kwargs.get('timeout')
+        if timeout is not None:
+            deadline = util._monotonic() + timeout
+            for destination in self._destinations:
+                destination.wait_idle(max(0, deadline - util._monotonic()))
+        return self._empty_response()
+
+    def _empty_response(self):
+        if self._use_thrift:
+            from lightstep.crouton import ttypes
+            return ttypes.ReportResponse()
+        from lightstep.collector_pb2 import ReportResponse
+        return ReportResponse()
+
+    def close(self):
+        """Send what is pending and close every destination, all within
+        timeout_seconds."""
+        deadline = util._monotonic() + self._timeout_seconds
+        for destination in self._destinations:
+            destination.wait_idle(max(0, deadline - util._monotonic()))
+        for destination in self._destinations:
+            destination.stop()
+        for destination in self._destinations:
+            destination.join(max(0, deadline - util._monotonic()))
+
+
+def _serialize_thrift(write):
+    """The bytes that write(protocol) writes with TBinaryProtocol."""
+    from thrift.protocol import TBinaryProtocol
+    from thrift.transport import TTransport
+    buf = TTransport.TMemoryBuffer()
+    write(TBinaryProtocol.TBinaryProtocol(buf))
+    return buf.getvalue()
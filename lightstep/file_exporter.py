@@ -0,0 +1,118 @@
+""" Connection class that writes reports to segment files in a local spool
+    directory instead of sending them, for hosts without network access to
+    a collector. `python -m lightstep.replay` uploads the segments later.
+"""
+import io
+import itertools
+import os
+import threading
+import time
+
+from . import constants
+from . import framing
+
+# A segment is written under its final name plus this suffix, and renamed
+# once it is complete: only complete segments are replayed.
+PARTIAL_SUFFIX = '.partial'
+SEGMENT_SUFFIX = '.lsr'
+
+
+class _FileConnection(object):
+    """Instances of _FileConnection append each report, as a frame (see
+    lightstep.framing), to the current segment file in `directory`.
+
+    Segments are capped at about segment_bytes: a report that would take the
+    current segment past that size starts a new one (a single report larger
+    than segment_bytes gets a segment of its own). Segment names sort in the
+    order they were written.
+
+    Frames go through a write buffer of constants.EXPORT_WRITE_BUFFER_BYTES,
+    which is written out when it fills, when the segment is complete and on
+    close(); a process that dies without closing the connection loses what
+    the buffer held, and leaves a partial segment that is not replayed.
+
+    Like the agent transports, reports are fire-and-forget: report() returns
+    an empty response.
+    """
+    def __init__(self, directory, use_thrift,
+                 segment_bytes=constants.DEFAULT_EXPORT_SEGMENT_BYTES):
+        self._directory = directory
+        self._use_thrift = use_thrift
+        self._segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._size = 0
+        self._sequence = itertools.count()
+        self.ready = False
+        self.stats = {
+            'segments_written': 0,
+            'reports_written': 0,
+            'bytes_written': 0,
+        }
+
+    def open(self):
+        """Create the spool directory if need be."""
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        self.ready = True
+
+    # May throw an Exception on failure.
+    def report(self, *args, **kwargs):
+        """Write a report to the current segment.
+
+        An already serialized report may be passed as a third argument. The
+        `timeout` keyword argument is accepted and ignored.
+        """
+        auth = args[0]
+        report = args[1]
+        payload = args[2] if len(args) > 2 else None
+        if self._use_thrift:
+            from thrift.TSerialization import serialize
+            from lightstep.crouton import ttypes
+            kind = framing.KIND_THRIFT
+            if payload is None:
+                payload = serialize(report)
+            response = ttypes.ReportResponse()
+        else:
+            from lightstep.collector_pb2 import ReportResponse
+            kind = framing.KIND_PROTO
+            report.auth.access_token = auth.access_token
+            if payload is None:
+                payload = report.SerializeToString()
+            response = ReportResponse()
+
+        frame = framing.encode_frame(kind, auth.access_token, payload)
+        with self._lock:
+            if self._file is not None and \
+                    self._size + len(frame) > self._segment_bytes:
+                self._finish_segment()
+            if self._file is None:
+                self._start_segment()
+            self._file.write(frame)
+            self._size += len(frame)
+            self.stats['reports_written'] += 1
+            self.stats['bytes_written'] += len(frame)
+        return response
+
+    def _start_segment(self):
+        # Milliseconds first, so that names sort by time across processes.
+        name = '{0:013d}-{1}-{2:06d}{3}'.format(
+            int(time.time() * 1000), os.getpid(), next(self._sequence),
+            SEGMENT_SUFFIX)
+        self._path = os.path.join(self._directory, name)
+        self._file = io.open(self._path + PARTIAL_SUFFIX, 'wb',
+                             buffering=constants.EXPORT_WRITE_BUFFER_BYTES)
+        self._size = 0
+
+    def _finish_segment(self):
+        self._file.close()
+        os.rename(self._path + PARTIAL_SUFFIX, self._path)
+        self._file = None
+        self.stats['segments_written'] += 1
+
+    def close(self):
+        """Complete the current segment."""
+        with self._lock:
+            if self._file is not None:
+                self._finish_segment()
@@ -0,0 +1,58 @@
+"""
+Framing of reports sent to a local forwarding agent (see lightstep.agent).
+
+A frame is:
+
+    uint32  length of everything after this field (big-endian)
+    uint8   kind: KIND_PROTO or KIND_THRIFT
+    uint16  length of the access token (big-endian)
+    bytes   access token (UTF-8)
+    bytes   the serialized ReportRequest
+"""
+import struct
+
+KIND_PROTO = 1
+KIND_THRIFT = 2
+
+_LENGTH = struct.Struct('>I')
+_HEADER = struct.Struct('>BH')
+
+# Larger frames are rejected by the agent rather than buffered.
+MAX_FRAME_BYTES = 64 << 20
+
+
+class FrameError(Exception):
+    pass
+
+
+def encode_frame(kind, access_token, payload):
+    token = access_token.encode('utf-8')
+    return b''.join([
+        _LENGTH.pack(_HEADER.size + len(token) + len(payload)),
+        _HEADER.pack(kind, len(token)),
+        token,
+        payload,
+    ])
+
+
+def read_frame(read):
+    """Read one frame with read(n), which returns exactly n bytes or fewer
+    at the end of the stream. Returns (kind, access_token, payload), or None
+    at the end of the stream."""
+    data = read(_LENGTH.size)
+    if not data:
+        return None
+    if len(data) < _LENGTH.size:
+        raise FrameError('truncated frame')
+    length = _LENGTH.unpack(data)[0]
+    if length < _HEADER.size or length > MAX_FRAME_BYTES:
+        raise FrameError('bad frame length {0}'.format(length))
+    body = read(length)
+    if len(body) < length:
+        raise FrameError('truncated frame')
+    kind, token_length = _HEADER.unpack_from(body)
+    if kind not in (KIND_PROTO, KIND_THRIFT):
+        raise FrameError('unknown frame kind {0}'.format(kind))
+    token_end = _HEADER.size + token_length
+    return (kind, body[_HEADER.size:token_end].decode('utf-8'),
+            body[token_end:])
@@ -0,0 +1,97 @@
+""" Connection class that reports over gRPC to the collector's
+    CollectorService (requires the grpcio package).
+"""
+import threading
+
+import grpc
+
+from lightstep.collector_pb2 import ReportRequest, ReportResponse
+
+from . import constants
+
+_REPORT_METHOD = '/lightstep.collector.CollectorService/Report'
+
+
+class _GRPCConnection(object):
+    """Instances of _GRPCConnection report over one persistent HTTP/2 channel.
+
+    The channel is thread-safe and multiplexes concurrent report() calls
+    (e.g. an explicit flush() during a periodic one) as streams of a single
+    connection. Keepalive pings keep idle connections from being silently
+    dropped by load balancers between flushes, and detect dead ones before a
+    report is sent on them.
+    """
+    def __init__(self, target, secure, timeout_seconds,
+                 keepalive_seconds=constants.GRPC_KEEPALIVE_SECS):
+        self._target = target
+        self._secure = secure
+        self._timeout_seconds = timeout_seconds
+        self._keepalive_seconds = keepalive_seconds
+        self._lock = threading.Lock()
+        self._channel = None
+        self._report = None
+        self._report_payload = None
+        self.ready = False
+
+    def open(self):
+        """Create the channel. It connects on the first report, and
+        reconnects on its own after failures."""
+        with self._lock:
+            self._close()
+            keepalive_ms = int(self._keepalive_seconds * 1000)
+            options = [
+                ('grpc.keepalive_time_ms', keepalive_ms),
+                ('grpc.keepalive_timeout_ms', min(keepalive_ms, 20000)),
+                ('grpc.keepalive_permit_without_calls', 1),
+                ('grpc.http2.max_pings_without_data', 0),
+            ]
+            if self._secure:
+                channel = grpc.secure_channel(
+                    self._target, grpc.ssl_channel_credentials(), options)
+            else:
+                channel = grpc.insecure_channel(self._target, options)
+            self._channel = channel
+            self._report = channel.unary_unary(
+                _REPORT_METHOD,
+                request_serializer=ReportRequest.SerializeToString,
+                response_deserializer=ReportResponse.FromString)
+            # For reports the recorder already serialized.
+            self._report_payload = channel.unary_unary(
+                _REPORT_METHOD,
+                response_deserializer=ReportResponse.FromString)
+            self.ready = True
+
+    # May throw an Exception (grpc.RpcError) on failure.
+    def report(self, *args, **kwargs):
+        """Report to the collector.
+
+        An already serialized report may be passed as a third argument, and
+        the deadline of this call (in seconds from now) as the `timeout`
+        keyword argument.
+        """
+        auth = args[0]
+        report = args[1]
+        payload = args[2] if len(args) > 2 else None
+        timeout = kwargs.get('timeout', self._timeout_seconds)
+        with self._lock:
+            report_method, report_payload = self._report, self._report_payload
+        if report_method is None:
+            raise Exception('gRPC channel is not open')
+
+        metadata = [('lightstep-access-token', auth.access_token)]
+        if payload is not None:
+            return report_payload(payload, timeout=timeout, metadata=metadata)
+        report.auth.access_token = auth.access_token
+        return report_method(report, timeout=timeout, metadata=metadata)
+
+    def _close(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+            self._report = self._report_payload = None
+        self.ready = False
+
+    def close(self):
+        """Close the channel."""
+        with self._lock:
+            self._close()
@@ -1,21 +1,60 @@
 """ Connection class establishes HTTP connection with server.
     Utilized to send Proto Report Requests.
 """
+import ssl
 import threading
 import requests
+from requests.adapters import HTTPAdapter
+from six.moves.urllib.parse import urlparse
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 
 from lightstep.collector_pb2 import ReportResponse
+from . import constants
+from . import tls
+from . import util
+
+
+class _TLSAdapter(HTTPAdapter):
+    """Makes every connection of the session use ssl_context (a
+    lightstep.tls._ResumingSSLContext)."""
+    def __init__(self, ssl_context):
+        self._ssl_context = ssl_context
+        super(_TLSAdapter, self).__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super(_TLSAdapter, self).init_poolmanager(*args, **kwargs)
+
+    def send(self, *args, **kwargs):
+        response = super(_TLSAdapter, self).send(*args, **kwargs)
+        # The response's headers are in, and with them any session ticket.
+        self._ssl_context.capture_sessions()
+        return response
 
 
 class _HTTPConnection(object):
     """Instances of _Connection are used to establish a connection to the
     server via HTTP protocol.
+
+    Reports share a requests.Session, so the connection to the collector
+    (including its TLS session) is kept alive from one report to the next.
+    When it has to be replaced, its TLS session is resumed through the one
+    SSLContext the connection keeps (see lightstep.tls).
     """
     def __init__(self, collector_url, timeout_seconds):
         self._collector_url = collector_url
         self._lock = threading.Lock()
         self.ready = True
         self._timeout_seconds = timeout_seconds
+        self._session = None
+        self._ssl_context = None
+        if collector_url.startswith('https:'):
+            self._ssl_context = tls._client_context()
+        # Whether the session may hold a kept-alive connection, which the
+        # collector (or a frozen process, e.g. in AWS Lambda) may have let go
+        # stale.
+        self._warm = False
+        self._dns_cache = None
 
     def open(self):
         """Establish HTTP connection to the server.
@@ -24,9 +63,16 @@ class _HTTPConnection(object):
 
     # May throw an Exception on failure.
     def report(self, *args, **kwargs):
-        """Report to the server."""
+        """Report to the server.
+
+        An already serialized report may be passed as a third argument, and
+        the timeout for this report (instead of timeout_seconds) as the
+        `timeout` keyword argument.
+        """
         auth = args[0]
         report = args[1]
+        data = args[2] if len(args) > 2 else None
+        timeout = kwargs.get('timeout', self._timeout_seconds)
         with self._lock:
             try:
                 report.auth.access_token = auth.access_token
@@ -36,18 +82,105 @@ class _HTTPConnection(object):
                     "Lightstep-Access-Token": auth.access_token
                 }
 
-                r = requests.post(
-                    self._collector_url,
-                    headers=headers,
-                    data=report.SerializeToString(),
-                    timeout=self._timeout_seconds)
+                if data is None:
+                    data = report.SerializeToString()
+                if self._session is None:
+                    self._session = self._new_session()
+
+                deadline = util._monotonic() + timeout
+                try:
+                    r = self._session.post(
+                        self._collector_url,
+                        headers=headers,
+                        data=data,
+                        timeout=timeout)
+                except requests.exceptions.ConnectionError as err:
+                    remaining = deadline - util._monotonic()
+                    if not self._warm or remaining <= 0 or \
+                            not _not_sent(err):
+                        raise
+                    # The session could not reconnect, e.g. to replace a
+                    # kept-alive connection gone stale while idle. The report
+                    # never left, so a second attempt cannot send it twice.
+                    self._warm = False
+                    r = self._session.post(
+                        self._collector_url,
+                        headers=headers,
+                        data=data,
+                        timeout=remaining)
+                self._warm = True
+                # An error status fails the report, so that its spans are
+                # kept for the next one.
+                r.raise_for_status()
                 resp = ReportResponse()
                 resp.ParseFromString(r.content)
                 return resp
             except requests.exceptions.RequestException as err:
                 raise err
 
+    def start_report(self, auth, report, timeout=None):
+        """Start sending a report on a connection of its own, without
+        blocking: returns a lightstep.inline_report._InlineReport, whose
+        advance() yields the ReportResponse. (Unlike report(), this does not
+        go through an HTTP proxy.)
+
+        The collector's address is looked up once every DNS_TTL_SECS, which
+        blocks.
+        """
+        from lightstep.inline_report import _InlineReport, _http_request
+        from lightstep.satellite_pool import _DNSCache
+        if timeout is None:
+            timeout = self._timeout_seconds
+        url = urlparse(self._collector_url)
+        secure = url.scheme == 'https'
+        port = url.port or (443 if secure else 80)
+        if self._dns_cache is None:
+            self._dns_cache = _DNSCache(constants.DNS_TTL_SECS)
+        address = self._dns_cache.resolve(url.hostname, port)[0]
+        ssl_context = None
+        if secure:
+            ssl_context = self._ssl_context or \
+                ssl._create_default_https_context()
+        report.auth.access_token = auth.access_token
+        request = _http_request(url.hostname, port, url.path, {
+            "Content-Type": "application/octet-stream",
+            "Accept": "application/octet-stream",
+            "Lightstep-Access-Token": auth.access_token
+        }, report.SerializeToString())
+        return _InlineReport(address, url.hostname, port, request,
+                             ssl_context, _parse_response, timeout)
+
+    def _new_session(self):
+        session = requests.Session()
+        if self._ssl_context is not None:
+            session.mount('https://', _TLSAdapter(self._ssl_context))
+        return session
+
     def close(self):
         """Close HTTP connection to the server."""
         self.ready = False
-        pass
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+                self._warm = False
+
+
+def _not_sent(err):
+    """Whether a ConnectionError from requests shows that the request was
+    not sent: the connection to the collector could not be established."""
+    if isinstance(err, requests.exceptions.ConnectTimeout):
+        return True
+    reason = err.args[0] if err.args else None
+    # Usually a MaxRetryError, with the urllib3 error as its reason.
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def _parse_response(status, body):
+    if status != 200:
+        raise Exception('collector responded with HTTP status {0}'.format(
+            status))
+    resp = ReportResponse()
+    resp.ParseFromString(body)
+    return resp
@@ -7,6 +7,19 @@ from . import util
 from . import version as tracer_version
 from google.protobuf.timestamp_pb2 import Timestamp
 
+# Key of a length-delimited ReportRequest.spans element: (field number << 3) | 2
+_SPANS_TAG = bytes(bytearray([
+    (ReportRequest.DESCRIPTOR.fields_by_name['spans'].number << 3) | 2]))
+
+
+def _varint(value):
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
 
 class HttpConverter(Converter):
 
@@ -74,8 +87,43 @@ class HttpConverter(Converter):
                 field.key = k
                 field.string_value = util._coerce_str(v)
 
-    def create_report(self, runtime, span_records):
-        return ReportRequest(reporter=runtime, spans=span_records)
+    def create_report(self, runtime, span_records, chunk_spans=None, pause=None):
+        if pause is None:
+            return ReportRequest(reporter=runtime, spans=span_records)
+        # Adding a span copies it, which is as slow as serializing it.
+        report = ReportRequest(reporter=runtime)
+        for start in range(0, len(span_records), chunk_spans):
+            report.spans.extend(span_records[start:start + chunk_spans])
+            pause()
+        return report
+
+    def serialize_report(self, auth, report_request, chunk_spans, pause):
+        # Serialized protobuf messages can be concatenated: the result parses
+        # as their merge, with repeated fields appended. So the report is
+        # written as its fields other than spans, followed by each span
+        # encoded as an element of the spans field.
+        report_request.auth.access_token = auth.access_token
+        header = ReportRequest(
+            reporter=report_request.reporter,
+            auth=report_request.auth,
+            timestamp_offset_micros=report_request.timestamp_offset_micros)
+        if report_request.HasField('internal_metrics'):
+            header.internal_metrics.CopyFrom(report_request.internal_metrics)
+
+        chunks = [header.SerializeToString()]
+        spans = report_request.spans
+        for start in range(0, len(spans), chunk_spans):
+            for span in spans[start:start + chunk_spans]:
+                data = span.SerializeToString()
+                chunks.append(_SPANS_TAG + _varint(len(data)) + data)
+            pause()
+        return b''.join(chunks)
+
+    def serialize_span_record(self, span_record):
+        return span_record.SerializeToString()
+
+    def parse_span_record(self, data):
+        return Span.FromString(data)
 
     def combine_span_records(self, report_request, span_records):
         report_request.spans.extend(span_records)
@@ -0,0 +1,196 @@
+""" A report sent over HTTP without blocking, for inline_flush: there is no
+    thread to wait for the collector, so the callers of record_span() take
+    turns moving the report along, each doing only what the socket allows
+    right away.
+"""
+import errno
+import select
+import socket
+import ssl
+
+from . import util
+
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS)
+_READ, _WRITE = 'r', 'w'
+
+
+class _InlineReport(object):
+    """One POST of an already serialized report on a new, non-blocking
+    connection (closed once the response is in, so the collector never
+    holds a connection open for a caller that may not come back for a
+    while).
+
+    advance() returns None until the response has arrived, then the
+    response, and raises if the report failed or timed out.
+
+    :param str address: the collector's IP address (it must not need a
+        lookup, which would block)
+    :param str host: the collector's host name, for the Host header and TLS
+    :param int port: the collector's port
+    :param bytes request: the HTTP request
+    :param ssl_context: an SSLContext for https, None for http
+    :param parse: parse(status, body) returns the response, or raises
+        for an error status
+    :param float timeout: seconds the report may take
+    """
+    def __init__(self, address, host, port, request, ssl_context, parse,
+                 timeout):
+        self._address = address
+        self._host = host
+        self._port = port
+        self._request = request
+        self._ssl_context = ssl_context
+        self._parse = parse
+        self._deadline = util._monotonic() + timeout
+        self._sock = None
+        self._waiting_for = None
+        self._done = False
+        self._result = None
+        self._steps = self._run()
+
+    def advance(self):
+        """Move the report along as far as it goes without blocking."""
+        if not self._done:
+            try:
+                if util._monotonic() > self._deadline:
+                    raise Exception('report timed out')
+                self._waiting_for = next(self._steps)
+            except StopIteration:
+                self.close()
+            except Exception:
+                self.close()
+                raise
+        return self._result
+
+    def wait(self):
+        """Block until the report is done, for at most its timeout. Returns
+        its response."""
+        while True:
+            response = self.advance()
+            if self._done:
+                return response
+            remaining = max(0, self._deadline - util._monotonic())
+            if self._waiting_for == _READ:
+                select.select([self._sock], [], [], remaining)
+            else:
+                select.select([], [self._sock], [], remaining)
+
+    def close(self):
+        """Abandon the report, if it is not done."""
+        self._done = True
+        self._steps.close()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _run(self):
+        """A generator that yields _READ or _WRITE whenever the socket would
+        block, until the response is in self._result."""
+        family, socktype, proto, _, sockaddr = socket.getaddrinfo(
+            self._address, self._port, 0, socket.SOCK_STREAM, 0,
+            socket.AI_NUMERICHOST)[0]
+        sock = self._sock = socket.socket(family, socktype, proto)
+        sock.setblocking(False)
+        err = sock.connect_ex(sockaddr)
+        if err not in (0,) + _WOULD_BLOCK:
+            raise socket.error(err, 'could not connect to the collector')
+        while not select.select([], [sock], [], 0)[1]:
+            yield _WRITE
+        err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            raise socket.error(err, 'could not connect to the collector')
+
+        # Sessions are kept for the next report where the context does that
+        # (see lightstep.tls).
+        capture_sessions = getattr(self._ssl_context, 'capture_sessions',
+                                   lambda: None)
+        if self._ssl_context is not None:
+            sock = self._sock = self._ssl_context.wrap_socket(
+                sock, server_hostname=self._host,
+                do_handshake_on_connect=False)
+            while True:
+                try:
+                    sock.do_handshake()
+                    break
+                except ssl.SSLWantReadError:
+                    yield _READ
+                except ssl.SSLWantWriteError:
+                    yield _WRITE
+            capture_sessions()
+
+        data = memoryview(self._request)
+        while data:
+            try:
+                data = data[sock.send(data):]
+            except ssl.SSLWantReadError:
+                yield _READ
+            except ssl.SSLWantWriteError:
+                yield _WRITE
+            except socket.error as e:
+                if e.errno not in _WOULD_BLOCK:
+                    raise
+                yield _WRITE
+
+        # The request asks the collector to close the connection after its
+        # response, so the response is everything up to the end of stream.
+        response = bytearray()
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except ssl.SSLWantReadError:
+                yield _READ
+                continue
+            except ssl.SSLWantWriteError:
+                yield _WRITE
+                continue
+            except socket.error as e:
+                if e.errno not in _WOULD_BLOCK:
+                    raise
+                yield _READ
+                continue
+            if not chunk:
+                break
+            response += chunk
+        capture_sessions()
+        self._result = self._parse(*_parse_http_response(bytes(response)))
+
+
+def _http_request(host, port, path, headers, body):
+    """A POST of body to path, asking the server to close the connection
+    after its response."""
+    lines = ['POST {0} HTTP/1.1'.format(path),
+             'Host: {0}:{1}'.format(host, port),
+             'Content-Length: {0}'.format(len(body)),
+             'Connection: close']
+    lines.extend('{0}: {1}'.format(name, value)
+                 for name, value in sorted(headers.items()))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+def _parse_http_response(response):
+    """The status and body of an HTTP/1.x response."""
+    head, separator, body = response.partition(b'\r\n\r\n')
+    if not separator:
+        raise Exception('incomplete response from the collector')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = _dechunk(body)
+    elif 'content-length' in headers:
+        body = body[:int(headers['content-length'])]
+    return status, body
+
+
+def _dechunk(body):
+    chunks = []
+    while True:
+        size, _, body = body.partition(b'\r\n')
+        size = int(size.split(b';')[0], 16)
+        if size == 0:
+            return b''.join(chunks)
+        chunks.append(body[:size])
+        body = body[size + 2:]
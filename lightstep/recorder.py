@@ -7,7 +7,6 @@ See the API definition for comments.
 """
 
 import atexit
-import ssl
 import threading
 import time
 import traceback
@@ -16,12 +15,12 @@ import warnings
 from basictracer.recorder import SpanRecorder
 from opentracing.logs import ERROR_KIND, STACK, ERROR_OBJECT
 
-from lightstep.http_converter import HttpConverter
-from lightstep.thrift_converter import ThriftConverter
 from . import constants
 from . import util
-from lightstep.thrift_connection import _ThriftConnection
-from lightstep.http_connection import _HTTPConnection
+
+# The converters and connections for each transport are imported lazily, once
+# the transport is selected, so that `import lightstep` does not pay for
+# protobuf, thrift, requests and jsonpickle when only one of them is used.
 
 
 class Recorder(SpanRecorder):
@@ -32,7 +31,10 @@ class Recorder(SpanRecorder):
     For parameter semantics, see Tracer() documentation; Recorder() respects
     component_name, access_token, collector_host, collector_port,
     collector_encryption, tags, max_span_records, periodic_flush_seconds,
-    verbosity, and certificate_verification,
+    verbosity, certificate_verification, cooperative, inline_flush,
+    serverless, shared_ring_dir, shared_ring_bytes, agent_socket,
+    agent_udp_address, use_grpc, collector_endpoints, destinations, prewarm,
+    export_dir, export_segment_bytes and tail_sampler.
     """
     def __init__(self,
                  component_name=None,
@@ -47,20 +49,50 @@ class Recorder(SpanRecorder):
                  certificate_verification=True,
                  use_thrift=False,
                  use_http=True,
-                 timeout_seconds=30):
+                 timeout_seconds=None,
+                 cooperative=None,
+                 inline_flush=False,
+                 serverless=False,
+                 shared_ring_dir=None,
+                 shared_ring_bytes=constants.DEFAULT_SHARED_RING_BYTES,
+                 agent_socket=None,
+                 agent_udp_address=None,
+                 use_grpc=False,
+                 collector_endpoints=None,
+                 destinations=None,
+                 prewarm=False,
+                 export_dir=None,
+                 export_segment_bytes=constants.DEFAULT_EXPORT_SEGMENT_BYTES,
+                 tail_sampler=None):
         self.verbosity = verbosity
         # Fail fast on a bad access token
         if not isinstance(access_token, str):
             raise Exception('access_token must be a string')
 
+        # Each of these picks the transport; several transports are
+        # combined with `destinations`.
+        transports = [name for name, value in (
+            ('export_dir', export_dir),
+            ('destinations', destinations),
+            ('agent_socket', agent_socket),
+            ('agent_udp_address', agent_udp_address),
+            ('use_grpc', use_grpc),
+            ('collector_endpoints', collector_endpoints)) if value]
+        if len(transports) > 1:
+            raise ValueError('only one of {0} may be given'.format(
+                ', '.join(transports)))
+
         if certificate_verification is False:
             warnings.warn('SSL CERTIFICATE VERIFICATION turned off. ALL FUTURE HTTPS calls will be unverified.')
+            import ssl
             ssl._create_default_https_context = ssl._create_unverified_context
 
-        if use_http:
+        if use_http or use_grpc:
+            from lightstep.http_converter import HttpConverter
             self.use_thrift = False
             self.converter = HttpConverter()
         elif use_thrift:
+            from lightstep.thrift_converter import ThriftConverter
             self.use_thrift = True
             self.converter = ThriftConverter()
         else:
@@ -76,14 +108,47 @@ class Recorder(SpanRecorder):
             collector_port,
             self.use_thrift
         )
+        self._use_grpc = use_grpc
+        self._secure = secure
+        self._collector_target = '{0}:{1}'.format(collector_host, collector_port)
+        self._collector_endpoints = collector_endpoints
+        self._destinations = destinations
+        self._export_dir = export_dir
+        self._export_segment_bytes = export_segment_bytes
+        # Finished spans wait in the tail sampler until their trace is
+        # decided; only those of kept traces are buffered.
+        self._tail_sampler = tail_sampler
+        self._destination_defaults = {
+            'access_token': access_token,
+            'collector_host': collector_host,
+            'collector_port': collector_port,
+            'collector_encryption': collector_encryption,
+        }
+        if timeout_seconds is None:
+            timeout_seconds = constants.INLINE_FLUSH_TIMEOUT_SECS \
+                if inline_flush else constants.DEFAULT_TIMEOUT_SECS
         self._timeout_seconds = timeout_seconds
+        self._agent_socket = agent_socket
+        self._agent_udp_address = agent_udp_address
         self._auth = self.converter.create_auth(access_token)
         self._mutex = threading.Lock()
+        self._flush_init_lock = threading.Lock()
         self._span_records = []
         self._max_span_records = max_span_records
+        # With a shared ring directory, record_span() writes span records to
+        # this process' ring, and _span_records only holds what the reporter
+        # process drained from the rings but has not reported yet.
+        self._rings = None
+        if shared_ring_dir is not None:
+            from lightstep.shared_ring import _RingDirectory
+            self._rings = _RingDirectory(shared_ring_dir, shared_ring_bytes)
 
         self._disabled_runtime = False
 
+        if cooperative is None:
+            cooperative = util._is_monkey_patched()
+        self._cooperative = cooperative
+
         atexit.register(self.shutdown)
 
         self._periodic_flush_seconds = periodic_flush_seconds
@@ -92,11 +157,27 @@ class Recorder(SpanRecorder):
         # reporting machinery up otherwise.
         self._flush_connection = None
         self._flush_thread = None
-        if self._periodic_flush_seconds <= 0:
+        # With serverless there is no flush thread either, and nothing is
+        # reported unless flush() is called.
+        self._serverless = serverless
+        # With inline_flush there is no flush thread: record_span() flushes
+        # once _next_flush (on the util._monotonic() clock) has passed.
+        self._inline_flush = (inline_flush and periodic_flush_seconds > 0
+                              and not serverless)
+        self._inline_flush_lock = threading.Lock()
+        self._next_flush = util._monotonic() + periodic_flush_seconds
+        # The report being sent without blocking (connections that have
+        # start_report()), and its request, restored if it fails.
+        self._inline_report = None
+        self._inline_report_request = None
+        if self._periodic_flush_seconds <= 0 and not serverless:
             warnings.warn(
                 'Runtime(periodic_flush_seconds={0}) means we will never flush to lightstep unless explicitly requested.'.format(
                     self._periodic_flush_seconds))
 
+        if prewarm:
+            self._prewarm()
+
     def _maybe_init_flush_thread(self):
         """Start a periodic flush mechanism for this recorder if:
 
@@ -106,17 +187,95 @@ class Recorder(SpanRecorder):
 
         We do these things lazily because things like `tornado` break if the
         background flush thread starts before `fork()` calls happen.
+
+        In inline_flush and serverless modes there is never a flush thread.
         """
+        if self._inline_flush or self._serverless:
+            return
         if (self._periodic_flush_seconds > 0) and (self._flush_thread is None):
-            if self.use_thrift:
-                self._flush_connection = _ThriftConnection(self._collector_url)
-            else:
-                self._flush_connection = _HTTPConnection(self._collector_url, self._timeout_seconds)
-            self._flush_connection.open()
-            self._flush_thread = threading.Thread(target=self._flush_periodically,
-                                                  name=constants.FLUSH_THREAD_NAME)
-            self._flush_thread.daemon = True
-            self._flush_thread.start()
+            with self._flush_init_lock:
+                # Several threads may record their first span at once; only
+                # one of them gets to start the flush machinery.
+                if self._flush_thread is not None:
+                    return
+                flush_thread = threading.Thread(target=self._flush_periodically,
+                                                name=constants.FLUSH_THREAD_NAME)
+                flush_thread.daemon = True
+                flush_thread.start()
+                self._flush_thread = flush_thread
+
+    def _prewarm(self):
+        """Open the connection (DNS, TCP and TLS) now, on a background thread,
+        rather than on the first span.
+
+        This sends the first (usually empty) report, which is also what the
+        flush thread does as soon as it starts; without a flush thread it is
+        sent from a short-lived one.
+        """
+        if not (self._inline_flush or self._serverless) and \
+                self._periodic_flush_seconds > 0:
+            self._maybe_init_flush_thread()
+            return
+        thread = threading.Thread(
+            target=lambda: self._flush_worker(self._maybe_init_connection()),
+            name=constants.FLUSH_THREAD_NAME)
+        thread.daemon = True
+        thread.start()
+
+    def _maybe_init_connection(self):
+        """Return the connection used for flushes, creating it if need be."""
+        if self._flush_connection is None:
+            with self._flush_init_lock:
+                if self._flush_connection is None:
+                    self._flush_connection = self._create_connection()
+        return self._flush_connection
+
+    def _create_connection(self):
+        if self._export_dir is not None:
+            from lightstep.file_exporter import _FileConnection
+            connection = _FileConnection(self._export_dir, self.use_thrift,
+                                         self._export_segment_bytes)
+        elif self._destinations:
+            from lightstep.fanout import _FanOutConnection
+            connection = _FanOutConnection(
+                self._destinations, self._destination_defaults, self.use_thrift,
+                self._timeout_seconds, verbosity=self.verbosity)
+        elif self._agent_socket is not None:
+            from lightstep.uds_connection import _UDSConnection
+            connection = _UDSConnection(self._agent_socket, self.use_thrift,
+                                        self._timeout_seconds)
+        elif self._agent_udp_address is not None:
+            from lightstep.udp_connection import _UDPConnection
+            host, port = self._agent_udp_address.rsplit(':', 1)
+            connection = _UDPConnection(host.strip('[]'), int(port),
+                                        self.use_thrift)
+        elif self._use_grpc:
+            from lightstep.grpc_connection import _GRPCConnection
+            connection = _GRPCConnection(self._collector_target, self._secure,
+                                         self._timeout_seconds)
+        elif self._collector_endpoints:
+            from lightstep.satellite_pool import _SatellitePool
+            connection = _SatellitePool(self._collector_endpoints, self._secure,
+                                        self.use_thrift, self._timeout_seconds)
+        elif self.use_thrift:
+            from lightstep.thrift_connection import _ThriftConnection
+            connection = _ThriftConnection(self._collector_url)
+        else:
+            from lightstep.http_connection import _HTTPConnection
+            connection = _HTTPConnection(self._collector_url, self._timeout_seconds)
+        connection.open()
+        return connection
+
+    def stats(self):
+        """Counters of the reporting machinery: the number of buffered spans,
+        and whatever the connection counts (such as the send errors of the
+        UDP transport)."""
+        with self._mutex:
+            stats = {'spans_buffered': len(self._span_records)}
+        stats.update(getattr(self._flush_connection, 'stats', {}))
+        if self._tail_sampler is not None:
+            stats.update(self._tail_sampler.stats())
+        return stats
 
     def _fine(self, fmt, args):
         if self.verbosity >= 1:
@@ -139,15 +298,30 @@ class Recorder(SpanRecorder):
         # Lazy-init the flush loop (if need be).
         self._maybe_init_flush_thread()
 
+        # Checked before buffering, so that a full buffer still gets flushed.
+        if self._inline_flush and (self._inline_report is not None or
+                                   util._monotonic() >= self._next_flush):
+            self._flush_inline()
+
+        if self._tail_sampler is None:
+            self._buffer_span(span)
+        else:
+            for kept in self._tail_sampler.add(span):
+                self._buffer_span(kept)
+
+    def _buffer_span(self, span):
+        """Convert a span and add it to the buffer (or this process' ring),
+        unless the buffer is full."""
         # Checking the len() here *could* result in a span getting dropped that
         # might have fit if a report started before the append(). This would only
         # happen if the client lib was being saturated anyway (and likely
         # dropping spans). But on the plus side, having the check here avoids
         # doing a span conversion when the span will just be dropped while also
         # keeping the lock scope minimized.
-        with self._mutex:
-            if len(self._span_records) >= self._max_span_records:
-                return
+        if self._rings is None:
+            with self._mutex:
+                if len(self._span_records) >= self._max_span_records:
+                    return
 
         span_record = self.converter.create_span_record(span, self.guid)
 
@@ -161,10 +335,89 @@ class Recorder(SpanRecorder):
         for log in span.logs:
             self.converter.append_log(span_record, self._normalize_log(log))
 
+        if self._rings is not None:
+            data = self.converter.serialize_span_record(span_record)
+            with self._mutex:
+                self._rings.put(data)
+            return
+
         with self._mutex:
             if len(self._span_records) < self._max_span_records:
                 self._span_records.append(span_record)
 
+    def _release_tail_sampled(self, everything=False):
+        """Have the tail sampler decide the traces that waited long enough
+        for their root (or all of its traces), and buffer those kept."""
+        if self._tail_sampler is not None:
+            for span in self._tail_sampler.release(everything):
+                self._buffer_span(span)
+
+    def _flush_inline(self):
+        """Flush from the calling thread, unless another caller is already
+        doing so; callers never wait for one another.
+
+        Where the connection can start a report without blocking, the
+        caller past the deadline swaps the buffer out and starts its report,
+        and callers then move it along, a non-blocking step each, until the
+        response is in. Other connections send the report right away, and
+        that caller waits for it.
+        """
+        if not self._inline_flush_lock.acquire(False):
+            return
+        try:
+            if self._inline_report is not None:
+                self._advance_inline_report()
+            now = util._monotonic()
+            if now < self._next_flush or self._inline_report is not None:
+                # Another caller flushed while this one was getting here, or
+                # the last report is still on its way.
+                return
+            # Failed reports are retried on the next deadline as well, so a
+            # slow or unreachable collector costs at most one report per
+            # period, of at most timeout_seconds (which not every connection
+            # applies by itself).
+            self._next_flush = now + self._periodic_flush_seconds
+            connection = self._maybe_init_connection()
+            if hasattr(connection, 'start_report'):
+                self._start_inline_report(connection)
+            else:
+                self._flush_worker(connection, self._timeout_seconds)
+        finally:
+            self._inline_flush_lock.release()
+
+    def _start_inline_report(self, connection):
+        self._release_tail_sampled()
+        if self._rings is not None and not self._drain_rings():
+            return
+        report_request = self._construct_report_request()
+        try:
+            self._inline_report = connection.start_report(
+                self._auth, report_request, self._timeout_seconds)
+        except Exception as e:
+            self._report_failed(e, report_request)
+            return
+        self._inline_report_request = report_request
+        self._advance_inline_report()
+
+    def _advance_inline_report(self, wait=False):
+        """Move the inline report along (or, with wait, see it through), and
+        handle its response once it is in."""
+        report_request = self._inline_report_request
+        try:
+            if wait:
+                resp = self._inline_report.wait()
+            else:
+                resp = self._inline_report.advance()
+                if resp is None:
+                    return
+        except Exception as e:
+            self._inline_report = self._inline_report_request = None
+            self._report_failed(e, report_request)
+            return
+        self._inline_report = self._inline_report_request = None
+        self._finest("Received response from collector: {0}", (resp,))
+        self._handle_response(resp)
+
     def _normalize_log(self, log):
         if log.key_values is not None and len(log.key_values) > 0:
 
@@ -180,7 +433,7 @@ class Recorder(SpanRecorder):
 
         return log
 
-    def flush(self, connection=None):
+    def flush(self, connection=None, deadline=None):
         """Immediately send unreported data to the server.
 
         Calling flush() will ensure that any current unreported data will be
@@ -190,16 +443,26 @@ class Recorder(SpanRecorder):
         passed in to __init__.  Note that custom connections are currently used
         for unit testing against a mocked connection.
 
+        If deadline (a time.time() timestamp) is given, the report is abandoned
+        if it has not completed by then, instead of after timeout_seconds; its
+        spans stay buffered for the next flush. If the deadline has already
+        passed nothing is sent.
+
         Returns whether the data was successfully flushed.
         """
         if self._disabled_runtime:
             return False
 
-        if connection is not None:
-            return self._flush_worker(connection)
-        else:
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return False
+
+        if connection is None:
             self._maybe_init_flush_thread()
-            return self._flush_worker(self._flush_connection)
+            connection = self._maybe_init_connection()
+        return self._flush_worker(connection, timeout)
 
     def shutdown(self, flush=True):
         """Shutdown the Runtime's connection by (optionally) flushing the
@@ -214,9 +477,26 @@ class Recorder(SpanRecorder):
         if self._disabled_runtime:
             return False
 
-        if flush:
-            flushed = self.flush()
+        flushed = False
+        if self._inline_report is not None:
+            with self._inline_flush_lock:
+                if self._inline_report is not None:
+                    self._advance_inline_report(wait=True)
+            if self._disabled_runtime:
+                return False
 
+        if flush:
+            self._release_tail_sampled(everything=True)
+            if self._rings is not None:
+                # Only the reporter has anything to flush: its own spans are
+                # in its ring like everyone else's.
+                self._drain_rings()
+            if self._span_records:
+                flushed = self.flush()
+
+        if self._rings is not None:
+            with self._mutex:
+                self._rings.close()
         if self._flush_connection:
             self._flush_connection.close()
 
@@ -229,19 +509,23 @@ class Recorder(SpanRecorder):
 
         Runs in a dedicated daemon thread (self._flush_thread).
         """
-        # Open the connection
-        while not self._disabled_runtime and not self._flush_connection.ready:
+        # Open the connection. It is created here rather than by the thread
+        # that recorded the first span, so that the application never pays
+        # for it.
+        connection = self._maybe_init_connection()
+        while not self._disabled_runtime and not connection.ready:
             time.sleep(self._periodic_flush_seconds)
-            self._flush_connection.open()
+            connection.open()
 
         # Send data until we get disabled
         while not self._disabled_runtime:
-            self._flush_worker(self._flush_connection)
+            self._flush_worker(connection)
             time.sleep(self._periodic_flush_seconds)
 
-    def _flush_worker(self, connection):
+    def _flush_worker(self, connection, timeout=None):
         """Use the given connection to transmit the current logs and spans as a
-        report request."""
+        report request, waiting at most timeout seconds (or timeout_seconds)
+        for it."""
         if connection is None:
             return False
 
@@ -252,36 +536,89 @@ class Recorder(SpanRecorder):
         if not connection.ready:
             return False
 
+        self._release_tail_sampled()
+
+        if self._rings is not None and not self._drain_rings():
+            # Another process reports the spans of this one.
+            return False
+
         report_request = self._construct_report_request()
         try:
             self._finest("Attempting to send report to collector: {0}", (report_request,))
-            resp = connection.report(self._auth, report_request)
+            if self._cooperative:
+                resp = self._report_cooperatively(connection, report_request, timeout)
+            elif timeout is not None:
+                resp = connection.report(self._auth, report_request, timeout=timeout)
+            else:
+                resp = connection.report(self._auth, report_request)
             self._finest("Received response from collector: {0}", (resp,))
-
-            # The resp may be None on failed reports
-            if resp is not None:
-                if resp.commands is not None:
-                    for command in resp.commands:
-                        if command.disable:
-                            self.shutdown(flush=False)
+            self._handle_response(resp)
             # Return whether we sent any span data
             return self.converter.num_span_records(report_request) > 0
 
         except Exception as e:
-            self._fine(
-                "Caught exception during report: {0}, stack trace: {1}",
-                (e, traceback.format_exc())
-            )
-            self._restore_spans(report_request)
+            self._report_failed(e, report_request)
             return False
 
+    def _handle_response(self, resp):
+        # The resp may be None on failed reports
+        if resp is not None:
+            if resp.commands is not None:
+                for command in resp.commands:
+                    if command.disable:
+                        self.shutdown(flush=False)
+
+    def _report_failed(self, e, report_request):
+        self._fine(
+            "Caught exception during report: {0}, stack trace: {1}",
+            (e, traceback.format_exc())
+        )
+        self._restore_spans(report_request)
+
+    def _drain_rings(self):
+        """If this process is the reporter, move the span records of all
+        processes' rings into the buffer. Returns whether it is the
+        reporter."""
+        if not self._rings.is_reporter():
+            return False
+        with self._mutex:
+            room = self._max_span_records - len(self._span_records)
+        span_records = [self.converter.parse_span_record(data)
+                        for data in self._rings.drain(room)]
+        with self._mutex:
+            self._span_records.extend(span_records)
+        return True
+
+    def _report_cooperatively(self, connection, report_request, timeout=None):
+        """Send report_request, serializing it in slices and yielding to other
+        greenlets between them, so that a large report does not block the
+        gevent/eventlet hub for the whole serialization."""
+        payload = self.converter.serialize_report(
+            self._auth, report_request, constants.COOPERATIVE_CHUNK_SPANS,
+            util._cooperative_yield)
+        args = (self._auth, report_request)
+        if payload is not None:
+            args += (payload,)
+        if timeout is not None:
+            return connection.report(*args, timeout=timeout)
+        return connection.report(*args)
+
     def _construct_report_request(self):
-        """Construct a report request."""
-        report = None
+        """Construct a report request.
+
+        In cooperative mode, other greenlets get to run every
+        COOPERATIVE_CHUNK_SPANS spans."""
+        # Only swap the buffer while holding the lock; building the report
+        # (which may encode log payloads) happens outside of it so that
+        # record_span() callers are not held up.
         with self._mutex:
-            report = self.converter.create_report(self._runtime, self._span_records)
+            span_records = self._span_records
             self._span_records = []
-        return report
+        if self._cooperative:
+            return self.converter.create_report(
+                self._runtime, span_records,
+                constants.COOPERATIVE_CHUNK_SPANS, util._cooperative_yield)
+        return self.converter.create_report(self._runtime, span_records)
 
     def _restore_spans(self, report_request):
         """Called after a flush error to move records back into the buffer
@@ -0,0 +1,323 @@
+"""
+Uploads the segment files written by tracers created with export_dir=DIR
+(see lightstep.file_exporter) to a collector:
+
+    python -m lightstep.replay /var/spool/lightstep \\
+        --collector-host collector.lightstep.com --collector-port 443 \\
+        --concurrency 4 --rate 50 --delete
+
+Directories are searched for complete segments, which are uploaded in the
+order they were written; protobuf and thrift reports may be mixed. Segments
+are memory-mapped and read one report at a time, and at most twice
+--concurrency reports wait for an upload thread, so memory use does not grow
+with the size of the spool.
+"""
+from __future__ import print_function
+
+import argparse
+import mmap
+import os
+import sys
+import threading
+import time
+import traceback
+
+from six.moves import queue
+
+from . import constants
+from . import framing
+from . import util
+from .file_exporter import SEGMENT_SUFFIX
+
+
+def _segments(paths):
+    """The segment files among paths, with directories replaced by the
+    complete segments they hold, oldest first."""
+    segments = []
+    for path in paths:
+        if os.path.isdir(path):
+            segments.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.endswith(SEGMENT_SUFFIX)))
+        else:
+            segments.append(path)
+    return segments
+
+
+class _MappedReader(object):
+    """read(n) over a memory-mapped file, for framing.read_frame: only the
+    bytes read are copied, and the kernel pages the rest in and out."""
+    def __init__(self, mapped):
+        self._mapped = mapped
+        self._offset = 0
+
+    def read(self, size):
+        data = self._mapped[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+def _frames(path):
+    """Yield the (kind, access_token, payload) frames of a segment. Raises
+    framing.FrameError at a damaged frame."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            reader = _MappedReader(mapped)
+            while True:
+                frame = framing.read_frame(reader.read)
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            mapped.close()
+
+
+class _RateLimiter(object):
+    """Spaces calls to acquire() at least 1 / rate seconds apart, across
+    threads."""
+    def __init__(self, rate, clock=util._monotonic, sleep=time.sleep):
+        self._interval = 1.0 / rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = None
+
+    def acquire(self):
+        with self._lock:
+            now = self._clock()
+            slot = now if self._next is None else max(self._next, now)
+            self._next = slot + self._interval
+        if slot > now:
+            self._sleep(slot - now)
+
+
+class _Segment(object):
+    """Tracks the reports of one segment that are still being uploaded."""
+    def __init__(self, path):
+        self.path = path
+        self.pending = 0
+        self.read = False
+        self.failed = False
+
+
+class Replayer(object):
+    """Uploads the reports in segment files to a collector.
+
+    :param str collector_host: LightStep collector hostname
+    :param int collector_port: LightStep collector port
+    :param str collector_encryption: one of 'tls' or 'none'
+    :param str access_token: if given, used for every report instead of the
+        access token it was recorded with
+    :param int concurrency: reports uploaded at once
+    :param float rate: reports started per second at most, or None for no
+        limit
+    :param int retries: times a failed report is tried again, with a backoff
+        doubling from constants.REPLAY_RETRY_SECS
+    :param bool delete: delete each segment once all its reports are uploaded
+    :param float timeout_seconds: timeout for each report
+    :param int verbosity: 1 to print upload errors
+    """
+    def __init__(self,
+                 collector_host='collector.lightstep.com',
+                 collector_port=443,
+                 collector_encryption='tls',
+                 access_token=None,
+                 concurrency=4,
+                 rate=None,
+                 retries=3,
+                 delete=False,
+                 timeout_seconds=30,
+                 verbosity=0):
+        self._secure = collector_encryption != 'none'
+        self._collector_host = collector_host
+        self._collector_port = collector_port
+        self._access_token = access_token
+        self._concurrency = max(1, concurrency)
+        self._rate_limiter = _RateLimiter(rate) if rate else None
+        self._retries = retries
+        self._delete = delete
+        self._timeout_seconds = timeout_seconds
+        self._verbosity = verbosity
+        self._lock = threading.Lock()
+        self.stats = {
+            'segments': 0,
+            'segments_deleted': 0,
+            'frame_errors': 0,
+            'reports_sent': 0,
+            'report_errors': 0,
+            'retries': 0,
+            'bytes_sent': 0,
+        }
+
+    def run(self, paths):
+        """Upload every segment found in paths. Returns whether every report
+        was uploaded."""
+        frames = queue.Queue(2 * self._concurrency)
+        threads = [threading.Thread(target=self._upload, args=(frames,),
+                                    name='Replay {0}'.format(i))
+                   for i in range(self._concurrency)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for path in _segments(paths):
+                self._read(path, frames)
+        finally:
+            for _ in threads:
+                frames.put(None)
+            for thread in threads:
+                thread.join()
+        return (self.stats['frame_errors'] == 0 and
+                self.stats['report_errors'] == 0)
+
+    def _read(self, path, frames):
+        segment = _Segment(path)
+        with self._lock:
+            self.stats['segments'] += 1
+        try:
+            for frame in _frames(path):
+                with self._lock:
+                    segment.pending += 1
+                frames.put((segment, frame))
+        except (framing.FrameError, OSError, ValueError) as e:
+            # ValueError: a file that cannot be mapped.
+            with self._lock:
+                self.stats['frame_errors'] += 1
+                segment.failed = True
+            if self._verbosity >= 1:
+                print('[LightStep Replay]: {0}: {1}'.format(path, e))
+        with self._lock:
+            segment.read = True
+        self._done(segment, True)
+
+    def _done(self, segment, ok):
+        with self._lock:
+            if not ok:
+                segment.failed = True
+            if segment.pending or not segment.read or segment.failed or \
+                    not self._delete:
+                return
+            # Only ever reached once: nothing is pending and all was read.
+            segment.read = False
+        os.remove(segment.path)
+        with self._lock:
+            self.stats['segments_deleted'] += 1
+
+    def _upload(self, frames):
+        connections = {}
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            segment, frame = item
+            ok = self._send(connections, *frame)
+            with self._lock:
+                segment.pending -= 1
+            self._done(segment, ok)
+        for connection in connections.values():
+            connection.close()
+
+    def _send(self, connections, kind, access_token, payload):
+        """Upload one report, retrying failures. Returns whether it was
+        uploaded."""
+        token = self._access_token or access_token
+        for attempt in range(self._retries + 1):
+            if attempt:
+                with self._lock:
+                    self.stats['retries'] += 1
+                time.sleep(constants.REPLAY_RETRY_SECS * 2 ** (attempt - 1))
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            try:
+                connection = self._connection(connections, kind)
+                if kind == framing.KIND_PROTO:
+                    from lightstep.collector_pb2 import Auth, ReportRequest
+                    auth = Auth(access_token=token)
+                    # The appended auth field takes precedence over the one
+                    # recorded in the payload.
+                    response = connection.report(
+                        auth, ReportRequest(),
+                        payload + ReportRequest(auth=auth).SerializeToString())
+                else:
+                    from thrift.TSerialization import deserialize
+                    from lightstep.crouton import ttypes
+                    report = deserialize(ttypes.ReportRequest(), payload)
+                    response = connection.report(ttypes.Auth(token), report)
+                if response is None:
+                    raise Exception('no connection to the collector')
+            except Exception as e:
+                if self._verbosity >= 1:
+                    print('[LightStep Replay]: report failed: {0}, stack trace: {1}'.format(
+                        e, traceback.format_exc()))
+                continue
+            with self._lock:
+                self.stats['reports_sent'] += 1
+                self.stats['bytes_sent'] += len(payload)
+            return True
+        with self._lock:
+            self.stats['report_errors'] += 1
+        return False
+
+    def _connection(self, connections, kind):
+        connection = connections.get(kind)
+        if connection is None:
+            use_thrift = kind == framing.KIND_THRIFT
+            url = util._collector_url_from_hostport(
+                self._secure, self._collector_host, self._collector_port,
+                use_thrift)
+            if use_thrift:
+                from lightstep.thrift_connection import _ThriftConnection
+                connection = _ThriftConnection(url)
+            else:
+                from lightstep.http_connection import _HTTPConnection
+                connection = _HTTPConnection(url, self._timeout_seconds)
+            connections[kind] = connection
+        if not connection.ready:
+            connection.open()
+        return connection
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='spool directory or segment file')
+    parser.add_argument('--collector-host', default='collector.lightstep.com')
+    parser.add_argument('--collector-port', type=int, default=443)
+    parser.add_argument('--collector-encryption', choices=['tls', 'none'],
+                        default='tls')
+    parser.add_argument('--access-token',
+                        help='access token for every report, instead of the '
+                             'ones they were recorded with')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='reports uploaded at once')
+    parser.add_argument('--rate', type=float,
+                        help='reports started per second at most')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='times a failed report is tried again')
+    parser.add_argument('--delete', action='store_true',
+                        help='delete segments once they are uploaded')
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='timeout for each report, in seconds')
+    parser.add_argument('-v', '--verbose', action='count', default=0)
+    args = parser.parse_args(argv)
+
+    replayer = Replayer(collector_host=args.collector_host,
+                        collector_port=args.collector_port,
+                        collector_encryption=args.collector_encryption,
+                        access_token=args.access_token,
+                        concurrency=args.concurrency,
+                        rate=args.rate,
+                        retries=args.retries,
+                        delete=args.delete,
+                        timeout_seconds=args.timeout,
+                        verbosity=args.verbose)
+    ok = replayer.run(args.paths)
+    print('[LightStep Replay]: {0}'.format(replayer.stats))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
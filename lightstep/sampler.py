@@ -0,0 +1,295 @@
+"""
+Head-based samplers, which decide whether a trace is recorded when its root
+span starts:
+
+    tracer = lightstep.Tracer(
+        access_token=...,
+        sampler=PerOperationSampler(0.1, {
+            'health_check': 0.0,
+            'checkout': 1.0,
+            'search': RateLimitingSampler(20),
+        }))
+
+Spans of a trace that is not sampled cost little more than their SpanContext,
+which still propagates the decision (and baggage) to child spans and to
+downstream services.
+
+An AdaptiveSampler instead adjusts the rates of operations to a budget of
+spans per second, as traffic changes.
+"""
+import threading
+
+from basictracer.context import SpanContext
+from basictracer.recorder import Sampler as _BasicSampler
+
+from . import constants
+from . import util
+
+
+def _hash(trace_id):
+    """A uniformly distributed 64 bit hash of the low 64 bits of trace_id
+    (the bits LightStep keeps, see constants.TRACE_ID_MASK): the splitmix64
+    finalizer."""
+    z = trace_id & constants.TRACE_ID_MASK
+    z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & constants.TRACE_ID_MASK
+    z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & constants.TRACE_ID_MASK
+    return z ^ (z >> 31)
+
+
+class _UndecidedSpanContext(SpanContext):
+    """An extracted SpanContext whose caller left the sampling decision to
+    this service: the Tracer's sampler makes it for the spans started from
+    it. Its sampled attribute is True, as for the contexts of sampled
+    traces, so that propagators that expect a bool (such as the text map
+    and binary ones) pass it on as they always have."""
+
+
+class Sampler(_BasicSampler):
+    """Base class of the samplers here. Unlike basictracer's samplers, they
+    are also given the operation name of the root span:
+    sampled(trace_id, operation_name=None)."""
+
+
+class ProbabilisticSampler(Sampler):
+    """Samples a fraction `rate` of traces.
+
+    The decision is a function of the trace id alone, so every service that
+    samples at the same rate makes the same decision for a trace, and at a
+    lower rate samples a subset of the traces sampled at a higher one.
+    """
+    def __init__(self, rate):
+        if not 0.0 <= rate <= 1.0:
+            raise Exception('rate must be between 0 and 1')
+        self.rate = rate
+        self._threshold = int(rate * (1 << 64))
+
+    def sampled(self, trace_id, operation_name=None):
+        return _hash(trace_id) < self._threshold
+
+
+class RateLimitingSampler(Sampler):
+    """Samples at most max_traces_per_second traces per second, allowing
+    bursts of up to one second's worth.
+
+    :param float max_traces_per_second: the sustained rate
+    :param clock: a monotonic clock, for tests
+    """
+    def __init__(self, max_traces_per_second, clock=util._monotonic):
+        self.max_traces_per_second = max_traces_per_second
+        self._capacity = max(1.0, float(max_traces_per_second))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._balance = self._capacity
+        self._last = clock()
+
+    def sampled(self, trace_id, operation_name=None):
+        with self._lock:
+            now = self._clock()
+            self._balance = min(
+                self._capacity,
+                self._balance + (now - self._last) * self.max_traces_per_second)
+            self._last = now
+            if self._balance < 1.0:
+                return False
+            self._balance -= 1.0
+            return True
+
+
+def _as_sampler(sampler):
+    if isinstance(sampler, (int, float)):
+        return ProbabilisticSampler(sampler)
+    return sampler
+
+
+class PerOperationSampler(Sampler):
+    """Samples each trace with the sampler for the operation name of its
+    root span, or with `default`.
+
+    :param default: a Sampler, or a rate for a ProbabilisticSampler
+    :param dict operations: operation name -> a Sampler or a rate
+    """
+    def __init__(self, default, operations=None):
+        self.default = _as_sampler(default)
+        self.operations = dict(
+            (name, _as_sampler(sampler))
+            for name, sampler in (operations or {}).items())
+
+    def sampled(self, trace_id, operation_name=None):
+        return self.operations.get(operation_name, self.default).sampled(
+            trace_id, operation_name)
+
+
+class _Operation(object):
+    """An AdaptiveSampler's estimate and rate for one operation."""
+    def __init__(self):
+        self.count = 0
+        self.last_sampled = None
+        self.traces_per_second = None
+        self.idle_windows = 0
+        self.probability = 1.0
+        self.threshold = 1 << 64
+
+
+class AdaptiveSampler(Sampler):
+    """Samples traces so that about spans_per_second spans are recorded per
+    second, sharing them out among operations (by the root span's operation
+    name).
+
+    A head sampler decides on whole traces, so the budget is turned into
+    one of traces per second, traces_per_second: spans_per_second divided
+    by the average number of spans of a sampled trace. The Tracer counts
+    the spans it records with record_span(), and every window_seconds that
+    average is updated with those spans and the traces sampled (spans of
+    traces sampled upstream count against the budget too). Until spans are
+    counted, traces are taken to have one span each.
+
+    Every window_seconds, the sampler updates its estimate of how many
+    traces of each operation start per second, and gives each operation an
+    equal share of the budget, with the share of operations that need less
+    going to the others (max-min fairness). Rare operations are thus sampled
+    fully, and frequent ones at the rate that fits the rest of the budget.
+    Every operation is sampled at min_traces_per_second at least, even if
+    that exceeds the budget. Estimates go up as soon as traffic does, and
+    come down more gradually.
+
+    Until rates are adapted to it, new traffic (such as a spike, or the
+    operations seen for the first time, which are sampled fully) could take
+    far more than the budget: once a window has had its budget, only
+    operations that would otherwise fall short of min_traces_per_second get
+    a trace sampled. Past max_operations, further operation names share one
+    estimate, which keeps memory bounded with high cardinality operation
+    names; operations not seen for a while are forgotten.
+
+    Like a ProbabilisticSampler, the decision is a hash of the trace id
+    compared to the operation's rate.
+
+    :param float spans_per_second: the budget
+    :param float min_traces_per_second: the rate every operation gets
+    :param float window_seconds: how often rates are adapted
+    :param int max_operations: operation names tracked separately
+    :param clock: a monotonic clock, for tests
+    """
+    def __init__(self, spans_per_second,
+                 min_traces_per_second=constants.ADAPTIVE_MIN_TRACES_PER_SEC,
+                 window_seconds=constants.ADAPTIVE_WINDOW_SECS,
+                 max_operations=constants.ADAPTIVE_MAX_OPERATIONS,
+                 clock=util._monotonic):
+        self.spans_per_second = spans_per_second
+        self.spans_per_trace = 1.0
+        self.traces_per_second = spans_per_second
+        self.min_traces_per_second = min_traces_per_second
+        self._window_seconds = window_seconds
+        self._max_operations = max_operations
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._operations = {}
+        # Shared by the operations beyond max_operations.
+        self._other = _Operation()
+        self._window_start = clock()
+        self._window_budget = self.traces_per_second * window_seconds
+        self._window_sampled = 0
+        self._window_spans = 0
+        self._spans_counted = False
+        self._min_interval = 1.0 / min_traces_per_second \
+            if min_traces_per_second > 0 else float('inf')
+
+    def sampled(self, trace_id, operation_name=None):
+        with self._lock:
+            now = self._clock()
+            if now - self._window_start >= self._window_seconds:
+                self._adapt(now)
+            operation = self._operations.get(operation_name)
+            if operation is None:
+                if len(self._operations) < self._max_operations:
+                    operation = self._operations[operation_name] = \
+                        _Operation()
+                else:
+                    operation = self._other
+            operation.count += 1
+            if _hash(trace_id) >= operation.threshold:
+                return False
+            if self._window_sampled >= self._window_budget and \
+                    operation.last_sampled is not None and \
+                    now - operation.last_sampled < self._min_interval:
+                return False
+            operation.last_sampled = now
+            self._window_sampled += 1
+            return True
+
+    def record_span(self, span):
+        """Count a recorded span against the budget."""
+        # Without the lock, which every finished span would otherwise take:
+        # an increment lost to a race only nudges an estimate.
+        self._window_spans += 1
+
+    def _adapt(self, now):
+        elapsed = now - self._window_start
+        if self._window_sampled and self._window_spans:
+            observed = self._window_spans / float(self._window_sampled)
+            if not self._spans_counted:
+                self._spans_counted = True
+                self.spans_per_trace = observed
+            else:
+                self.spans_per_trace += constants.ADAPTIVE_DECAY * (
+                    observed - self.spans_per_trace)
+            self.traces_per_second = \
+                self.spans_per_second / self.spans_per_trace
+            self._window_budget = self.traces_per_second * self._window_seconds
+        self._window_start = now
+        self._window_sampled = 0
+        self._window_spans = 0
+        operations = list(self._operations.items()) + [(None, self._other)]
+        for name, operation in operations:
+            observed = operation.count / elapsed
+            if operation.traces_per_second is None or \
+                    observed > operation.traces_per_second:
+                operation.traces_per_second = observed
+            else:
+                operation.traces_per_second += constants.ADAPTIVE_DECAY * (
+                    observed - operation.traces_per_second)
+            if operation.count:
+                operation.idle_windows = 0
+            else:
+                operation.idle_windows += 1
+                if operation.idle_windows >= \
+                        constants.ADAPTIVE_FORGET_AFTER_WINDOWS and \
+                        operation is not self._other:
+                    del self._operations[name]
+            operation.count = 0
+
+        # The largest share such that the operations, each taking at most
+        # that much, fit the budget.
+        rates = sorted(op.traces_per_second for _, op in operations)
+        share = float('inf')
+        remaining = float(self.traces_per_second)
+        for i, rate in enumerate(rates):
+            fair = remaining / (len(rates) - i)
+            if rate > fair:
+                share = fair
+                break
+            remaining -= rate
+        share = max(share, self.min_traces_per_second)
+        for _, operation in operations:
+            rate = operation.traces_per_second
+            operation.probability = 1.0 if rate <= share else share / rate
+            operation.threshold = int(operation.probability * (1 << 64))
+
+    def stats(self):
+        """The budget (in spans, and in traces at the estimated spans per
+        trace), and the estimated traces per second and sampling probability
+        of each operation (and of those beyond max_operations, together)."""
+        def entry(operation):
+            return {
+                'traces_per_second': operation.traces_per_second or 0.0,
+                'probability': operation.probability,
+            }
+
+        with self._lock:
+            return {
+                'spans_per_second': self.spans_per_second,
+                'spans_per_trace': self.spans_per_trace,
+                'traces_per_second': self.traces_per_second,
+                'operations': dict((name, entry(operation)) for name, operation
+                                   in self._operations.items()),
+                'other_operations': entry(self._other),
+            }
@@ -0,0 +1,273 @@
+""" A connection that spreads reports over a pool of satellites (collector
+    endpoints), tracking their health passively.
+"""
+import random
+import socket
+import threading
+
+from . import constants
+from . import util
+
+# Weight of the latest sample in the round trip time and error rate moving
+# averages.
+_EWMA_ALPHA = 0.3
+
+# Error rates only eject an endpoint once they are based on this many
+# reports since it was (re-)admitted.
+_MIN_ERROR_RATE_SAMPLES = 5
+
+
+def _parse_endpoint(endpoint):
+    """(host, port) from 'host:port', '[v6]:port' or a (host, port) pair."""
+    if isinstance(endpoint, str):
+        host, port = endpoint.rsplit(':', 1)
+        return host.strip('[]'), int(port)
+    host, port = endpoint
+    return host, int(port)
+
+
+class _DNSCache(object):
+    """Resolves hostnames to their addresses, caching the answers for
+    ttl_seconds. When a refresh fails, the stale answer is kept."""
+    def __init__(self, ttl_seconds, clock=util._monotonic):
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def resolve(self, host, port):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get((host, port))
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            addresses = sorted(set(info[4][0] for info in infos))
+        except (OSError, socket.error):
+            if entry is not None:
+                addresses = entry[1]
+            else:
+                # Leave it to the connection, which will fail (and get the
+                # endpoint ejected) if the name still does not resolve.
+                addresses = [host]
+        with self._lock:
+            self._entries[(host, port)] = (now + self._ttl_seconds, addresses)
+        return addresses
+
+
+class _Endpoint(object):
+    """One satellite address, its connection and its health."""
+    def __init__(self, host, port, connection):
+        self.host = host
+        self.port = port
+        self.connection = connection
+        self.rtt = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = None
+
+    def load(self):
+        """Expected cost of sending the next report here: the smoothed round
+        trip time, scaled up by the reports already in flight and by the
+        error rate. Endpoints that have not answered yet cost nothing, so
+        that they get tried."""
+        if self.rtt is None:
+            return 0.0
+        return (self.rtt * (1 + self.in_flight) /
+                max(0.05, 1.0 - self.error_rate))
+
+
+class _SatellitePool(object):
+    """A connection that sends each report to one of several satellites.
+
+    Endpoints are resolved through a DNS cache: with collector_encryption
+    'none' every address of a hostname becomes an endpoint of its own. With
+    TLS the certificate is checked against the hostname, so each hostname
+    stays a single endpoint and is resolved by the connection instead.
+
+    Each report goes to the less loaded of two endpoints picked at random
+    (power of two choices), by smoothed round trip time, reports in flight
+    and error rate. After SATELLITE_EJECT_AFTER_FAILURES consecutive
+    failures, or an error rate above SATELLITE_EJECT_ERROR_RATE, an endpoint
+    is ejected for SATELLITE_EJECT_SECONDS, doubling with every ejection in
+    a row up to SATELLITE_MAX_EJECT_SECONDS. Once that passes it is
+    re-admitted on probation: one failure ejects it again, one success
+    clears its record. When every endpoint is ejected, all are used.
+
+    A report that fails is retried once on another endpoint if time is left.
+    """
+    def __init__(self, endpoints, secure, use_thrift, timeout_seconds,
+                 dns_ttl_seconds=constants.DNS_TTL_SECS,
+                 clock=util._monotonic, rng=None):
+        if not endpoints:
+            raise Exception('collector_endpoints must not be empty')
+        self._targets = [_parse_endpoint(e) for e in endpoints]
+        self._secure = secure
+        self._use_thrift = use_thrift
+        self._timeout_seconds = timeout_seconds
+        self._dns = _DNSCache(dns_ttl_seconds, clock)
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._endpoints = []
+        self.ready = True
+
+    def _current_endpoints(self):
+        """The current endpoints, refreshed from DNS when the cache
+        expires."""
+        addresses = []
+        for host, port in self._targets:
+            if self._secure:
+                addresses.append((host, port))
+            else:
+                addresses.extend((address, port) for address
+                                 in self._dns.resolve(host, port))
+        with self._lock:
+            current = dict(((e.host, e.port), e) for e in self._endpoints)
+            endpoints = []
+            for address in addresses:
+                endpoint = current.pop(address, None)
+                if endpoint is None:
+                    endpoint = _Endpoint(address[0], address[1],
+                                         self._connect(*address))
+                endpoints.append(endpoint)
+            self._endpoints = endpoints
+        for endpoint in current.values():
+            endpoint.connection.close()
+        return endpoints
+
+    @property
+    def stats(self):
+        now = self._clock()
+        with self._lock:
+            ejected = sum(1 for e in self._endpoints if self._ejected(e, now))
+            return {
+                'endpoints': len(self._endpoints),
+                'endpoints_ejected': ejected,
+            }
+
+    def _connect(self, host, port):
+        if ':' in host:
+            host = '[{0}]'.format(host)
+        url = util._collector_url_from_hostport(self._secure, host, port,
+                                                self._use_thrift)
+        if self._use_thrift:
+            from lightstep.thrift_connection import _ThriftConnection
+            return _ThriftConnection(url)
+        from lightstep.http_connection import _HTTPConnection
+        return _HTTPConnection(url, self._timeout_seconds)
+
+    def open(self):
+        """Resolve the endpoints. Their connections are opened on first
+        use."""
+        self._current_endpoints()
+
+    @staticmethod
+    def _ejected(endpoint, now):
+        return endpoint.ejected_until is not None and endpoint.ejected_until > now
+
+    def _choose(self, endpoints, exclude=None):
+        now = self._clock()
+        with self._lock:
+            candidates = [e for e in endpoints
+                          if e is not exclude and not self._ejected(e, now)]
+            if not candidates and exclude is None:
+                candidates = list(endpoints)
+            if not candidates:
+                return None
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            else:
+                first, second = self._rng.sample(candidates, 2)
+                chosen = first if first.load() <= second.load() else second
+            chosen.in_flight += 1
+            return chosen
+
+    # May throw an Exception on failure.
+    def report(self, *args, **kwargs):
+        """Report to one of the endpoints.
+
+        An already serialized report may be passed as a third argument, and
+        the time allowed for this report (including the retry on another
+        endpoint) as the `timeout` keyword argument.
+        """
+        timeout = kwargs.pop('timeout', self._timeout_seconds)
+        deadline = self._clock() + timeout
+        endpoints = self._current_endpoints()
+        endpoint = self._choose(endpoints)
+        try:
+            return self._report_to(endpoint, args, timeout)
+        except Exception:
+            retry = self._choose(endpoints, exclude=endpoint)
+            remaining = deadline - self._clock()
+            if retry is None:
+                raise
+            if remaining <= 0:
+                with self._lock:
+                    retry.in_flight -= 1
+                raise
+            return self._report_to(retry, args, remaining)
+
+    def _report_to(self, endpoint, args, timeout):
+        """Send a report to an endpoint chosen by _choose()."""
+        start = self._clock()
+        try:
+            connection = endpoint.connection
+            if not connection.ready:
+                connection.open()
+            if not connection.ready:
+                raise Exception('could not connect to {0}:{1}'.format(
+                    endpoint.host, endpoint.port))
+            response = connection.report(*args, timeout=timeout)
+        except Exception:
+            self._record(endpoint, self._clock() - start, False)
+            raise
+        self._record(endpoint, self._clock() - start, True)
+        return response
+
+    def _record(self, endpoint, rtt, ok):
+        now = self._clock()
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.samples += 1
+            endpoint.error_rate += _EWMA_ALPHA * ((0.0 if ok else 1.0) -
+                                                  endpoint.error_rate)
+            if ok:
+                # Failures say little about how fast an endpoint answers.
+                if endpoint.rtt is None:
+                    endpoint.rtt = rtt
+                else:
+                    endpoint.rtt += _EWMA_ALPHA * (rtt - endpoint.rtt)
+                endpoint.consecutive_failures = 0
+                if endpoint.ejected_until is not None:
+                    # Passed probation.
+                    endpoint.ejections = 0
+                    endpoint.ejected_until = None
+                    endpoint.error_rate = 0.0
+                    endpoint.samples = 0
+                return
+
+            endpoint.consecutive_failures += 1
+            on_probation = endpoint.ejected_until is not None
+            if (on_probation or endpoint.consecutive_failures >=
+                    constants.SATELLITE_EJECT_AFTER_FAILURES or
+                    (endpoint.samples >= _MIN_ERROR_RATE_SAMPLES and
+                     endpoint.error_rate >
+                     constants.SATELLITE_EJECT_ERROR_RATE)):
+                endpoint.ejected_until = now + min(
+                    constants.SATELLITE_MAX_EJECT_SECONDS,
+                    constants.SATELLITE_EJECT_SECONDS * 2 ** endpoint.ejections)
+                endpoint.ejections += 1
+                endpoint.consecutive_failures = 0
+                endpoint.samples = 0
+
+    def close(self):
+        """Close the connections to all endpoints."""
+        with self._lock:
+            endpoints, self._endpoints = self._endpoints, []
+        for endpoint in endpoints:
+            endpoint.connection.close()
@@ -0,0 +1,87 @@
+"""
+A contextvars based ScopeManager for asyncio (and threaded) services.
+
+Requires Python 3.7 or newer. Use it by passing an instance to the Tracer:
+
+    tracer = lightstep.Tracer(scope_manager=ContextVarsScopeManager(), ...)
+
+The active Scope follows the code that activated it across awaits, into tasks
+created with asyncio.create_task() (which copy the current context), and into
+executors when submitted through run_in_executor() below.
+"""
+from __future__ import absolute_import
+
+import contextvars
+import functools
+
+from opentracing import Scope, ScopeManager
+
+from . import constants
+
+
+class ContextVarsScopeManager(ScopeManager):
+    """ScopeManager that keeps the active Scope in a ContextVar.
+
+    Activating and closing a Scope are both O(1): each Scope remembers the
+    ContextVar token that activated it (and the Scope it replaced), so
+    closing never has to search for its parent.
+
+    Scopes truncate the trace_id of their span to 64 bits when they close,
+    which is what LightStep expects, so the tracer does not need to patch
+    them the way it patches other scope managers' scopes.
+    """
+
+    def __init__(self):
+        super(ContextVarsScopeManager, self).__init__()
+        self._active = contextvars.ContextVar('lightstep_scope', default=None)
+
+    def activate(self, span, finish_on_close):
+        return _ContextVarsScope(self, span, finish_on_close)
+
+    @property
+    def active(self):
+        return self._active.get()
+
+
+class _ContextVarsScope(Scope):
+    __slots__ = ('_finish_on_close', '_previous', '_token')
+
+    _truncates_trace_id = True
+
+    def __init__(self, manager, span, finish_on_close):
+        super(_ContextVarsScope, self).__init__(manager, span)
+        self._finish_on_close = finish_on_close
+        active = manager._active
+        self._previous = active.get()
+        self._token = active.set(self)
+
+    def close(self):
+        active = self._manager._active
+        if active.get() is not self:
+            # Only the active Scope can be closed.
+            return
+
+        try:
+            active.reset(self._token)
+        except ValueError:
+            # The Scope is closed from a different Context than the one it
+            # was activated in (e.g. by another task); restoring the previous
+            # Scope by hand is equivalent.
+            active.set(self._previous)
+        self._previous = None
+
+        context = self._span.context
+        if context.trace_id is not None:
+            context.trace_id &= constants.TRACE_ID_MASK
+
+        if self._finish_on_close:
+            self._span.finish()
+
+
+def run_in_executor(loop, executor, func, *args):
+    """Like loop.run_in_executor(), but func runs with the caller's context,
+    so the active Scope (and any other ContextVar) is visible inside it.
+    """
+    context = contextvars.copy_context()
+    return loop.run_in_executor(
+        executor, functools.partial(context.run, func, *args))
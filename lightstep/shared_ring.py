@@ -0,0 +1,273 @@
+"""
+Shared-memory span rings, for aggregating the spans of many worker processes
+on one host (gunicorn, multiprocessing) into the reports of a single one.
+
+Every process writes its encoded span records into its own ring: a file in a
+shared directory (ideally on tmpfs, e.g. /dev/shm), mapped into memory. Each
+ring has exactly one writer (its process, serialized by the Recorder's lock)
+and at most one reader (the reporter), so it needs no locks: each side only
+ever stores its own position, with a single aligned 8-byte store, and a
+process that dies halfway through a record has not published it yet.
+
+The reporter is elected with an exclusive flock() on a lock file in the same
+directory. Whichever process holds it drains every ring and reports their
+spans; the others never touch the network. The reporter releases the lock
+when its Recorder shuts down, and the kernel does when it exits or crashes;
+the next process to flush takes over from where it stopped, since the read
+positions live in the rings themselves.
+
+Requires a POSIX system (fcntl).
+"""
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import threading
+
+_MAGIC = b'LSRING02'
+# Header: magic, capacity, pid, then the write (head) and read (tail)
+# positions. The rings never leave the host, so the header uses the native
+# byte order: native struct formats copy a position with one 8-byte memcpy,
+# a single store or load at these 8-byte aligned offsets, where the
+# standard ones ('<Q') go byte by byte and may be seen half written.
+_HEADER = struct.Struct('8sQQQQ')
+_CAPACITY_OFFSET = 8
+_PID_OFFSET = 16
+_HEAD_OFFSET = 24
+_TAIL_OFFSET = 32
+_DATA_OFFSET = 64
+
+_POSITION = struct.Struct('Q')
+_LENGTH = struct.Struct('<I')
+# A record length marking the rest of the ring, up to its end, as unused.
+_WRAP = 0xffffffff
+
+_RING_PREFIX = 'ring-'
+_LOCK_NAME = 'reporter.lock'
+
+
+class _SpanRing(object):
+    """A single-producer, single-consumer ring of byte strings in a memory
+    mapped file.
+
+    Positions only ever grow; a position's offset in the ring is
+    position % capacity. A record is a 4-byte length followed by the data,
+    and never wraps around the end of the ring.
+    """
+    def __init__(self, path, capacity=None):
+        """Open the ring at path. With a capacity, (re)create it for the
+        current process to write to."""
+        self.path = path
+        fd = os.open(path, os.O_RDWR | (os.O_CREAT if capacity else 0), 0o600)
+        try:
+            if capacity:
+                os.ftruncate(fd, _DATA_OFFSET + capacity)
+            self._map = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+        if capacity:
+            _HEADER.pack_into(self._map, 0, _MAGIC, capacity, os.getpid(),
+                              0, 0)
+        elif self._map[:8] != _MAGIC:
+            self._map.close()
+            raise ValueError('not a span ring: {0}'.format(path))
+        self.capacity = _POSITION.unpack_from(self._map, _CAPACITY_OFFSET)[0]
+        self.pid = _POSITION.unpack_from(self._map, _PID_OFFSET)[0]
+        self._head = self._load(_HEAD_OFFSET)
+
+    def _load(self, offset):
+        return _POSITION.unpack_from(self._map, offset)[0]
+
+    def _store(self, offset, position):
+        _POSITION.pack_into(self._map, offset, position)
+
+    def put(self, data):
+        """Append data to the ring. Returns False if it does not fit."""
+        needed = _LENGTH.size + len(data)
+        head = self._head
+        offset = head % self.capacity
+        to_end = self.capacity - offset
+        padding = to_end if to_end < needed else 0
+        if head + padding + needed - self._load(_TAIL_OFFSET) > self.capacity:
+            return False
+
+        if padding:
+            if to_end >= _LENGTH.size:
+                _LENGTH.pack_into(self._map, _DATA_OFFSET + offset, _WRAP)
+            head += padding
+            offset = 0
+        start = _DATA_OFFSET + offset
+        _LENGTH.pack_into(self._map, start, len(data))
+        self._map[start + _LENGTH.size:start + needed] = data
+        # Publish the record only once it is completely written.
+        self._head = head + needed
+        self._store(_HEAD_OFFSET, self._head)
+        return True
+
+    def drain(self, limit):
+        """Remove and return up to limit records from the ring."""
+        head = self._load(_HEAD_OFFSET)
+        tail = self._load(_TAIL_OFFSET)
+        records = []
+        while tail < head and len(records) < limit:
+            offset = tail % self.capacity
+            to_end = self.capacity - offset
+            if to_end < _LENGTH.size:
+                tail += to_end
+                continue
+            start = _DATA_OFFSET + offset
+            length = _LENGTH.unpack_from(self._map, start)[0]
+            if length == _WRAP:
+                tail += to_end
+                continue
+            start += _LENGTH.size
+            records.append(self._map[start:start + length])
+            tail += _LENGTH.size + length
+        self._store(_TAIL_OFFSET, tail)
+        return records
+
+    def empty(self):
+        return self._load(_HEAD_OFFSET) == self._load(_TAIL_OFFSET)
+
+    def close(self):
+        self._map.close()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class _RingDirectory(object):
+    """The rings of all the processes sharing a directory, as seen from one
+    of them: its own ring for writing, and, while it is the reporter, every
+    ring for draining."""
+    def __init__(self, path, ring_bytes):
+        self._path = path
+        self._ring_bytes = ring_bytes
+        self._pid = None
+        self._own_ring = None
+        self._lock_fd = None
+        self._rings = {}
+        self._closed = False
+        # Serializes the reporter's side (is_reporter(), drain()) with
+        # close(), which shutdown() may call from any thread.
+        self._lock = threading.Lock()
+        self.dropped_spans = 0
+
+    def _check_pid(self):
+        """Forget everything inherited from a parent process: rings, and
+        the parent's reporter lock, which a fork() shares with the child."""
+        pid = os.getpid()
+        if pid == self._pid:
+            return
+        self._pid = pid
+        if self._lock_fd is not None:
+            # Closing this copy of the descriptor leaves the parent's lock
+            # be; unlocking it would not.
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        # Unmapping only affects this process.
+        for ring in self._rings.values():
+            if ring is not self._own_ring:
+                ring.close()
+        self._rings = {}
+        if self._own_ring is not None:
+            self._own_ring.close()
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        self._own_ring = _SpanRing(
+            os.path.join(self._path, '{0}{1}'.format(_RING_PREFIX, pid)),
+            self._ring_bytes)
+
+    def put(self, data):
+        """Write an encoded span record to this process' ring. The caller
+        must hold a lock shared by all threads of the process."""
+        if self._closed:
+            self.dropped_spans += 1
+            return
+        self._check_pid()
+        if not self._own_ring.put(data):
+            self.dropped_spans += 1
+
+    def is_reporter(self):
+        """Whether this process is (or has just become) the reporter."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._check_pid()
+            if self._lock_fd is not None:
+                return True
+            fd = os.open(os.path.join(self._path, _LOCK_NAME),
+                         os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                os.close(fd)
+                return False
+            self._lock_fd = fd
+            return True
+
+    def drain(self, limit):
+        """Drain up to limit records from all rings. Only the reporter may
+        call this. Rings of processes that have exited are removed once
+        empty."""
+        with self._lock:
+            if self._closed:
+                return []
+            return self._drain(limit)
+
+    def _drain(self, limit):
+        records = []
+        for name in os.listdir(self._path):
+            if not name.startswith(_RING_PREFIX):
+                continue
+            ring_path = os.path.join(self._path, name)
+            ring = self._rings.get(ring_path)
+            if ring is None:
+                try:
+                    ring = _SpanRing(ring_path)
+                except (OSError, ValueError):
+                    # Still being created, or already removed.
+                    continue
+                self._rings[ring_path] = ring
+            if len(records) < limit:
+                records.extend(ring.drain(limit - len(records)))
+            if (ring is not self._own_ring and ring.empty()
+                    and not _process_alive(ring.pid)):
+                ring.close()
+                del self._rings[ring_path]
+                try:
+                    os.unlink(ring_path)
+                except OSError:
+                    pass
+        return records
+
+    def close(self):
+        """Give up the reporter lock, so that another process can take over
+        right away, and unmap the rings. Spans left in this process' ring are
+        reported by the next reporter."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._lock_fd is not None:
+                # A lock inherited through fork() is the parent's: closing
+                # this copy of the descriptor leaves it be, unlocking would
+                # not.
+                if self._pid == os.getpid():
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                os.close(self._lock_fd)
+                self._lock_fd = None
+            for ring in self._rings.values():
+                if ring is not self._own_ring:
+                    ring.close()
+            self._rings = {}
+            if self._own_ring is not None:
+                self._own_ring.close()
+                self._own_ring = None
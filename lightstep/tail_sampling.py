@@ -0,0 +1,173 @@
+"""
+Tail-based sampling: the Recorder holds the finished spans of each trace
+until it can decide, from all of them, whether the trace is worth keeping:
+
+    tracer = lightstep.Tracer(
+        access_token=...,
+        tail_sampler=TailSampler(min_duration_seconds=0.5,
+                                 operations=['checkout'],
+                                 sample_rate=0.05))
+
+Decisions are local to the process: they see the spans of the trace that
+finished here.
+"""
+import collections
+import threading
+
+from opentracing.ext import tags as ext_tags
+
+from . import constants
+from . import util
+from .sampler import ProbabilisticSampler
+
+
+class _Trace(object):
+    """The spans held for one trace."""
+    def __init__(self, first_seen):
+        self.first_seen = first_seen
+        self.spans = []
+        self.interesting = False
+
+
+class TailSampler(object):
+    """Keeps every trace with an error, a slow span or an operation of
+    interest, and sample_rate of the other traces.
+
+    A trace is decided once its local root span (one without a parent)
+    finishes, or decision_wait_seconds after its first span finished here,
+    for traces whose root is in another service. Spans that finish after
+    their trace was decided follow the decision, if it was made in the last
+    decision_wait_seconds.
+
+    At most max_traces traces and max_spans spans are held: past either, the
+    oldest trace is decided early, with the spans it has. Every span costs
+    constant time, so memory and CPU stay bounded however many traces are
+    in flight.
+
+    :param bool keep_errors: keep traces with a span tagged error=true
+    :param float min_duration_seconds: keep traces with a span at least this
+        long, if given
+    :param list operations: keep traces with a span of one of these
+        operation names
+    :param float sample_rate: the fraction of the other traces kept (by a
+        hash of the trace id, as by a ProbabilisticSampler)
+    :param float decision_wait_seconds: how long spans wait for their root
+    :param int max_traces: traces held at most
+    :param int max_spans: spans held at most
+    :param clock: a monotonic clock, for tests
+    """
+    def __init__(self,
+                 keep_errors=True,
+                 min_duration_seconds=None,
+                 operations=None,
+                 sample_rate=0.0,
+                 decision_wait_seconds=constants.TAIL_DECISION_WAIT_SECS,
+                 max_traces=constants.TAIL_MAX_TRACES,
+                 max_spans=constants.TAIL_MAX_SPANS,
+                 clock=util._monotonic):
+        self._keep_errors = keep_errors
+        self._min_duration_seconds = min_duration_seconds
+        self._operations = frozenset(operations or ())
+        self._sampler = ProbabilisticSampler(sample_rate)
+        self._decision_wait_seconds = decision_wait_seconds
+        self._max_traces = max_traces
+        self._max_spans = max_spans
+        self._clock = clock
+        self._lock = threading.Lock()
+        # trace id -> _Trace, oldest first.
+        self._traces = collections.OrderedDict()
+        self._num_spans = 0
+        # trace id -> (decided at, kept), oldest first.
+        self._decisions = collections.OrderedDict()
+        self._stats = {
+            'traces_kept': 0,
+            'traces_dropped': 0,
+            'traces_decided_early': 0,
+            'late_spans': 0,
+        }
+
+    def add(self, span):
+        """Hold a finished span. Returns the spans of kept traces that are
+        ready to be reported, including span itself if its trace was already
+        kept."""
+        trace_id = span.context.trace_id & constants.TRACE_ID_MASK
+        with self._lock:
+            now = self._clock()
+            released = self._expire(now)
+            decision = self._decisions.get(trace_id)
+            if decision is not None:
+                self._stats['late_spans'] += 1
+                if decision[1]:
+                    released.append(span)
+                return released
+
+            trace = self._traces.get(trace_id)
+            if trace is None:
+                trace = self._traces[trace_id] = _Trace(now)
+            trace.spans.append(span)
+            self._num_spans += 1
+            if not trace.interesting and self._is_interesting(span):
+                trace.interesting = True
+
+            if span.parent_id is None:
+                self._decide(trace_id, now, released)
+            while len(self._traces) > self._max_traces or \
+                    self._num_spans > self._max_spans:
+                self._stats['traces_decided_early'] += 1
+                self._decide(next(iter(self._traces)), now, released)
+        return released
+
+    def release(self, everything=False):
+        """Decide the traces that have waited long enough (or all of them).
+        Returns the spans of those kept."""
+        with self._lock:
+            now = self._clock()
+            if not everything:
+                return self._expire(now)
+            released = []
+            while self._traces:
+                self._decide(next(iter(self._traces)), now, released)
+            return released
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['traces_pending'] = len(self._traces)
+            stats['spans_pending'] = self._num_spans
+        return stats
+
+    def _is_interesting(self, span):
+        if self._keep_errors and span.tags and \
+                span.tags.get(ext_tags.ERROR) in (True, 'true', 'True'):
+            return True
+        if self._min_duration_seconds is not None and \
+                span.duration >= self._min_duration_seconds:
+            return True
+        return span.operation_name in self._operations
+
+    def _expire(self, now):
+        released = []
+        deadline = now - self._decision_wait_seconds
+        while self._traces:
+            trace_id, trace = next(iter(self._traces.items()))
+            if trace.first_seen > deadline:
+                break
+            self._decide(trace_id, now, released)
+        while self._decisions:
+            trace_id, (decided_at, _) = next(iter(self._decisions.items()))
+            if decided_at > deadline and \
+                    len(self._decisions) <= self._max_traces:
+                break
+            del self._decisions[trace_id]
+        return released
+
+    def _decide(self, trace_id, now, released):
+        trace = self._traces.pop(trace_id)
+        self._num_spans -= len(trace.spans)
+        keep = trace.interesting or self._sampler.sampled(trace_id)
+        self._decisions[trace_id] = (now, keep)
+        if keep:
+            self._stats['traces_kept'] += 1
+            released.extend(trace.spans)
+        else:
+            self._stats['traces_dropped'] += 1
@@ -6,6 +6,7 @@ from thrift import Thrift
 from thrift.transport import THttpClient
 from thrift.protocol import TBinaryProtocol
 from .crouton import ReportingService
+from . import tls
 
 CONSECUTIVE_ERRORS_BEFORE_RECONNECT = 200
 
@@ -17,12 +18,19 @@ class _ThriftConnection(object):
     Only one instance of this class should be created per process. The object
     itself is thread-safe, but the underlying Thrift library has shared state
     that makes unsafe to call multiple instances of this class concurrrently.
+
+    THttpClient reconnects for every report; over https, the TLS session is
+    resumed through the one SSLContext the connection keeps (see
+    lightstep.tls).
     """
     def __init__(self, collector_url):
         self._collector_url = collector_url
         self._lock = threading.Lock()
         self._transport = None
         self._client = None
+        self._ssl_context = None
+        if collector_url.startswith('https:'):
+            self._ssl_context = tls._client_context()
         self.ready = False
         self._open_exceptions_count = 0
         self._report_eof_count = 0
@@ -38,7 +46,8 @@ class _ThriftConnection(object):
         """
         self._lock.acquire()
         try:
-            self._transport = THttpClient.THttpClient(self._collector_url)
+            self._transport = THttpClient.THttpClient(
+                self._collector_url, ssl_context=self._ssl_context)
             self._transport.open()
             protocol = TBinaryProtocol.TBinaryProtocol(self._transport)
             self._client = ReportingService.Client(protocol)
@@ -52,7 +61,13 @@ class _ThriftConnection(object):
 
     # May throw an Exception on failure.
     def report(self, *args, **kwargs):
-        """Report to the server."""
+        """Report to the server.
+
+        A `timeout` keyword argument (in seconds) bounds the report. The
+        Report call may be passed already serialized, as a third argument.
+        """
+        timeout = kwargs.pop('timeout', None)
+        data = args[2] if len(args) > 2 else None
         # Notice the annoying case change on the method name. I chose to stay
         # consistent with casing in this class vs staying consistent with the
         # casing of the pass-through method.
@@ -62,8 +77,17 @@ class _ThriftConnection(object):
                 if self._client:
                     headers = {"Lightstep-Access-Token": args[0].access_token}
                     self._transport.setCustomHeaders(headers)
-                    resp = self._client.Report(*args, **kwargs)
+                    if timeout is not None:
+                        self._transport.setTimeout(timeout * 1000)
+                    if data is None:
+                        resp = self._client.Report(args[0], args[1])
+                    else:
+                        self._transport.write(data)
+                        self._transport.flush()
+                        resp = self._client.recv_Report()
                     self._report_consecutive_errors = 0
+                    if self._ssl_context is not None:
+                        self._ssl_context.capture_sessions()
             except Thrift.TException:
                 self._report_consecutive_errors += 1
                 self._report_exceptions_count += 1
@@ -73,6 +97,8 @@ class _ThriftConnection(object):
                 self._report_eof_count += 1
                 raise Exception('EOFError')
             finally:
+                if timeout is not None and self._transport is not None:
+                    self._transport.setTimeout(None)
                 # In case the Thrift client has fallen into an unrecoverable state,
                 # recreate the Thrift data structure if there are continued report
                 # failures
@@ -1,3 +1,4 @@
+import json
 import socket
 import sys
 
@@ -7,6 +8,59 @@ from .crouton import ttypes
 from . import util
 from . import version as tracer_version
 import jsonpickle
+import six
+from thrift import TSerialization
+
+# Payload types the stdlib json module encodes the same way jsonpickle does
+# with unpicklable=False. Containers may still hold arbitrary objects, in
+# which case json raises and we fall back to jsonpickle.
+_JSON_NATIVE_TYPES = (dict, list, tuple, float, bool, type(None)) + \
+    six.string_types + six.integer_types
+
+# Encoders keyed by payload type, filled in lazily by _payload_encoder().
+_payload_encoders = {}
+
+
+class _EncodedPayload(str):
+    """Marks a payload_json that has already been encoded, so spans restored
+    into the buffer after a failed report are not encoded a second time.
+    """
+    pass
+
+
+def _jsonpickle_encode(payload):
+    return jsonpickle.encode(payload,
+                             unpicklable=False,
+                             make_refs=False,
+                             max_depth=constants.JSON_MAX_DEPTH)
+
+
+def _json_encode(payload):
+    try:
+        return json.dumps(payload)
+    except Exception:
+        return _jsonpickle_encode(payload)
+
+
+def _payload_encoder(payload_type):
+    encoder = _payload_encoders.get(payload_type)
+    if encoder is None:
+        if issubclass(payload_type, _JSON_NATIVE_TYPES):
+            encoder = _json_encode
+        else:
+            encoder = _jsonpickle_encode
+        _payload_encoders[payload_type] = encoder
+    return encoder
+
+
+def _encode_payload(payload):
+    """Encode a log payload as JSON, exactly once."""
+    if isinstance(payload, _EncodedPayload):
+        return payload
+    try:
+        return _EncodedPayload(_payload_encoder(type(payload))(payload))
+    except Exception:
+        return _EncodedPayload(_jsonpickle_encode(constants.JSON_FAIL))
 
 
 class ThriftConverter(Converter):
@@ -75,24 +129,32 @@ class ThriftConverter(Converter):
             timestamp_micros=util._time_to_micros(log.timestamp),
             fields=fields))
 
-    def create_report(self, runtime, span_records):
-        report = ttypes.ReportRequest(runtime, span_records, None)
-        for span in report.span_records:
-            if not span.log_records:
-                continue
-            for log in span.log_records:
-                index = span.log_records.index(log)
+    def create_report(self, runtime, span_records, chunk_spans=None, pause=None):
+        for i, span in enumerate(span_records, 1):
+            if span.log_records:
+                for log in span.log_records:
+                    if log.payload_json is not None:
+                        log.payload_json = _encode_payload(log.payload_json)
+            if pause is not None and not i % chunk_spans:
+                pause()
+        return ttypes.ReportRequest(runtime, span_records, None)
+
+    def serialize_span_record(self, span_record):
+        # Payloads are encoded here rather than in create_report, as only
+        # the JSON survives serialization.
+        if span_record.log_records:
+            for log in span_record.log_records:
                 if log.payload_json is not None:
-                    try:
-                        log.payload_json = \
-                            jsonpickle.encode(log.payload_json,
-                                              unpicklable=False,
-                                              make_refs=False,
-                                              max_depth=constants.JSON_MAX_DEPTH)
-                    except:
-                        log.payload_json = jsonpickle.encode(constants.JSON_FAIL)
-                span.log_records[index] = log
-        return report
+                    log.payload_json = _encode_payload(log.payload_json)
+        return TSerialization.serialize(span_record)
+
+    def parse_span_record(self, data):
+        span_record = TSerialization.deserialize(ttypes.SpanRecord(), data)
+        if span_record.log_records:
+            for log in span_record.log_records:
+                if log.payload_json is not None:
+                    log.payload_json = _EncodedPayload(log.payload_json)
+        return span_record
 
     def combine_span_records(self, report_request, span_records):
         return report_request.span_records + span_records
@@ -0,0 +1,98 @@
+""" TLS client contexts that resume sessions across reconnects.
+"""
+import ssl
+import threading
+import weakref
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """An SSLContext that offers each server the TLS session of the previous
+    connection to it. Reconnecting then takes an abbreviated handshake:
+    no certificate exchange or verification, and with TLS 1.2 one round
+    trip less. Servers are free to decline and do a full handshake.
+
+    Only connections made through one context share sessions, so a
+    connection should keep a single context across its reconnects.
+
+    A session is taken once the handshake is done, and again whenever
+    capture_sessions() is called: TLS 1.3 session tickets only arrive after
+    the handshake, along with the server's first data, so connections call
+    it after each request.
+    """
+    def __init__(self, *args, **kwargs):
+        # The protocol is taken by SSLContext.__new__.
+        self._session_lock = threading.Lock()
+        self._session_cache = {}
+        # The latest socket to each server.
+        self._sockets = {}
+        # Counted for connections made with a server_hostname.
+        self.handshakes = 0
+        self.resumed_handshakes = 0
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        key = None
+        server_hostname = kwargs.get('server_hostname')
+        if server_hostname is not None and not kwargs.get('server_side'):
+            key = (server_hostname, sock.getpeername()[1])
+            if kwargs.get('session') is None:
+                with self._session_lock:
+                    kwargs['session'] = self._session_cache.get(key)
+        wrapped = super(_ResumingSSLContext, self).wrap_socket(
+            sock, *args, **kwargs)
+        if key is not None:
+            with self._session_lock:
+                # The handshake is counted once it is done, which with
+                # do_handshake_on_connect=False is after wrap_socket().
+                self._sockets[key] = [weakref.ref(wrapped), False]
+            self.capture_sessions()
+        return wrapped
+
+    def capture_sessions(self):
+        """Keep the current TLS session of each server's latest socket, for
+        the next connection to it."""
+        with self._session_lock:
+            for key, entry in list(self._sockets.items()):
+                sock = entry[0]()
+                if sock is None:
+                    del self._sockets[key]
+                    continue
+                # None once closed. (Before the handshake, the session
+                # offered to the server.)
+                session = sock.session
+                if session is None:
+                    continue
+                if not entry[1] and _handshake_done(sock):
+                    entry[1] = True
+                    self.handshakes += 1
+                    if sock.session_reused:
+                        self.resumed_handshakes += 1
+                # Right after a TLS 1.3 handshake, the session has no ticket
+                # yet to resume it with: keep the previous one until then.
+                cached = self._session_cache.get(key)
+                if session.has_ticket or cached is None or \
+                        not cached.has_ticket:
+                    self._session_cache[key] = session
+
+
+def _handshake_done(sock):
+    try:
+        sock.getpeercert()
+    except ValueError:
+        return False
+    return True
+
+
+def _client_context():
+    """A new _ResumingSSLContext with the default trust store, or without
+    verification when certificate_verification=False turned it off for the
+    ssl module. None where TLS sessions cannot be resumed (Python < 3.6);
+    callers then fall back to their default context."""
+    if not hasattr(ssl, 'SSLSession'):
+        return None
+    context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if ssl._create_default_https_context is ssl._create_unverified_context:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        context.load_default_certs()
+    return context
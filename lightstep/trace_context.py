@@ -1,5 +1,6 @@
 from re import escape, compile as re_compile
-from random import getrandbits
+from lightstep.sampler import _UndecidedSpanContext
+from lightstep.util import _generate_id, _generate_trace_id_128
 from warnings import warn
 from logging import getLogger
 from collections import OrderedDict
@@ -63,6 +64,16 @@ _KEY_VALUE = re_compile(
 
 _BLANK = re_compile(r"^\s*$")
 
+# https://www.w3.org/TR/2019/CR-trace-context-20190813/#sampled-flag
+_SAMPLED_FLAG = 1
+
+
+def _new_trace():
+    # A trace started here, so the Tracer's sampler decides on it.
+    return _UndecidedSpanContext(
+        trace_id=_generate_trace_id_128(), span_id=_generate_id()
+    )
+
 
 class TraceContextPropagator(Propagator):
     """
@@ -85,14 +96,31 @@ class TraceContextPropagator(Propagator):
 
     This set of test cases will be referred to as "the test suite" in the
     comments of this implementation.
+
+    Extracted contexts carry the sampled flag of traceparent, so that a
+    trace the caller did not sample is not recorded here either.
+
+    :param bool honor_sampled: if False, the sampled flag received is
+        ignored and the Tracer's sampler decides on every extracted trace
     """
 
+    def __init__(self, honor_sampled=True):
+        self._honor_sampled = honor_sampled
+
     def inject(self, span_context, carrier):
 
+        trace_flags = span_context.baggage.pop("trace-flags", 0)
+        if not isinstance(span_context, _UndecidedSpanContext):
+            # The decision of this service, which may differ from the one
+            # received, e.g. by sampling.priority.
+            trace_flags = trace_flags & ~_SAMPLED_FLAG | (
+                _SAMPLED_FLAG if span_context.sampled else 0
+            )
+
         carrier[_TRACEPARENT] = "00-{}-{}-{}".format(
             format(span_context.trace_id, "032x"),
             format(span_context.span_id, "016x"),
-            format(span_context.baggage.pop("trace-flags", 0), "02x")
+            format(trace_flags, "02x")
         )
 
         carrier.update(span_context.baggage)
@@ -143,9 +171,7 @@ class TraceContextPropagator(Propagator):
         if traceparent is None:
             # https://www.w3.org/TR/trace-context/#no-traceparent-received
             _LOG.warning("No traceparent was received")
-            return SpanContext(
-                trace_id=getrandbits(128), span_id=getrandbits(64)
-            )
+            return _new_trace()
 
         else:
 
@@ -156,9 +182,7 @@ class TraceContextPropagator(Propagator):
                 _LOG.warning(
                     "Unable to parse version from traceparent"
                 )
-                return SpanContext(
-                    trace_id=getrandbits(128), span_id=getrandbits(64)
-                )
+                return _new_trace()
 
             # https://www.w3.org/TR/2019/CR-trace-context-20190813/#version
             version = version_match.group("version")
@@ -166,9 +190,7 @@ class TraceContextPropagator(Propagator):
                 _LOG.warning(
                     "Forbidden value of 255 found in version"
                 )
-                return SpanContext(
-                    trace_id=getrandbits(128), span_id=getrandbits(64)
-                )
+                return _new_trace()
 
             # https://www.w3.org/TR/2019/CR-trace-context-20190813/#versioning-of-traceparent
             if int(version, 16) > 0:
@@ -177,9 +199,7 @@ class TraceContextPropagator(Propagator):
                     _LOG.warning(
                         "traceparent shorter than 55 characters found"
                     )
-                    return SpanContext(
-                        trace_id=getrandbits(128), span_id=getrandbits(64)
-                    )
+                    return _new_trace()
 
                 remainder_match = _FUTURE_VERSION_REMAINDER.match(traceparent)
 
@@ -198,9 +218,7 @@ class TraceContextPropagator(Propagator):
                 _LOG.warning(
                     "Received an invalid traceparent: {}".format(traceparent)
                 )
-                return SpanContext(
-                    trace_id=getrandbits(128), span_id=getrandbits(64)
-                )
+                return _new_trace()
 
             # https://www.w3.org/TR/2019/CR-trace-context-20190813/#trace-id
             trace_id = remainder_match.group("trace_id")
@@ -208,9 +226,7 @@ class TraceContextPropagator(Propagator):
                 _LOG.warning(
                     "Forbidden value of {} found in trace-id".format(trace_id)
                 )
-                return SpanContext(
-                    trace_id=getrandbits(128), span_id=getrandbits(64)
-                )
+                return _new_trace()
 
             # https://www.w3.org/TR/2019/CR-trace-context-20190813/#parent-id
             parent_id = remainder_match.group("parent_id")
@@ -219,9 +235,7 @@ class TraceContextPropagator(Propagator):
                     "Forbidden value of {}"
                     " found in parent-id".format(parent_id)
                 )
-                return SpanContext(
-                    trace_id=getrandbits(128), span_id=getrandbits(64)
-                )
+                return _new_trace()
 
             # https://www.w3.org/TR/2019/CR-trace-context-20190813/#trace-flags
             raw_trace_flags = remainder_match.group("trace_flags")
@@ -255,6 +269,9 @@ class TraceContextPropagator(Propagator):
             trace_context_free_carrier["trace-flags"] = int(
                 "".join(trace_flags), 2
             )
+            sampled = bool(
+                trace_context_free_carrier["trace-flags"] & _SAMPLED_FLAG
+            )
 
             if tracestate is not None:
 
@@ -304,8 +321,16 @@ class TraceContextPropagator(Propagator):
                         ]
                     )
 
+        if not self._honor_sampled:
+            return _UndecidedSpanContext(
+                trace_id=int(trace_id, 16),
+                span_id=int(parent_id, 16),
+                baggage=trace_context_free_carrier
+            )
+
         return SpanContext(
             trace_id=int(trace_id, 16),
             span_id=int(parent_id, 16),
-            baggage=trace_context_free_carrier
+            baggage=trace_context_free_carrier,
+            sampled=sampled
         )
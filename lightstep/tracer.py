@@ -8,13 +8,22 @@ See the API definition for comments.
 """
 from __future__ import absolute_import
 
+import threading
+from importlib import import_module
+
+import opentracing
 from basictracer import BasicTracer
+from basictracer.propagator import Propagator
+from basictracer.span import BasicSpan
 from basictracer.text_propagator import TextPropagator
-from opentracing import Format
+from opentracing import Format, Span
+from opentracing.ext import tags as ext_tags
 
-from lightstep.lightstep_binary_propagator import LightStepBinaryPropagator
 from lightstep.propagation import LightStepFormat
+from . import constants
 from .recorder import Recorder
+from .sampler import Sampler, _UndecidedSpanContext
+from .util import _generate_id
 
 
 def Tracer(**kwargs):
@@ -49,10 +58,88 @@ def Tracer(**kwargs):
         configuration). Defaults to False (i.e., binary format is enabled).
     :param ScopeManager scope_manager: the ScopeManager responsible for
         Span activation. Defaults to the implementation provided by the
-        basictracer package, which uses thread-local storage.
+        basictracer package, which uses thread-local storage. asyncio
+        services should pass a lightstep.scope_manager.ContextVarsScopeManager
+        (Python 3.7+).
     :param bool use_thrift: Forces the use of Thrift as the transport protocol.
     :param bool use_http: Forces the use of Proto over http.
-    :param float timeout_seconds: Number of seconds allowed for the HTTP report transaction (fractions are permitted)
+    :param list collector_endpoints: a pool of satellites to report to
+        instead of collector_host:collector_port, as 'host:port' strings or
+        (host, port) pairs. Each report goes to a lightly loaded, healthy
+        endpoint; failing endpoints are ejected for a while.
+    :param list destinations: report every span to several destinations,
+        e.g. two projects, instead of collector_host:collector_port. Each is
+        a dict with any of access_token, collector_host, collector_port and
+        collector_encryption; the rest default to the Tracer's. Reports are
+        serialized once, and each destination is sent to from its own thread
+        with its own retries, so a slow one does not delay the others.
+        At most one of destinations, export_dir, agent_socket,
+        agent_udp_address, use_grpc and collector_endpoints may be given;
+        more raise a ValueError.
+    :param str export_dir: write reports to segment files in this
+        directory instead of sending them, for hosts that cannot reach a
+        collector; upload them later with `python -m lightstep.replay`.
+    :param int export_segment_bytes: the size at which export_dir starts a
+        new segment file.
+    :param bool use_grpc: Reports Proto over gRPC, on one persistent HTTP/2
+        channel with keepalive pings. Requires the grpcio package
+        (pip install lightstep[grpc]).
+    :param sampler: decides at its root span whether a trace is recorded,
+        e.g. a lightstep.sampler.ProbabilisticSampler. The spans of traces
+        that are not sampled are cheap no-ops. Defaults to sampling every
+        trace. Traces extracted with a sampling decision (such as B3's
+        x-b3-sampled or the sampled flag of a W3C traceparent) follow it
+        instead, unless their propagator is created with honor_sampled=False.
+    :param tail_sampler: a lightstep.tail_sampling.TailSampler, which holds
+        finished spans until their trace can be decided on, and only passes
+        on those of traces with errors, slow spans or chosen operations,
+        plus a sample of the others.
+    :param bool prewarm: if True, the connection to the collector is opened
+        (including DNS resolution and the TLS handshake) on a background
+        thread as soon as the Tracer is created, instead of when the first
+        span is recorded. This starts the flush thread right away, so create
+        the Tracer after any fork().
+    :param float timeout_seconds: Number of seconds allowed for the HTTP report transaction (fractions are permitted).
+        Defaults to 30, or to 1 with inline_flush.
+    :param bool cooperative: whether reports are serialized in small slices,
+        yielding to other greenlets in between, so that flushing does not
+        stall a gevent or eventlet hub. Defaults to None, which turns it on
+        when threading has been monkey-patched by gevent or eventlet before
+        the Tracer is created.
+    :param bool inline_flush: if True, no background flush thread is started.
+        Instead, the first span recorded after each periodic_flush_seconds
+        period flushes the buffer from the thread that finished it, while
+        spans finished concurrently on other threads carry on without
+        waiting. Meant for environments that forbid background threads.
+        With the default HTTP transport that caller only swaps the buffer
+        out and starts the report on a non-blocking socket; the spans
+        recorded next move it along, each doing what the socket allows
+        without waiting (only looking up the collector's address, every 30
+        seconds, blocks). It does not go through HTTP proxies. With other
+        transports that caller waits for the report, for at most
+        timeout_seconds, which is why it defaults to 1 second in this mode.
+    :param bool serverless: for AWS Lambda style runtimes, where the process
+        is frozen between invocations. No background flush thread is started;
+        call tracer.flush(deadline=...) at the end of every invocation, with
+        the time by which the invocation must return. The connection to the
+        collector is kept alive across invocations.
+    :param str shared_ring_dir: a directory (ideally on tmpfs, e.g. under
+        /dev/shm) shared by the processes of one host, such as gunicorn or
+        multiprocessing workers. Each process writes its spans to a shared
+        memory ring there, and a single elected process reports the spans of
+        all of them. If the reporter dies, the next process to flush takes
+        over. POSIX only.
+    :param int shared_ring_bytes: size of each process' ring; spans that do
+        not fit are dropped.
+    :param str agent_socket: path of the Unix domain socket of a local
+        forwarding agent (python -m lightstep.agent). Reports are handed to
+        the agent, which forwards them to the collector; the collector_*
+        arguments are then unused.
+    :param str agent_udp_address: 'host:port' of a local agent listening for
+        UDP datagrams (python -m lightstep.agent --udp). Reports are split
+        into datagrams of at most one MTU and sent without ever waiting; a
+        datagram that cannot be sent is dropped, and losses are counted in
+        Recorder.stats(). The collector_* arguments are then unused.
     """
     enable_binary_format = True
     if 'disable_binary_format' in kwargs:
@@ -64,23 +151,95 @@ def Tracer(**kwargs):
         scope_manager = kwargs['scope_manager']
         del kwargs['scope_manager']
 
+    sampler = None
+    if 'sampler' in kwargs:
+        sampler = kwargs['sampler']
+        del kwargs['sampler']
+
     return _LightstepTracer(enable_binary_format,
                             Recorder(**kwargs),
-                            scope_manager)
+                            scope_manager,
+                            sampler)
 
 
 class _LightstepTracer(BasicTracer):
-    def __init__(self, enable_binary_format, recorder, scope_manager):
+    def __init__(self, enable_binary_format, recorder, scope_manager,
+                 sampler=None):
         """Initialize the LightStep Tracer, deferring to BasicTracer."""
-        super(_LightstepTracer, self).__init__(recorder, scope_manager=scope_manager)
+        super(_LightstepTracer, self).__init__(recorder, sampler=sampler,
+                                               scope_manager=scope_manager)
+        # Resolves the parent of new spans, see start_span.
+        self._parent_tracer = BasicTracer(scope_manager=self.scope_manager)
+        # basictracer's samplers only take the trace id.
+        self._sampler_takes_operation = isinstance(self.sampler, Sampler)
+        # Samplers that budget spans (AdaptiveSampler) count those recorded.
+        self._sampler_counts_spans = hasattr(self.sampler, 'record_span')
         self.register_propagator(Format.TEXT_MAP, TextPropagator())
         self.register_propagator(Format.HTTP_HEADERS, TextPropagator())
         if enable_binary_format:
-            # We do this import lazily because protobuf versioning issues
-            # can cause process-level failure at import time.
-            from basictracer.binary_propagator import BinaryPropagator
-            self.register_propagator(Format.BINARY, BinaryPropagator())
-            self.register_propagator(LightStepFormat.LIGHTSTEP_BINARY, LightStepBinaryPropagator())
+            # We do these imports lazily because protobuf versioning issues
+            # can cause process-level failure at import time, and because
+            # most processes never use the binary formats at all.
+            self.register_propagator(Format.BINARY, _LazyPropagator(
+                'basictracer.binary_propagator', 'BinaryPropagator'))
+            self.register_propagator(LightStepFormat.LIGHTSTEP_BINARY, _LazyPropagator(
+                'lightstep.lightstep_binary_propagator', 'LightStepBinaryPropagator'))
+
+    def start_span(
+        self,
+        operation_name=None,
+        child_of=None,
+        references=None,
+        tags=None,
+        start_time=None,
+        ignore_active_span=False
+    ):
+        """Per BasicTracer.start_span, but with span and trace ids taken from
+        LightStep's id generator, and with a cheap _UnsampledSpan for traces
+        that are not sampled."""
+        # BasicTracer finds the parent (child_of, else the first reference,
+        # else the active span) and copies its trace id, sampling decision
+        # and baggage into the new span's context.
+        span = self._parent_tracer.start_span(
+            operation_name, child_of, references, None, start_time,
+            ignore_active_span)
+        ctx = span.context
+        ctx.span_id = _generate_id()
+        if span.parent_id is None:
+            ctx.trace_id = _generate_id()
+            ctx.sampled = None
+        elif _undecided(child_of, references):
+            ctx.sampled = None
+        # None: a new trace, or an extracted one the caller left undecided.
+        if ctx.sampled is None:
+            if self._sampler_takes_operation:
+                ctx.sampled = self.sampler.sampled(
+                    ctx.trace_id, operation_name)
+            else:
+                ctx.sampled = self.sampler.sampled(ctx.trace_id)
+
+        if not ctx.sampled:
+            return _UnsampledSpan(
+                self,
+                operation_name,
+                ctx,
+                span.parent_id,
+                span.start_time)
+
+        return BasicSpan(
+            self,
+            operation_name=operation_name,
+            context=ctx,
+            parent_id=span.parent_id,
+            tags=tags,
+            start_time=span.start_time)
+
+    def record(self, span):
+        """Per BasicTracer.record, also counting the span for the sampler,
+        if it budgets spans."""
+        super(_LightstepTracer, self).record(span)
+        if self._sampler_counts_spans:
+            self.sampler.record_span(span)
 
     def start_active_span(
         self,
@@ -103,32 +262,163 @@ class _LightstepTracer(BasicTracer):
             finish_on_close=finish_on_close
         )
 
-        class ScopePatch(scope.__class__):
+        # This is done because LightStep requires for the trace_id to be 64b
+        # long.
+        scope.__class__ = _truncating_scope_class(scope.__class__)
 
-            def __exit__(self, exc_type, exc_val, exc_tb):
+        return scope
 
-                self.span.context.trace_id = int(
-                    format(self.span.context.trace_id, "032x")[16:], 16
-                )
+    def flush(self, deadline=None):
+        """Force a flush of buffered Span data to the LightStep collector.
+
+        :param float deadline: time.time() by which the flush must be done;
+            see Recorder.flush().
+        """
+        if deadline is None:
+            return self.recorder.flush()
+        return self.recorder.flush(deadline=deadline)
+
+    def stats(self):
+        """The counters of the recorder (see Recorder.stats()), and those of
+        the sampler, if it keeps any (such as an AdaptiveSampler's rates),
+        under 'sampler'."""
+        stats = self.recorder.stats()
+        sampler_stats = getattr(self.sampler, 'stats', None)
+        if sampler_stats is not None:
+            stats['sampler'] = sampler_stats()
+        return stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+
+def _undecided(child_of, references):
+    """Whether start_span was given an extracted SpanContext that left the
+    sampling decision to this service. The contexts of spans, including the
+    active one, always carry a decision."""
+    if child_of is not None:
+        return isinstance(child_of, _UndecidedSpanContext)
+    if isinstance(references, opentracing.Reference):
+        references = [references]
+    return bool(references) and isinstance(
+        references[0].referenced_context, _UndecidedSpanContext)
+
+
+class _UnsampledSpan(BasicSpan):
+    """The span of a trace that is not sampled, which is never recorded.
 
-                result = super(self.__class__, self).__exit__(
+    Tags and logs are dropped as they are set, so no lock, tag dict or log
+    list is allocated for it; its context still carries the sampling decision
+    and baggage to child spans and through inject().
+
+    Setting sampling.priority to a positive value samples the span after all:
+    it becomes a BasicSpan, with the tags and logs set from then on. (Spans
+    already started as its children stay unsampled.)
+    """
+    duration = -1
+
+    def __init__(self, tracer, operation_name, context, parent_id, start_time):
+        # Not BasicSpan.__init__, which allocates what this span does without.
+        Span.__init__(self, tracer, context)
+        self._tracer = tracer
+        self.operation_name = operation_name
+        self.start_time = start_time
+        self.parent_id = parent_id
+
+    @property
+    def tags(self):
+        return {}
+
+    @property
+    def logs(self):
+        return []
+
+    def set_operation_name(self, operation_name):
+        self.operation_name = operation_name
+        return self
+
+    def set_tag(self, key, value):
+        if key == ext_tags.SAMPLING_PRIORITY:
+            # Also given as strings, e.g. copied from a header; values that
+            # are not integers are ignored.
+            try:
+                priority = int(value)
+            except (TypeError, ValueError):
+                return self
+            if priority > 0:
+                self.__class__ = BasicSpan
+                self._lock = threading.Lock()
+                self.tags = {}
+                self.logs = []
+                self.duration = -1
+                return self.set_tag(key, priority)
+        return self
+
+    def log_kv(self, key_values, timestamp=None):
+        return self
+
+    def finish(self, finish_time=None):
+        pass
+
+    def set_baggage_item(self, key, value):
+        # A reference assignment, atomic without BasicSpan's lock.
+        self._context = self._context.with_baggage_item(key, value)
+        return self
+
+    def get_baggage_item(self, key):
+        return self._context.baggage.get(key)
+
+
+# Truncating subclasses of the scope classes seen so far, keyed by the class
+# they extend. Building a class is far more expensive than a dict lookup.
+_truncating_scope_classes = {}
+
+
+def _truncating_scope_class(scope_class):
+    """Return a subclass of scope_class that truncates the trace_id of its
+    span to 64 bits when the scope exits."""
+    truncating_class = _truncating_scope_classes.get(scope_class)
+    if truncating_class is not None:
+        return truncating_class
+
+    if getattr(scope_class, '_truncates_trace_id', False):
+        # Scopes of lightstep.scope_manager truncate on their own.
+        truncating_class = scope_class
+    else:
+        class _TruncatingScope(scope_class):
+            _truncates_trace_id = True
+
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                context = self.span.context
+                if context.trace_id is not None:
+                    context.trace_id &= constants.TRACE_ID_MASK
+                return super(_TruncatingScope, self).__exit__(
                     exc_type, exc_val, exc_tb
                 )
 
-                return result
+        truncating_class = _TruncatingScope
+    _truncating_scope_classes[scope_class] = truncating_class
+    return truncating_class
 
-        # This monkey patching is done because LightStep requires for the
-        # trace_id to be 64b long.
-        scope.__class__ = ScopePatch
 
-        return scope
+class _LazyPropagator(Propagator):
+    """Imports and instantiates a Propagator on its first inject/extract."""
+    def __init__(self, module_name, class_name):
+        self._module_name = module_name
+        self._class_name = class_name
+        self._propagator = None
 
-    def flush(self):
-        """Force a flush of buffered Span data to the LightStep collector."""
-        self.recorder.flush()
+    def _load(self):
+        if self._propagator is None:
+            module = import_module(self._module_name)
+            self._propagator = getattr(module, self._class_name)()
+        return self._propagator
 
-    def __enter__(self):
-        return self
+    def inject(self, span_context, carrier):
+        self._load().inject(span_context, carrier)
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.flush()
+    def extract(self, carrier):
+        return self._load().extract(carrier)
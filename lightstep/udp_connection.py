@@ -0,0 +1,177 @@
+""" Connection class that sends reports to a local agent as UDP datagrams
+    (see lightstep.agent).
+"""
+import copy
+import socket
+import threading
+
+from . import constants
+from . import framing
+
+
+class _UDPConnection(object):
+    """Instances of _UDPConnection send reports to the agent at (host, port)
+    without ever waiting for it.
+
+    Each report is split on span boundaries into datagrams of at most
+    max_datagram_bytes, each holding a framed, self-contained report with the
+    reporter and as many whole spans as fit. A span that does not fit in a
+    datagram on its own is sent without its logs, and dropped if it still
+    does not fit.
+
+    The socket is non-blocking: a datagram that cannot be sent right away is
+    dropped. Nothing is ever retried and the collector's commands (such as
+    disable) are not seen by the tracer. What was lost is counted in stats.
+    """
+    def __init__(self, host, port, use_thrift,
+                 max_datagram_bytes=constants.DEFAULT_UDP_DATAGRAM_BYTES):
+        self._host = host
+        self._port = port
+        self._use_thrift = use_thrift
+        self._max_datagram_bytes = max_datagram_bytes
+        self._lock = threading.Lock()
+        self._socket = None
+        self.ready = False
+        self.stats = {
+            'datagrams_sent': 0,
+            'send_errors': 0,
+            'spans_truncated': 0,
+            'spans_dropped': 0,
+        }
+
+    def open(self):
+        """Create the socket. Nothing is sent until the first report."""
+        with self._lock:
+            self._close()
+            try:
+                family, _, _, _, address = socket.getaddrinfo(
+                    self._host, self._port, 0, socket.SOCK_DGRAM)[0]
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+            except (OSError, socket.error):
+                return
+            sock.setblocking(False)
+            try:
+                sock.connect(address)
+            except (OSError, socket.error):
+                sock.close()
+                return
+            self._socket = sock
+            self.ready = True
+
+    def report(self, *args, **kwargs):
+        """Send a report to the agent.
+
+        An already serialized report (third argument) and the `timeout`
+        keyword argument are accepted for compatibility with the other
+        connections but unused: datagrams are encoded per slice of spans,
+        and sending them never waits.
+        """
+        auth = args[0]
+        report = args[1]
+        with self._lock:
+            if self._socket is None:
+                raise Exception('UDP socket is not open')
+            if self._use_thrift:
+                from lightstep.crouton import ttypes
+                kind = framing.KIND_THRIFT
+                payloads = self._thrift_payloads(auth, report)
+                response = ttypes.ReportResponse()
+            else:
+                from lightstep.collector_pb2 import ReportResponse
+                kind = framing.KIND_PROTO
+                payloads = self._proto_payloads(auth, report)
+                response = ReportResponse()
+            for payload in payloads:
+                self._send(framing.encode_frame(kind, auth.access_token,
+                                                payload))
+        return response
+
+    def _send(self, datagram):
+        try:
+            self._socket.send(datagram)
+            self.stats['datagrams_sent'] += 1
+        except (OSError, socket.error):
+            # A full send buffer, or an ICMP error (such as nobody listening
+            # on the port) left over from an earlier datagram.
+            self.stats['send_errors'] += 1
+
+    def _budget(self, access_token, header_bytes):
+        """The room left for spans in a datagram."""
+        overhead = len(framing.encode_frame(framing.KIND_PROTO,
+                                            access_token, b''))
+        return self._max_datagram_bytes - overhead - header_bytes
+
+    def _slices(self, spans, encode, truncate, budget):
+        """Group spans into lists of (span, encoded span) that fit in budget
+        bytes."""
+        batch, batch_bytes = [], 0
+        for span in spans:
+            data = encode(span)
+            if len(data) > budget:
+                span = truncate(span)
+                data = encode(span)
+                if len(data) > budget:
+                    self.stats['spans_dropped'] += 1
+                    continue
+                self.stats['spans_truncated'] += 1
+            if batch and batch_bytes + len(data) > budget:
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append((span, data))
+            batch_bytes += len(data)
+        if batch:
+            yield batch
+
+    def _proto_payloads(self, auth, report):
+        from lightstep.collector_pb2 import ReportRequest
+        from lightstep.http_converter import _SPANS_TAG, _varint
+
+        header = ReportRequest(
+            reporter=report.reporter, auth=auth,
+            timestamp_offset_micros=report.timestamp_offset_micros,
+            internal_metrics=report.internal_metrics).SerializeToString()
+
+        def encode(span):
+            data = span.SerializeToString()
+            return _SPANS_TAG + _varint(len(data)) + data
+
+        def truncate(span):
+            truncated = type(span)()
+            truncated.CopyFrom(span)
+            truncated.ClearField('logs')
+            return truncated
+
+        budget = self._budget(auth.access_token, len(header))
+        for batch in self._slices(report.spans, encode, truncate, budget):
+            yield header + b''.join(data for _, data in batch)
+
+    def _thrift_payloads(self, auth, report):
+        from thrift.TSerialization import serialize
+
+        # A thrift list's header does not depend on its length, so a
+        # report's size is that of the empty report plus that of its spans.
+        sliced = copy.copy(report)
+        sliced.span_records = []
+        header = serialize(sliced)
+
+        def truncate(span):
+            truncated = copy.copy(span)
+            truncated.log_records = None
+            return truncated
+
+        budget = self._budget(auth.access_token, len(header))
+        for batch in self._slices(report.span_records or [], serialize,
+                                  truncate, budget):
+            sliced.span_records = [span for span, _ in batch]
+            yield serialize(sliced)
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self.ready = False
+
+    def close(self):
+        """Close the socket."""
+        with self._lock:
+            self._close()
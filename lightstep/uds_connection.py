@@ -0,0 +1,88 @@
+""" Connection class that writes reports to a local forwarding agent over a
+    Unix domain socket (see lightstep.agent).
+"""
+import socket
+import threading
+
+from . import framing
+
+
+class _UDSConnection(object):
+    """Instances of _UDSConnection hand reports to the agent listening on
+    socket_path, which forwards them to the collector.
+
+    Reports are fire-and-forget: once a report is written to the socket it
+    belongs to the agent, so report() returns an empty response and the
+    collector's commands (such as disable) are not seen by the tracer.
+    """
+    def __init__(self, socket_path, use_thrift, timeout_seconds):
+        self._socket_path = socket_path
+        self._use_thrift = use_thrift
+        self._timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._socket = None
+        self.ready = False
+
+    def open(self):
+        """Connect to the agent."""
+        with self._lock:
+            self._close()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self._timeout_seconds)
+            try:
+                sock.connect(self._socket_path)
+            except (OSError, socket.error):
+                sock.close()
+                return
+            self._socket = sock
+            self.ready = True
+
+    # May throw an Exception on failure.
+    def report(self, *args, **kwargs):
+        """Report to the agent.
+
+        An already serialized report may be passed as a third argument, and
+        the timeout for this report as the `timeout` keyword argument.
+        """
+        auth = args[0]
+        report = args[1]
+        payload = args[2] if len(args) > 2 else None
+        if self._use_thrift:
+            from thrift.TSerialization import serialize
+            from lightstep.crouton import ttypes
+            kind = framing.KIND_THRIFT
+            if payload is None:
+                payload = serialize(report)
+            response = ttypes.ReportResponse()
+        else:
+            from lightstep.collector_pb2 import ReportResponse
+            kind = framing.KIND_PROTO
+            report.auth.access_token = auth.access_token
+            if payload is None:
+                payload = report.SerializeToString()
+            response = ReportResponse()
+
+        frame = framing.encode_frame(kind, auth.access_token, payload)
+        with self._lock:
+            if self._socket is None:
+                raise Exception('not connected to the agent')
+            try:
+                self._socket.settimeout(
+                    kwargs.get('timeout', self._timeout_seconds))
+                self._socket.sendall(frame)
+            except (OSError, socket.error):
+                # The agent went away; reconnect on the next flush.
+                self._close()
+                raise
+        return response
+
+    def _close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self.ready = False
+
+    def close(self):
+        """Close the connection to the agent."""
+        with self._lock:
+            self._close()
@@ -1,15 +1,89 @@
 """ Utility functions
 """
+import os
 import random
+import struct
 import sys
+import threading
 import time
 import traceback
 import types
 import math
 from . import constants
 
+# Deprecated: ids come from _generate_id(). Kept, as the random.Random it
+# always was, for code that drew ids from it.
 guid_rng = random.Random()   # Uses urandom seed
 
+# Random ids are drawn from os.urandom in blocks of _ID_POOL_SIZE and handed
+# out from a per-thread pool. The pool keeps the bound pop() of its list, so
+# an id is one thread-local lookup and one C call; zeros, which are not valid
+# ids, are dropped when a block is drawn.
+_ID_POOL_SIZE = 512
+_ID_POOL_FORMAT = '<{0}Q'.format(_ID_POOL_SIZE)
+_ID_POOL_BYTES = struct.calcsize(_ID_POOL_FORMAT)
+
+
+class _IdPool(threading.local):
+    def __init__(self):
+        self.pop = [].pop
+        self.pid = os.getpid()
+
+
+_id_pool = _IdPool()
+
+
+def _draw_ids():
+    return list(filter(None, struct.unpack(_ID_POOL_FORMAT,
+                                           os.urandom(_ID_POOL_BYTES))))
+
+
+# A forked child inherits its parent's pool and would hand out the very same
+# ids. Where fork hooks exist the child simply starts over with empty pools;
+# older Pythons compare pids on every call instead.
+if hasattr(os, 'register_at_fork'):
+    def _reset_id_pool():
+        global _id_pool
+        _id_pool = _IdPool()
+
+    os.register_at_fork(after_in_child=_reset_id_pool)
+
+    def _generate_id():
+        """
+        Construct a random, non-zero 64 bit id for a span or trace.
+        """
+        try:
+            return _id_pool.pop()
+        except IndexError:
+            _id_pool.pop = _draw_ids().pop
+            return _id_pool.pop()
+else:
+    def _generate_id():
+        """
+        Construct a random, non-zero 64 bit id for a span or trace.
+        """
+        pool = _id_pool
+        pid = os.getpid()
+        if pool.pid != pid:
+            pool.pop = [].pop
+            pool.pid = pid
+        try:
+            return pool.pop()
+        except IndexError:
+            pool.pop = _draw_ids().pop
+            return pool.pop()
+
+
+def _generate_trace_id_128():
+    """
+    Construct a random, non-zero 128 bit trace id.
+    """
+    return _generate_id() << 64 | _generate_id()
+
+
+# A clock for deadlines, unaffected by changes to the system time.
+_monotonic = getattr(time, 'monotonic', time.time)
+
 
 def _collector_url_from_hostport(secure, host, port, use_thrift):
     """
@@ -31,7 +105,7 @@ def _generate_guid():
     """
     Construct a guid - a random 64 bit integer
     """
-    return guid_rng.getrandbits(64) - 1
+    return _generate_id()
 
 def _id_to_hex(id):
     return '{0:x}'.format(id)
@@ -105,6 +179,27 @@ def _coerce_to_unicode(val):
             return '(encoding error)'
 
 
+def _is_monkey_patched():
+    """Whether gevent or eventlet has monkey-patched threading, so that the
+    flush "thread" is really a greenlet sharing the hub with the application.
+
+    Only looks at modules that are already imported.
+    """
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        return True
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    if eventlet_patcher is not None and eventlet_patcher.is_monkey_patched('thread'):
+        return True
+    return False
+
+
+def _cooperative_yield():
+    """Let other greenlets run. time.sleep(0) is a yield to the hub under
+    both gevent and eventlet monkey-patching, and a GIL release otherwise."""
+    time.sleep(0)
+
+
 def _format_exc_tb(exc_type, exc_value, exc_tb):
     if type(exc_tb) is types.TracebackType:
         return ''.join(traceback.format_exception(exc_type, exc_value, exc_tb))
@@ -16,6 +16,9 @@ setup(
         'requests>=2.19,<3.0',
         'protobuf>=3.6.0,<4.0'
     ],
+    extras_require={
+        'grpc': ['grpcio>=1.8'],
+    },
     tests_require=[
         'pytest',
         'sphinx',
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from lightstep import framing
+
+agent = pytest.importorskip("lightstep.agent")
+mock_collector = pytest.importorskip("benchmarks.mock_collector")
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def collector():
+    with mock_collector.MockCollector() as collector:
+        collector.keep_spans = True
+        yield collector
+
+
+def make_agent(collector, socket_path):
+    return agent.Agent(
+        str(socket_path),
+        collector_host=collector.host,
+        collector_port=collector.port,
+        collector_encryption="none",
+        flush_period=3600)
+
+
+def reader(data):
+    chunks = [data]
+
+    def read(n):
+        chunk, chunks[0] = chunks[0][:n], chunks[0][n:]
+        return chunk
+    return read
+
+
+def test_frame_round_trip():
+    data = framing.encode_frame(framing.KIND_PROTO, "token", b"report")
+    read = reader(data)
+    assert framing.read_frame(read) == (framing.KIND_PROTO, "token", b"report")
+    assert framing.read_frame(read) is None
+
+
+@pytest.mark.parametrize("data", [
+    framing.encode_frame(framing.KIND_PROTO, "token", b"report")[:-1],
+    framing.encode_frame(7, "token", b"report"),
+    b"\x00\x00",
+])
+def test_bad_frames(data):
+    with pytest.raises(framing.FrameError):
+        framing.read_frame(reader(data))
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_agent_rebatches_and_forwards(collector, tmp_path, use_thrift,
+                                      make_tracer):
+    socket_path = tmp_path / "agent.sock"
+    with make_agent(collector, socket_path) as local_agent:
+        tracers = [make_tracer(agent_socket=str(socket_path),
+                               use_thrift=use_thrift) for _ in range(2)]
+        for tracer in tracers:
+            for i in range(3):
+                tracer.start_span(str(i)).finish()
+                assert tracer.flush()
+        wait_for(lambda: local_agent.stats["frames_received"] == 6)
+        assert collector.num_spans == 0
+
+        assert local_agent.flush()
+        for tracer in tracers:
+            tracer.recorder.shutdown(flush=False)
+
+    # One upstream report per reporting process, over one connection.
+    assert len(collector.reports) == 2
+    assert collector.num_spans == 6
+    if not use_thrift:
+        assert collector.connections == 1
+    assert {r.access_token for r in collector.reports} == {"test-token"}
+
+
+def test_agent_unavailable(collector, tmp_path, make_tracer):
+    socket_path = tmp_path / "agent.sock"
+    tracer = make_tracer(agent_socket=str(socket_path))
+    tracer.start_span("buffered").finish()
+    assert not tracer.flush()
+    assert len(tracer.recorder._span_records) == 1
+
+    with make_agent(collector, socket_path) as local_agent:
+        assert tracer.flush()
+        wait_for(lambda: local_agent.stats["spans_received"] == 1)
+        tracer.recorder.shutdown(flush=False)
+    assert collector.num_spans == 1
+
+
+def test_agent_keeps_spans_when_upstream_fails(tmp_path, make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    socket_path = tmp_path / "agent.sock"
+    with chaos.ChaosCollector(chaos.FaultProfile("errors", error_rate=1.0)) \
+            as collector:
+        with make_agent(collector, socket_path) as local_agent:
+            tracer = make_tracer(agent_socket=str(socket_path))
+            tracer.start_span("kept").finish()
+            assert tracer.flush()
+            wait_for(lambda: local_agent.stats["spans_received"] == 1)
+
+            assert not local_agent.flush()
+            assert local_agent.stats["report_errors"] == 1
+            assert local_agent._num_spans == 1
+
+            collector.profile = chaos.FaultProfile("healthy")
+            assert local_agent.flush()
+            tracer.recorder.shutdown(flush=False)
+    assert collector.num_spans == 1
+
+
+def test_agent_receives_datagrams(collector, make_tracer):
+    local_agent = agent.Agent(
+        udp_address="127.0.0.1:0",
+        collector_host=collector.host,
+        collector_port=collector.port,
+        collector_encryption="none",
+        flush_period=3600)
+    with local_agent:
+        tracer = make_tracer(agent_udp_address="127.0.0.1:{0}".format(
+            local_agent.udp_port))
+        for i in range(100):
+            tracer.start_span(str(i)).finish()
+        assert tracer.flush()
+        wait_for(lambda: local_agent.stats["spans_received"] == 100)
+        assert local_agent.stats["frames_received"] > 1
+        tracer.recorder.shutdown(flush=False)
+
+    # Datagrams of one process are re-assembled into one report.
+    assert len(collector.reports) == 1
+    assert collector.num_spans == 100
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from lightstep.collector_pb2 import Command
+
+asyncio_tracer = pytest.importorskip("lightstep.asyncio_tracer")
+asyncio_collector = pytest.importorskip("benchmarks.asyncio_collector")
+
+
+def run(test):
+    """Run test(collector) on a fresh event loop, with a collector on it."""
+    async def main():
+        async with asyncio_collector.AsyncioMockCollector() as collector:
+            collector.keep_spans = True
+            await test(collector)
+    asyncio.run(main())
+
+
+def record(tracer, count):
+    for i in range(count):
+        with tracer.start_active_span(str(i)):
+            pass
+
+
+def test_flush_reaches_collector(make_async_tracer):
+    async def test(collector):
+        tracer = make_async_tracer(collector)
+        record(tracer, 10)
+        assert await tracer.flush()
+        assert collector.num_spans == 10
+        assert [r.access_token for r in collector.reports
+                if r.num_spans] == ["test-token"]
+        names = sorted(s.operation_name for s in collector.spans)
+        assert names == [str(i) for i in range(10)]
+        await tracer.shutdown()
+    run(test)
+
+
+def test_periodic_flush_task(make_async_tracer):
+    async def test(collector):
+        tracer = make_async_tracer(collector, periodic_flush_seconds=0.01)
+        record(tracer, 5)
+        for _ in range(200):
+            if collector.num_spans == 5:
+                break
+            await asyncio.sleep(0.01)
+        assert collector.num_spans == 5
+        await tracer.shutdown()
+        assert tracer.recorder._flush_task.done()
+    run(test)
+
+
+def test_connection_kept_alive(make_async_tracer):
+    async def test(collector):
+        tracer = make_async_tracer(collector)
+        for _ in range(3):
+            record(tracer, 1)
+            assert await tracer.flush()
+        assert collector.connections == 1
+        await tracer.shutdown()
+    run(test)
+
+
+def test_reconnects_after_collector_closes_connection(make_async_tracer):
+    async def test(collector):
+        collector.close_after_response = True
+        tracer = make_async_tracer(collector)
+        for _ in range(3):
+            record(tracer, 1)
+            assert await tracer.flush()
+            await asyncio.sleep(0)
+        assert collector.num_spans == 3
+        assert collector.connections == len(collector.reports)
+        await tracer.shutdown()
+    run(test)
+
+
+def test_spans_restored_after_error_status(make_async_tracer):
+    async def test(collector):
+        tracer = make_async_tracer(collector)
+        record(tracer, 4)
+        collector.status = 503
+        assert not await tracer.flush()
+        assert len(tracer.recorder._span_records) == 4
+
+        collector.status = 200
+        assert await tracer.flush()
+        assert collector.num_spans == 4
+        await tracer.shutdown()
+    run(test)
+
+
+def test_timeout_restores_spans(make_async_tracer):
+    async def test(collector):
+        # A "collector" that accepts connections but never answers.
+        silent = await asyncio.start_server(
+            lambda reader, writer: None, "127.0.0.1", 0)
+        tracer = make_async_tracer(collector, timeout_seconds=0.05,
+                             collector_port=silent.sockets[0].getsockname()[1])
+        record(tracer, 2)
+        assert not await tracer.flush()
+        assert len(tracer.recorder._span_records) == 2
+        await tracer.recorder.shutdown(flush=False)
+        silent.close()
+    run(test)
+
+
+def test_async_with_flushes_on_exit(make_async_tracer):
+    async def test(collector):
+        async with make_async_tracer(collector) as tracer:
+            record(tracer, 3)
+        assert collector.num_spans == 3
+        await tracer.shutdown()
+    run(test)
+
+
+def test_disable_command(make_async_tracer):
+    async def test(collector):
+        collector.commands = [Command(disable=True)]
+        tracer = make_async_tracer(collector)
+        record(tracer, 1)
+        await tracer.flush()
+        assert tracer.recorder._disabled_runtime
+        record(tracer, 1)
+        assert not tracer.recorder._span_records
+    run(test)
+
+
+def test_thrift_not_supported():
+    with pytest.raises(Exception):
+        asyncio_tracer.AsyncTracer(use_thrift=True, use_http=False)
+
+
+@pytest.mark.parametrize("option,value", [
+    ("inline_flush", True),
+    ("serverless", True),
+    ("prewarm", True),
+    ("shared_ring_dir", "/dev/shm/lightstep"),
+    ("agent_socket", "/tmp/agent.sock"),
+    ("agent_udp_address", "127.0.0.1:8360"),
+    ("use_grpc", True),
+    ("collector_endpoints", ["satellite:8360"]),
+    ("destinations", [{}]),
+    ("export_dir", "/tmp/spool"),
+])
+def test_unsupported_options_rejected(option, value, make_async_tracer):
+    with pytest.raises(Exception, match=option):
+        make_async_tracer(**{option: value})
+    # Their defaults are fine.
+    make_async_tracer(**{option: type(value)()})
@@ -6,6 +6,7 @@ from opentracing import SpanContextCorruptedException
 from opentracing import Format
 from lightstep import Tracer
 from lightstep.b3_propagator import B3Propagator
+from lightstep.sampler import _UndecidedSpanContext
 
 
 class B3PropagatorTest(TestCase):
@@ -206,3 +207,40 @@ class B3PropagatorTest(TestCase):
             carrier["x-b3-sampled"],
             extract_span_context.baggage["x-b3-sampled"]
         )
+
+    def test_extract_sampling_decision(self):
+        def extract(carrier):
+            return self.tracer().extract(Format.HTTP_HEADERS, carrier)
+
+        ids = {"x-b3-traceid": "a", "x-b3-spanid": "b"}
+        self.assertTrue(extract(dict(ids, **{"x-b3-sampled": "1"})).sampled)
+        self.assertTrue(
+            extract(dict(ids, **{"x-b3-sampled": "true"})).sampled
+        )
+        self.assertFalse(extract(dict(ids, **{"x-b3-sampled": "0"})).sampled)
+        # Debug implies sampled.
+        self.assertTrue(
+            extract(
+                dict(ids, **{"x-b3-sampled": "0", "x-b3-flags": "1"})
+            ).sampled
+        )
+        # No decision: left to the sampler.
+        self.assertIsInstance(extract(ids), _UndecidedSpanContext)
+        self.assertTrue(extract(ids).sampled)
+
+        self.assertTrue(extract({"b3": "a-b-1"}).sampled)
+        self.assertTrue(extract({"b3": "a-b-d"}).sampled)
+        self.assertFalse(extract({"b3": "a-b-0-c"}).sampled)
+        self.assertIsInstance(extract({"b3": "a-b"}), _UndecidedSpanContext)
+        # Only the sampling state.
+        self.assertFalse(extract({"b3": "0"}).sampled)
+
+    def test_inject_sampling_decision(self):
+        carrier = {}
+        parent = self.tracer().extract(
+            Format.HTTP_HEADERS,
+            {"x-b3-traceid": "a", "x-b3-spanid": "b", "x-b3-sampled": "0"}
+        )
+        span = self.tracer().start_span("child", child_of=parent)
+        self.tracer().inject(span.context, Format.HTTP_HEADERS, carrier)
+        self.assertEqual(carrier["x-b3-sampled"], "0")
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import pytest
+
+import lightstep
+
+# The mock collector needs http.server.ThreadingHTTPServer (Python 3.7+).
+mock_collector = pytest.importorskip("benchmarks.mock_collector")
+
+
+@pytest.fixture
+def collector():
+    with mock_collector.MockCollector() as collector:
+        collector.keep_spans = True
+        yield collector
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_flush_reaches_collector(collector, use_thrift, make_tracer):
+    tracer = make_tracer(collector, use_thrift)
+    for i in range(10):
+        with tracer.start_active_span(str(i)):
+            pass
+    assert tracer.recorder.flush()
+    tracer.recorder.shutdown(flush=False)
+
+    assert collector.num_spans == 10
+    assert collector.reports[0].access_token == "test-token"
+    assert collector.reports[0].kind == ("thrift" if use_thrift else "proto")
+    names = sorted(tracer.recorder.converter.get_span_name(s)
+                   for s in collector.spans)
+    assert names == [str(i) for i in range(10)]
+
+
+def test_one_flush_thread_for_concurrent_first_spans(collector, make_tracer):
+    tracer = make_tracer(collector, False, periodic_flush_seconds=60)
+    started = []
+    original_start = threading.Thread.start
+
+    def start(thread):
+        started.append(thread.name)
+        original_start(thread)
+
+    threading.Thread.start = start
+    try:
+        barrier = threading.Barrier(8)
+
+        def first_span():
+            barrier.wait()
+            tracer.start_span("first").finish()
+
+        workers = [threading.Thread(target=first_span) for _ in range(8)]
+        for worker in workers:
+            original_start(worker)
+        for worker in workers:
+            worker.join()
+    finally:
+        threading.Thread.start = original_start
+        tracer.recorder.shutdown()
+
+    assert started.count(lightstep.constants.FLUSH_THREAD_NAME) == 1
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_error_response_restores_spans(use_thrift, make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    profile = chaos.FaultProfile("errors", error_rate=1.0)
+    with chaos.ChaosCollector(profile) as collector:
+        tracer = make_tracer(collector, use_thrift)
+        tracer.start_span("failed").finish()
+        assert not tracer.recorder.flush()
+        tracer.recorder.shutdown(flush=False)
+
+    assert collector.injected_errors == 1
+    assert len(tracer.recorder._span_records) == 1
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_disable_command_shuts_down_recorder(use_thrift, make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    with chaos.ChaosCollector(chaos.FaultProfile("disable", disable=True)) as collector:
+        tracer = make_tracer(collector, use_thrift, periodic_flush_seconds=60)
+        tracer.start_span("last").finish()
+        # Either this flush or the flush thread's first one gets the command.
+        tracer.recorder.flush()
+        assert tracer.recorder._disabled_runtime
+
+        tracer.start_span("dropped").finish()
+        assert not tracer.recorder.flush()
+
+    assert collector.num_spans == 1
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_flush_without_flush_thread(collector, use_thrift, make_tracer):
+    tracer = make_tracer(collector, use_thrift)
+    tracer.start_span("explicit").finish()
+    assert tracer.flush()
+    assert tracer.recorder._flush_thread is None
+    assert collector.num_spans == 1
+    tracer.recorder.shutdown()
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_serverless_invocations(collector, use_thrift, make_tracer):
+    tracer = make_tracer(collector, use_thrift, serverless=True)
+    for invocation in range(3):
+        tracer.start_span(str(invocation)).finish()
+        assert tracer.flush(deadline=time.time() + 5)
+    assert tracer.recorder._flush_thread is None
+    assert collector.num_spans == 3
+    if not use_thrift:
+        # The connection stays warm from one invocation to the next.
+        assert collector.connections == 1
+    tracer.recorder.shutdown()
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_flush_deadline_bounds_slow_collector(use_thrift, make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    profile = chaos.FaultProfile("stalled", latency=chaos.constant(2.0))
+    with chaos.ChaosCollector(profile) as collector:
+        tracer = make_tracer(collector, use_thrift, serverless=True)
+        tracer.start_span("slow").finish()
+        start = time.time()
+        assert not tracer.flush(deadline=start + 0.2)
+        assert time.time() - start < 1.0
+        # The spans are kept for the next invocation's flush.
+        assert len(tracer.recorder._span_records) == 1
+
+        # A deadline that has passed already does not even try.
+        assert not tracer.flush(deadline=time.time() - 1)
+        assert len(tracer.recorder._span_records) == 1
+        tracer.recorder.shutdown(flush=False)
+
+
+def test_inline_flush_does_not_wait_for_collector(make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    profile = chaos.FaultProfile("slow", latency=chaos.constant(0.3))
+    with chaos.ChaosCollector(profile) as collector:
+        tracer = make_tracer(collector, inline_flush=True,
+                             periodic_flush_seconds=0.05)
+        slowest = 0
+        start = time.time()
+        while collector.num_spans == 0:
+            assert time.time() - start < 5
+            before = time.time()
+            tracer.start_span("span").finish()
+            slowest = max(slowest, time.time() - before)
+            time.sleep(0.001)
+        assert slowest < 0.1
+        assert tracer.recorder._flush_thread is None
+
+        # Shutting down sees the last report through and sends the rest.
+        recorded = len(tracer.recorder._span_records)
+        tracer.start_span("last").finish()
+        assert tracer.recorder.shutdown()
+    assert collector.num_spans > recorded
+
+
+def test_inline_flush_failure_restores_spans(make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    profile = chaos.FaultProfile("errors", error_rate=1.0)
+    with chaos.ChaosCollector(profile) as collector:
+        tracer = make_tracer(collector, inline_flush=True,
+                             periodic_flush_seconds=0.01)
+        tracer.start_span("failed").finish()
+        time.sleep(0.02)
+        tracer.start_span("starts the report").finish()
+        while tracer.recorder._inline_report is not None:
+            tracer.start_span("waits").finish()
+            time.sleep(0.001)
+        assert collector.injected_errors == 1
+        assert "failed" in [tracer.recorder.converter.get_span_name(s)
+                            for s in tracer.recorder._span_records]
+        tracer.recorder.shutdown(flush=False)
+
+
+def test_inline_flush_disable_command(make_tracer):
+    chaos = pytest.importorskip("benchmarks.chaos_collector")
+    with chaos.ChaosCollector(chaos.FaultProfile("disable", disable=True)) as collector:
+        tracer = make_tracer(collector, inline_flush=True,
+                             periodic_flush_seconds=0.01)
+        time.sleep(0.02)
+        tracer.start_span("last").finish()
+        start = time.time()
+        while not tracer.recorder._disabled_runtime:
+            assert time.time() - start < 5
+            tracer.start_span("waits").finish()
+            time.sleep(0.001)
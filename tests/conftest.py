@@ -0,0 +1,74 @@
+import warnings
+
+import pytest
+
+import lightstep
+import lightstep.recorder
+
+
+def _quietly(factory, **kwargs):
+    # Tracers and Recorders warn about test settings, such as a missing
+    # access token.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return factory(**kwargs)
+
+
+def _options(collector, use_thrift, kwargs):
+    if collector is not None:
+        kwargs = dict(collector.tracer_kwargs(), **kwargs)
+    kwargs.setdefault("access_token", "test-token")
+    kwargs.setdefault("periodic_flush_seconds", 0)
+    if use_thrift is not None:
+        kwargs.update(use_thrift=use_thrift, use_http=not use_thrift)
+    return kwargs
+
+
+@pytest.fixture
+def make_tracer():
+    """Builds Tracers (that do not flush periodically, by default), and shuts
+    them down without flushing at teardown, so that the atexit hook does not
+    report leftover spans to the default collector.
+
+    Pass a mock collector to report to it, and use_thrift to pick the Thrift
+    or the HTTP transport."""
+    tracers = []
+
+    def make(collector=None, use_thrift=None, **kwargs):
+        tracer = _quietly(lightstep.Tracer,
+                          **_options(collector, use_thrift, kwargs))
+        tracers.append(tracer)
+        return tracer
+
+    yield make
+    for tracer in tracers:
+        tracer.recorder.shutdown(flush=False)
+
+
+@pytest.fixture
+def make_recorder():
+    """Like make_tracer, for Recorders."""
+    recorders = []
+
+    def make(use_thrift=None, **kwargs):
+        recorder = _quietly(lightstep.recorder.Recorder,
+                            **_options(None, use_thrift, kwargs))
+        recorders.append(recorder)
+        return recorder
+
+    yield make
+    for recorder in recorders:
+        recorder.shutdown(flush=False)
+
+
+@pytest.fixture
+def make_async_tracer():
+    """Like make_tracer, for asyncio tracers. AsyncRecorder has no atexit
+    hook and its shutdown() is a coroutine, so tests await it themselves."""
+    asyncio_tracer = pytest.importorskip("lightstep.asyncio_tracer")
+
+    def make(collector=None, **kwargs):
+        return _quietly(asyncio_tracer.AsyncTracer,
+                        **_options(collector, None, kwargs))
+
+    return make
@@ -0,0 +1,165 @@
+import time
+
+import pytest
+
+from lightstep import constants
+
+mock_collector = pytest.importorskip("benchmarks.mock_collector")
+chaos_collector = pytest.importorskip("benchmarks.chaos_collector")
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def collectors():
+    started = []
+
+    def start(profile=None):
+        if profile is None:
+            collector = mock_collector.MockCollector()
+        else:
+            collector = chaos_collector.ChaosCollector(profile)
+        started.append(collector.start())
+        return collector
+
+    yield start
+    for collector in started:
+        collector.stop()
+
+
+def destination(collector, token):
+    return {"access_token": token, "collector_host": collector.host,
+            "collector_port": collector.port, "collector_encryption": "none"}
+
+
+def destination_stats(tracer):
+    return tracer.recorder.stats()["destinations"]
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_same_spans_to_every_destination(collectors, use_thrift, make_tracer):
+    first, second = collectors(), collectors()
+    tracer = make_tracer(destinations=[destination(first, "first-token"),
+                                       destination(second, "second-token")],
+                         use_thrift=use_thrift)
+    for i in range(10):
+        tracer.start_span(str(i)).finish()
+    assert tracer.flush()
+    wait_for(lambda: first.num_spans == 10 and second.num_spans == 10)
+
+    assert [r.access_token for r in first.reports] == ["first-token"]
+    assert [r.access_token for r in second.reports] == ["second-token"]
+    # Counted once the collector's response is in.
+    wait_for(lambda: [s["spans_sent"] for s in destination_stats(tracer)]
+             == [10, 10])
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_destination_defaults_to_tracer_settings(collectors, make_tracer):
+    collector = collectors()
+    tracer = make_tracer(destinations=[{"collector_port": collector.port}],
+                         collector_host=collector.host,
+                         collector_encryption="none")
+    tracer.start_span("span").finish()
+    tracer.flush()
+    wait_for(lambda: collector.num_spans == 1)
+    assert collector.reports[0].access_token == "test-token"
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_stalled_destination_does_not_block_others(collectors, make_tracer):
+    stalled = collectors(chaos_collector.FaultProfile(
+        "stalled", latency=chaos_collector.constant(1.0)))
+    healthy = collectors()
+    tracer = make_tracer(destinations=[destination(stalled, "stalled-token"),
+                                       destination(healthy, "healthy-token")])
+    start = time.time()
+    for i in range(3):
+        tracer.start_span(str(i)).finish()
+        tracer.flush()
+    assert time.time() - start < 0.5
+    wait_for(lambda: healthy.num_spans == 3, timeout=0.5)
+    assert stalled.num_spans < 3
+
+    # Shutting down still delivers what the stalled destination has queued.
+    tracer.recorder.shutdown()
+    assert stalled.num_spans == 3
+
+
+def test_close_shares_one_deadline(collectors, make_tracer):
+    stalled = [collectors(chaos_collector.FaultProfile(
+        "stalled", latency=chaos_collector.constant(2.0))) for _ in range(3)]
+    tracer = make_tracer(
+        destinations=[destination(collector, "stalled-token")
+                      for collector in stalled],
+        timeout_seconds=0.5)
+    tracer.start_span("span").finish()
+    tracer.flush()
+    connection = tracer.recorder._flush_connection
+    wait_for(lambda: all(d._in_flight for d in connection._destinations))
+
+    start = time.time()
+    connection.close()
+    assert time.time() - start < 1.0
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_failed_reports_retried_per_destination(collectors, monkeypatch,
+                                                make_tracer):
+    monkeypatch.setattr(constants, "FANOUT_MIN_BACKOFF_SECS", 0.01)
+    failing = collectors(chaos_collector.FaultProfile("errors",
+                                                      error_rate=1.0))
+    healthy = collectors()
+    tracer = make_tracer(destinations=[destination(failing, "failing-token"),
+                                       destination(healthy, "healthy-token")])
+    tracer.start_span("span").finish()
+    tracer.flush()
+    wait_for(lambda: failing.injected_errors >= 2)
+    failing.profile = chaos_collector.FaultProfile("healthy")
+    wait_for(lambda: failing.num_spans == 1)
+
+    failing_stats, healthy_stats = destination_stats(tracer)
+    assert failing_stats["report_errors"] >= 2
+    assert failing_stats["reports_sent"] == 1
+    assert healthy_stats["report_errors"] == 0
+    assert healthy.num_spans == 1
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_pending_reports_bounded(collectors, monkeypatch, make_tracer):
+    monkeypatch.setattr(constants, "FANOUT_MAX_PENDING_REPORTS", 2)
+    stalled = collectors(chaos_collector.FaultProfile(
+        "stalled", latency=chaos_collector.constant(0.5)))
+    tracer = make_tracer(destinations=[destination(stalled, "stalled-token")])
+    tracer.start_span("first").finish()
+    tracer.flush()
+    sender = tracer.recorder._flush_connection._destinations[0]
+    wait_for(lambda: sender._in_flight)
+    for i in range(5):
+        tracer.start_span(str(i)).finish()
+        tracer.flush()
+    # One report in flight and two pending; the others were dropped.
+    assert destination_stats(tracer)[0]["reports_dropped"] == 3
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_disable_command_only_stops_its_destination(collectors, make_tracer):
+    disabling = collectors(chaos_collector.FaultProfile("disable",
+                                                        disable=True))
+    healthy = collectors()
+    tracer = make_tracer(
+        destinations=[destination(disabling, "disabled-token"),
+                      destination(healthy, "healthy-token")])
+    for i in range(3):
+        tracer.start_span(str(i)).finish()
+        tracer.flush(deadline=time.time() + 5)
+
+    assert len(disabling.reports) == 1
+    assert healthy.num_spans == 3
+    assert not tracer.recorder._disabled_runtime
+    tracer.recorder.shutdown(flush=False)
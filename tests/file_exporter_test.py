@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from lightstep import constants
+from lightstep.file_exporter import PARTIAL_SUFFIX
+from lightstep.replay import Replayer, _RateLimiter, _frames, _segments
+
+mock_collector = pytest.importorskip("benchmarks.mock_collector")
+chaos_collector = pytest.importorskip("benchmarks.chaos_collector")
+
+
+@pytest.fixture
+def collector():
+    with mock_collector.MockCollector() as collector:
+        collector.keep_spans = True
+        yield collector
+
+
+def export_spans(tracer, reports, spans_per_report=5):
+    for i in range(reports):
+        for j in range(spans_per_report):
+            tracer.start_span("span {0}.{1}".format(i, j)).finish()
+        assert tracer.flush()
+
+
+def replayer(collector, **kwargs):
+    return Replayer(collector_host=collector.host,
+                    collector_port=collector.port,
+                    collector_encryption="none", **kwargs)
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_export_and_replay(tmp_path, collector, use_thrift, make_tracer):
+    tracer = make_tracer(export_dir=str(tmp_path), use_thrift=use_thrift)
+    export_spans(tracer, 4)
+    tracer.recorder.shutdown()
+    assert collector.reports == []
+
+    segments = _segments([str(tmp_path)])
+    assert len(segments) == 1
+    assert len(list(_frames(segments[0]))) == 4
+
+    replay = replayer(collector, concurrency=2)
+    assert replay.run([str(tmp_path)])
+    assert collector.num_spans == 20
+    assert {r.access_token for r in collector.reports} == {"test-token"}
+    assert {r.kind for r in collector.reports} == \
+        {"thrift" if use_thrift else "proto"}
+    assert replay.stats["reports_sent"] == 4
+    # Without delete=True the spool is kept.
+    assert _segments([str(tmp_path)]) == segments
+
+
+def test_segments_rotate_at_size_cap(tmp_path, make_tracer):
+    tracer = make_tracer(export_dir=str(tmp_path), export_segment_bytes=2000)
+    export_spans(tracer, 10)
+    connection = tracer.recorder._flush_connection
+    # The current segment is only renamed once it is complete.
+    assert [name for name in os.listdir(str(tmp_path))
+            if name.endswith(PARTIAL_SUFFIX)]
+    tracer.recorder.shutdown()
+
+    segments = _segments([str(tmp_path)])
+    assert len(segments) == connection.stats["segments_written"] > 1
+    assert not [name for name in os.listdir(str(tmp_path))
+                if name.endswith(PARTIAL_SUFFIX)]
+    assert sum(len(list(_frames(path))) for path in segments) == 10
+    for path in segments:
+        assert os.path.getsize(path) <= 2000
+
+
+def test_replay_overrides_token_and_deletes(tmp_path, collector, make_tracer):
+    tracer = make_tracer(export_dir=str(tmp_path), export_segment_bytes=2000)
+    export_spans(tracer, 10)
+    tracer.recorder.shutdown()
+
+    replay = replayer(collector, access_token="other-token", delete=True)
+    assert replay.run([str(tmp_path)])
+    assert collector.num_spans == 50
+    assert {r.access_token for r in collector.reports} == {"other-token"}
+    assert os.listdir(str(tmp_path)) == []
+    assert replay.stats["segments_deleted"] == replay.stats["segments"]
+
+
+def test_replay_keeps_segments_that_failed(tmp_path, monkeypatch, make_tracer):
+    monkeypatch.setattr(constants, "REPLAY_RETRY_SECS", 0.01)
+    tracer = make_tracer(export_dir=str(tmp_path))
+    export_spans(tracer, 3)
+    tracer.recorder.shutdown()
+
+    with chaos_collector.ChaosCollector(chaos_collector.FaultProfile(
+            "errors", error_rate=1.0)) as failing:
+        replay = replayer(failing, retries=2, delete=True)
+        assert not replay.run([str(tmp_path)])
+    assert failing.injected_errors == 9
+    assert replay.stats["report_errors"] == 3
+    assert replay.stats["retries"] == 6
+    assert len(_segments([str(tmp_path)])) == 1
+
+
+def test_replay_stops_at_truncated_frame(tmp_path, collector, make_tracer):
+    tracer = make_tracer(export_dir=str(tmp_path))
+    export_spans(tracer, 2)
+    tracer.recorder.shutdown()
+    path = _segments([str(tmp_path)])[0]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+
+    replay = replayer(collector, delete=True)
+    assert not replay.run([path])
+    assert collector.num_spans == 5
+    assert replay.stats["frame_errors"] == 1
+    assert os.path.exists(path)
+
+
+def test_rate_limiter():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+
+    limiter = _RateLimiter(4, clock=lambda: now[0], sleep=sleep)
+    for _ in range(3):
+        limiter.acquire()
+    assert sleeps == [0.25, 0.5]
+
+    # Idle time is not saved up for a burst.
+    now[0] = 10.0
+    limiter.acquire()
+    limiter.acquire()
+    assert sleeps == [0.25, 0.5, 0.25]
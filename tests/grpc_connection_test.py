@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+
+pytest.importorskip("grpc")
+grpc_collector = pytest.importorskip("benchmarks.grpc_collector")
+
+
+@pytest.fixture
+def collector():
+    with grpc_collector.GRPCMockCollector() as collector:
+        collector.keep_spans = True
+        yield collector
+
+
+def test_report(collector, make_tracer):
+    tracer = make_tracer(collector)
+    for i in range(3):
+        tracer.start_span(str(i)).finish()
+    assert tracer.flush()
+    tracer.start_span("3").finish()
+    assert tracer.flush()
+
+    assert collector.num_spans == 4
+    assert {r.access_token for r in collector.reports} == {"test-token"}
+    assert sorted(s.operation_name for s in collector.spans) == \
+        ["0", "1", "2", "3"]
+    # Both reports went over the same connection.
+    assert len(collector.peers) == 1
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_concurrent_reports_are_multiplexed(collector, make_tracer):
+    collector.delay = 0.5
+    tracer = make_tracer(collector)
+    recorder = tracer.recorder
+    connection = recorder._create_connection()
+    # Connect before timing the concurrent calls.
+    assert recorder.flush(connection) is False
+
+    def flush():
+        tracer.start_span("concurrent").finish()
+        recorder.flush(connection)
+
+    threads = [threading.Thread(target=flush) for _ in range(8)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Eight 0.5s calls overlap on the one channel instead of queueing.
+    assert time.time() - start < 2
+    assert collector.num_spans == 8
+    assert len(collector.peers) == 1
+    connection.close()
+    recorder.shutdown(flush=False)
+
+
+def test_deadline(collector, make_tracer):
+    collector.delay = 2
+    tracer = make_tracer(collector)
+    tracer.start_span("late").finish()
+
+    start = time.time()
+    assert not tracer.flush(deadline=time.time() + 0.2)
+    assert time.time() - start < 1
+    # The spans are kept for the next flush.
+    assert len(tracer.recorder._span_records) == 1
+    tracer.recorder.shutdown(flush=False)
@@ -0,0 +1,118 @@
+import pytest
+import requests
+from urllib3.exceptions import (MaxRetryError, NewConnectionError,
+                                ProtocolError)
+
+from lightstep.collector_pb2 import Auth, ReportRequest, ReportResponse
+from lightstep.http_connection import _HTTPConnection
+
+
+class Response(object):
+    content = ReportResponse().SerializeToString()
+    status_code = 200
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(self.status_code)
+
+
+def connect_failure():
+    """What requests raises when it cannot connect."""
+    return requests.exceptions.ConnectionError(MaxRetryError(
+        None, "/api/v2/reports",
+        NewConnectionError(None, "connection refused")))
+
+
+class FlakySession(object):
+    """FlakySession fails the posts listed in `failures` (by index), with
+    `error`."""
+
+    def __init__(self, failures, error=connect_failure):
+        self.failures = failures
+        self.error = error
+        self.timeouts = []
+
+    def post(self, url, headers, data, timeout):
+        self.timeouts.append(timeout)
+        if len(self.timeouts) - 1 in self.failures:
+            raise self.error()
+        return Response()
+
+    def close(self):
+        pass
+
+
+def connection_with(session):
+    connection = _HTTPConnection("http://localhost:1/api/v2/reports", 30)
+    connection._session = session
+    return connection
+
+
+def test_stale_connection_retried_once():
+    session = FlakySession(failures=[1])
+    connection = connection_with(session)
+    connection.report(Auth(), ReportRequest())
+    # Connecting fails on the warm session; the report is retried once.
+    connection.report(Auth(), ReportRequest())
+    assert len(session.timeouts) == 3
+
+
+@pytest.mark.parametrize("error", [
+    lambda: requests.exceptions.ConnectionError(ProtocolError(
+        "Connection aborted.", ConnectionResetError())),
+    lambda: requests.exceptions.ConnectionError("connection reset"),
+])
+def test_possibly_sent_report_not_retried(error):
+    session = FlakySession(failures=[1], error=error)
+    connection = connection_with(session)
+    connection.report(Auth(), ReportRequest())
+    # The collector may have the report already.
+    with pytest.raises(requests.exceptions.ConnectionError):
+        connection.report(Auth(), ReportRequest())
+    assert len(session.timeouts) == 2
+
+
+def test_connect_timeout_retried():
+    session = FlakySession(failures=[1],
+                           error=requests.exceptions.ConnectTimeout)
+    connection = connection_with(session)
+    connection.report(Auth(), ReportRequest())
+    connection.report(Auth(), ReportRequest())
+    assert len(session.timeouts) == 3
+
+
+def test_cold_connection_not_retried():
+    session = FlakySession(failures=[0])
+    connection = connection_with(session)
+    try:
+        connection.report(Auth(), ReportRequest())
+    except requests.exceptions.ConnectionError:
+        pass
+    else:
+        raise AssertionError("expected a ConnectionError")
+    assert len(session.timeouts) == 1
+
+
+def test_timeout_argument():
+    session = FlakySession(failures=[1])
+    connection = connection_with(session)
+    connection.report(Auth(), ReportRequest())
+    connection.report(Auth(), ReportRequest(), timeout=0.5)
+    assert session.timeouts[0] == 30
+    assert session.timeouts[1] == 0.5
+    # The retry only gets what is left of the timeout.
+    assert session.timeouts[2] <= 0.5
+
+
+def test_error_status_fails_report():
+    class Unavailable(Response):
+        status_code = 503
+
+    class Session(FlakySession):
+        def post(self, url, headers, data, timeout):
+            super(Session, self).post(url, headers, data, timeout)
+            return Unavailable()
+
+    connection = connection_with(Session(failures=[]))
+    with pytest.raises(requests.exceptions.HTTPError):
+        connection.report(Auth(), ReportRequest())
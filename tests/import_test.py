@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+CHECK_MODULES = (
+    "import sys; {0}; "
+    "print(' '.join(m for m in ('thrift', 'google.protobuf', 'requests', 'jsonpickle') "
+    "if m in sys.modules))"
+)
+
+
+def loaded_modules(statement):
+    output = subprocess.check_output(
+        [sys.executable, "-c", CHECK_MODULES.format(statement)]
+    )
+    return set(output.decode("utf-8").split())
+
+
+def test_import_loads_no_transport():
+    assert loaded_modules("import lightstep") == set()
+
+
+@pytest.mark.parametrize("use_thrift,expected,unexpected", [
+    (False, {"google.protobuf"}, {"thrift", "jsonpickle"}),
+    (True, {"thrift", "jsonpickle"}, {"google.protobuf", "requests"}),
+])
+def test_tracer_loads_only_selected_transport(use_thrift, expected, unexpected):
+    modules = loaded_modules(
+        "import lightstep; lightstep.Tracer(periodic_flush_seconds=0, "
+        "use_http={0}, use_thrift={1})".format(not use_thrift, use_thrift)
+    )
+    assert expected <= modules
+    assert not unexpected & modules
+
+
+def test_binary_propagators_loaded_on_first_use():
+    from opentracing import Format
+    from basictracer.context import SpanContext
+    import lightstep
+
+    tracer = lightstep.Tracer(periodic_flush_seconds=0)
+    carrier = bytearray()
+    tracer.inject(SpanContext(trace_id=1, span_id=2), Format.BINARY, carrier)
+    assert tracer.extract(Format.BINARY, carrier).span_id == 2
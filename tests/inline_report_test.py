@@ -0,0 +1,33 @@
+import pytest
+
+from lightstep.inline_report import _http_request, _parse_http_response
+
+
+def test_http_request():
+    request = _http_request("collector", 80, "/api/v2/reports",
+                            {"Lightstep-Access-Token": "token"}, b"body")
+    head, body = request.split(b"\r\n\r\n")
+    assert body == b"body"
+    assert head.split(b"\r\n") == [
+        b"POST /api/v2/reports HTTP/1.1",
+        b"Host: collector:80",
+        b"Content-Length: 4",
+        b"Connection: close",
+        b"Lightstep-Access-Token: token",
+    ]
+
+
+@pytest.mark.parametrize("response,expected", [
+    (b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nbody", (200, b"body")),
+    (b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nbody", (200, b"bo")),
+    (b"HTTP/1.0 503 Service Unavailable\r\n\r\nbusy", (503, b"busy")),
+    (b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+     b"2\r\nbo\r\n2;x=y\r\ndy\r\n0\r\n\r\n", (200, b"body")),
+])
+def test_parse_http_response(response, expected):
+    assert _parse_http_response(response) == expected
+
+
+def test_incomplete_response():
+    with pytest.raises(Exception):
+        _parse_http_response(b"HTTP/1.1 200 OK\r\nContent-Le")
@@ -1,10 +1,12 @@
 import socket
 import sys
+import threading
 import time
 
 import lightstep.constants
 import lightstep.recorder
 import lightstep.tracer
+import lightstep.util
 from basictracer.span import BasicSpan
 from basictracer.context import SpanContext
 from opentracing.logs import ERROR_KIND, STACK, ERROR_OBJECT
@@ -19,16 +21,18 @@ class MockConnection(object):
 
     def __init__(self):
         self.reports = []
+        self.timeouts = []
         self.ready = False
 
     def open(self):
         self.ready = True
 
-    def report(self, _, report):
+    def report(self, _, report, timeout=None):
         """Mimic the Thrift client's report method. Instead of sending report
-            requests save them to a list.
+            requests save them (and their timeout) to a list.
         """
         self.reports.append(report)
+        self.timeouts.append(timeout)
         return ttypes.ReportResponse()
 
     def close(self):
@@ -193,6 +197,198 @@ def test_buffer_limits(recorder):
     assert recorder.flush(mock_connection)
 
 
+class FailingConnection(MockConnection):
+    """FailingConnection fails every report, so spans get restored."""
+
+    def report(self, _, report):
+        raise Exception("report failed")
+
+
+def test_restore_spans_bounded(recorder):
+    connection = FailingConnection()
+    connection.open()
+    recorder._max_span_records = 50
+
+    for cycle in range(10):
+        for i in range(30):
+            dummy_basic_span(recorder, 30 * cycle + i)
+        assert not recorder.flush(connection)
+        assert len(recorder._span_records) <= 50
+
+    mock_connection = MockConnection()
+    mock_connection.open()
+    assert recorder.flush(mock_connection)
+    names = [recorder.converter.get_span_name(span) for span in
+             recorder.converter.get_span_records(mock_connection.reports[0])]
+    assert len(names) == 50
+
+
+class PayloadConnection(MockConnection):
+    """PayloadConnection keeps the pre-serialized payloads it is given."""
+
+    def __init__(self):
+        super(PayloadConnection, self).__init__()
+        self.payloads = []
+
+    def report(self, auth, report, payload=None):
+        self.payloads.append(payload)
+        return super(PayloadConnection, self).report(auth, report)
+
+
+def test_cooperative_flush(recorder, monkeypatch):
+    yields = []
+    monkeypatch.setattr(lightstep.util, "_cooperative_yield",
+                        lambda: yields.append(None))
+    recorder._cooperative = True
+    connection = PayloadConnection()
+    connection.open()
+
+    for i in range(120):
+        dummy_basic_span(recorder, i)
+    assert recorder.flush(connection)
+
+    report = connection.reports[0]
+    payload = connection.payloads[0]
+    chunk_spans = lightstep.constants.COOPERATIVE_CHUNK_SPANS
+    if recorder.use_thrift:
+        # Payloads are encoded in chunks, but thrift reports are serialized
+        # by the thrift client in one go.
+        assert payload is None
+        assert len(yields) == 120 // chunk_spans
+    else:
+        # A yield after each chunk of spans added to the report, and after
+        # each chunk serialized.
+        assert len(yields) == 2 * -(-120 // chunk_spans)
+        assert type(report).FromString(payload) == report
+        assert payload == report.SerializeToString()
+    check_spans(recorder.converter, report)
+
+
+def test_cooperative_mode_detected(monkeypatch):
+    monkeypatch.setattr(lightstep.util, "_is_monkey_patched", lambda: True)
+    recorder = lightstep.recorder.Recorder(periodic_flush_seconds=0)
+    assert recorder._cooperative
+    recorder = lightstep.recorder.Recorder(periodic_flush_seconds=0,
+                                           cooperative=False)
+    assert not recorder._cooperative
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(lightstep.util, "_monotonic", clock)
+    return clock
+
+
+def inline_recorder(use_thrift, connection, period=1.0, **kwargs):
+    recorder = lightstep.recorder.Recorder(
+        periodic_flush_seconds=period, inline_flush=True,
+        use_thrift=use_thrift, use_http=not use_thrift, **kwargs)
+    connection.open()
+    recorder._flush_connection = connection
+    return recorder
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_inline_flush(clock, use_thrift):
+    connection = MockConnection()
+    recorder = inline_recorder(use_thrift, connection)
+
+    for i in range(3):
+        dummy_basic_span(recorder, i)
+    assert not connection.reports
+
+    clock.now += 1.0
+    dummy_basic_span(recorder, 3)
+    assert len(connection.reports) == 1
+    check_spans(recorder.converter, connection.reports[0])
+    assert recorder.converter.num_span_records(connection.reports[0]) == 3
+    assert len(recorder._span_records) == 1
+    assert recorder._flush_thread is None
+
+
+def test_inline_flush_rate(clock):
+    connection = MockConnection()
+    recorder = inline_recorder(False, connection, period=0.125)
+
+    for i in range(1000):
+        clock.now += 1.0 / 64
+        dummy_basic_span(recorder, i)
+    # One report per period, however many spans are recorded.
+    assert len(connection.reports) == 1000 // 8
+    assert sum(len(r.spans) for r in connection.reports) + \
+        len(recorder._span_records) == 1000
+
+
+def test_inline_flush_with_full_buffer(clock):
+    connection = MockConnection()
+    recorder = inline_recorder(False, connection, max_span_records=5)
+    for i in range(10):
+        dummy_basic_span(recorder, i)
+    clock.now += 1.0
+    dummy_basic_span(recorder, 10)
+    assert len(connection.reports[0].spans) == 5
+
+
+@pytest.mark.parametrize("timeout_seconds,expected", [
+    (None, lightstep.constants.INLINE_FLUSH_TIMEOUT_SECS),
+    (5, 5),
+])
+def test_inline_flush_timeout(clock, timeout_seconds, expected):
+    connection = MockConnection()
+    recorder = inline_recorder(False, connection,
+                               timeout_seconds=timeout_seconds)
+    dummy_basic_span(recorder, 0)
+    clock.now += 1.0
+    dummy_basic_span(recorder, 1)
+    # Passed to the report, as not every connection applies timeout_seconds
+    # by itself (thrift's does not).
+    assert connection.timeouts == [expected]
+
+
+class BlockingConnection(MockConnection):
+    """BlockingConnection holds every report until released."""
+
+    def __init__(self):
+        super(BlockingConnection, self).__init__()
+        self.reporting = threading.Event()
+        self.release = threading.Event()
+
+    def report(self, _, report, timeout=None):
+        self.reporting.set()
+        self.release.wait(10)
+        return super(BlockingConnection, self).report(_, report, timeout)
+
+
+def test_inline_flush_does_not_block_other_callers(clock):
+    connection = BlockingConnection()
+    recorder = inline_recorder(False, connection)
+    clock.now += 1.0
+    flusher = threading.Thread(target=dummy_basic_span, args=(recorder, 0))
+    flusher.start()
+    assert connection.reporting.wait(10)
+
+    # Past the deadline again, but a flush is in progress elsewhere.
+    clock.now += 1.0
+    start = time.time()
+    for i in range(1, 100):
+        dummy_basic_span(recorder, i)
+    assert time.time() - start < 1.0
+    assert len(recorder._span_records) == 99
+
+    connection.release.set()
+    flusher.join()
+    assert len(connection.reports) == 1
+
+
 def check_spans(converter, report):
     """Checks spans' name.
     """
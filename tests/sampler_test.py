@@ -0,0 +1,334 @@
+import random
+
+import pytest
+from opentracing import Format
+from opentracing.ext import tags
+
+from lightstep.b3_propagator import B3Propagator
+from lightstep.propagation import LightStepFormat
+from lightstep.sampler import (AdaptiveSampler, PerOperationSampler,
+                               ProbabilisticSampler, RateLimitingSampler,
+                               Sampler, _UndecidedSpanContext)
+from lightstep.trace_context import TraceContextPropagator
+from lightstep.tracer import _UnsampledSpan
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def trace_ids(count, seed=1):
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(count)]
+
+
+@pytest.mark.parametrize("rate", [0.0, 0.01, 0.25, 1.0])
+def test_probabilistic_rate(rate):
+    sampler = ProbabilisticSampler(rate)
+    sampled = sum(sampler.sampled(t) for t in trace_ids(20000))
+    # Four standard deviations.
+    assert abs(sampled - rate * 20000) <= \
+        4 * (20000 * rate * (1 - rate)) ** 0.5 + 1
+
+
+def test_probabilistic_decision_follows_trace_id():
+    ids = trace_ids(2000)
+    low, high = ProbabilisticSampler(0.1), ProbabilisticSampler(0.5)
+    # Consistent across samplers (and so across services) ...
+    assert [low.sampled(t) for t in ids] == \
+        [ProbabilisticSampler(0.1).sampled(t) for t in ids]
+    # ... and nested across rates.
+    assert all(high.sampled(t) for t in ids if low.sampled(t))
+    # Sequential ids are spread as well as random ones.
+    assert 400 <= sum(high.sampled(t) for t in range(1000)) <= 600
+    # 128 bit ids decide as their low 64 bits, which LightStep keeps.
+    assert [low.sampled((7 << 64) | t) for t in ids] == \
+        [low.sampled(t) for t in ids]
+
+
+def test_rate_limiting():
+    clock = FakeClock()
+    sampler = RateLimitingSampler(10, clock=clock)
+    assert sum(sampler.sampled(0) for _ in range(50)) == 10
+    clock.now += 0.5
+    assert sum(sampler.sampled(0) for _ in range(50)) == 5
+    # Idle time only refills up to one second's worth.
+    clock.now += 60
+    assert sum(sampler.sampled(0) for _ in range(50)) == 10
+
+
+def test_per_operation():
+    clock = FakeClock()
+    sampler = PerOperationSampler(0.0, {
+        "checkout": 1.0,
+        "search": RateLimitingSampler(2, clock=clock),
+    })
+    ids = trace_ids(100)
+    assert all(sampler.sampled(t, "checkout") for t in ids)
+    assert not any(sampler.sampled(t, "other") for t in ids)
+    assert sum(sampler.sampled(t, "search") for t in ids) == 2
+
+
+def test_unsampled_trace_is_not_recorded(make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(0.0))
+    with tracer.start_active_span("root") as scope:
+        root = scope.span
+        root.set_tag("key", "value")
+        root.log_kv({"event": "ignored"})
+        root.set_baggage_item("user", "alice")
+        with tracer.start_active_span("child") as child_scope:
+            child = child_scope.span
+
+    assert isinstance(root, _UnsampledSpan)
+    assert isinstance(child, _UnsampledSpan)
+    assert not child.context.sampled
+    assert child.get_baggage_item("user") == "alice"
+    assert root.tags == {} and root.logs == []
+    assert tracer.recorder._span_records == []
+
+    carrier = {}
+    tracer.inject(child.context, Format.TEXT_MAP, carrier)
+    assert carrier["ot-tracer-sampled"] == "false"
+
+
+def test_operation_name_decides_root_only(make_tracer):
+    tracer = make_tracer(
+        sampler=PerOperationSampler(0.0, {"checkout": 1.0}))
+    with tracer.start_active_span("checkout"):
+        tracer.start_span("other").finish()
+    tracer.start_span("other").finish()
+    assert len(tracer.recorder._span_records) == 2
+
+
+@pytest.mark.parametrize("priority", [1, "1"])
+def test_sampling_priority_samples_span(priority, make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(0.0))
+    span = tracer.start_span("forced")
+    span.set_tag("dropped", True)
+    span.set_tag(tags.SAMPLING_PRIORITY, priority)
+    span.set_tag("kept", True)
+    span.finish()
+
+    assert span.context.sampled
+    assert span.tags == {tags.SAMPLING_PRIORITY: 1, "kept": True}
+    assert len(tracer.recorder._span_records) == 1
+
+
+@pytest.mark.parametrize("priority", [0, "0", "high", None])
+def test_sampling_priority_ignored(priority, make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(0.0))
+    span = tracer.start_span("dropped")
+    span.set_tag(tags.SAMPLING_PRIORITY, priority)
+    span.finish()
+
+    assert isinstance(span, _UnsampledSpan)
+    assert len(tracer.recorder._span_records) == 0
+
+
+def test_sampler_is_abstract():
+    with pytest.raises(TypeError):
+        Sampler()
+
+
+def run_window(sampler, clock, traffic, ids):
+    """One second of traffic, {operation: traces}. Returns the sampled
+    traces of each operation."""
+    sampled = dict((name, 0) for name in traffic)
+    total = sum(traffic.values())
+    calls = [name for name, count in traffic.items() for _ in range(count)]
+    random.Random(total).shuffle(calls)
+    start = clock.now
+    for i, name in enumerate(calls):
+        clock.now = start + i / float(total)
+        sampled[name] += sampler.sampled(next(ids), name)
+    clock.now = start + 1
+    return sampled
+
+
+def test_adaptive_shares_budget():
+    clock = FakeClock()
+    ids = iter(trace_ids(100000))
+    sampler = AdaptiveSampler(100, min_traces_per_second=1, clock=clock)
+    traffic = {"busy": 5000, "medium": 400, "rare": 20}
+    for _ in range(5):
+        sampled = run_window(sampler, clock, traffic, ids)
+
+    assert 80 <= sum(sampled.values()) <= 110
+    # The rare operation is sampled fully, the others share the rest.
+    assert sampled["rare"] == 20
+    assert abs(sampled["busy"] - sampled["medium"]) <= 20
+    stats = sampler.stats()["operations"]
+    assert stats["rare"]["probability"] == 1.0
+    assert stats["busy"]["traces_per_second"] == pytest.approx(5000, rel=0.05)
+
+
+def test_adaptive_holds_budget_through_spike():
+    clock = FakeClock()
+    ids = iter(trace_ids(300000))
+    sampler = AdaptiveSampler(100, min_traces_per_second=1, clock=clock)
+    for _ in range(3):
+        run_window(sampler, clock, {"busy": 2000, "rare": 2}, ids)
+
+    spike = run_window(sampler, clock, {"busy": 20000, "rare": 2}, ids)
+    # Past the window's budget, only the minimum rate gets through.
+    assert sum(spike.values()) <= 102
+    assert spike["rare"] >= 1
+    after = run_window(sampler, clock, {"busy": 20000, "rare": 2}, ids)
+    assert 80 <= sum(after.values()) <= 120
+
+
+def test_adaptive_bounds_operations():
+    clock = FakeClock()
+    sampler = AdaptiveSampler(10, max_operations=5, clock=clock)
+    for i, trace_id in enumerate(trace_ids(100)):
+        sampler.sampled(trace_id, "operation.{0}".format(i))
+    clock.now += 1
+    sampler.sampled(0, "operation.0")
+
+    stats = sampler.stats()
+    assert len(stats["operations"]) == 5
+    assert stats["other_operations"]["traces_per_second"] == \
+        pytest.approx(95)
+
+
+def test_adaptive_budgets_spans():
+    clock = FakeClock()
+    ids = iter(trace_ids(100000))
+    sampler = AdaptiveSampler(500, clock=clock)
+    for _ in range(5):
+        sampled = run_window(sampler, clock, {"busy": 5000}, ids)
+        for _ in range(5 * sampled["busy"]):
+            sampler.record_span(None)
+
+    # Traces of 5 spans: 100 traces per second.
+    assert 80 <= sampled["busy"] <= 110
+    stats = sampler.stats()
+    assert stats["spans_per_trace"] == pytest.approx(5)
+    assert stats["traces_per_second"] == pytest.approx(100)
+
+
+def test_tracer_counts_spans_for_sampler(make_tracer):
+    sampler = AdaptiveSampler(10)
+    tracer = make_tracer(sampler=sampler)
+    with tracer.start_active_span("root"):
+        tracer.start_span("child").finish()
+    assert sampler._window_spans == 2
+
+
+def test_tracer_stats_include_sampler(make_tracer):
+    tracer = make_tracer(sampler=AdaptiveSampler(10))
+    tracer.start_span("operation").finish()
+    stats = tracer.stats()
+    assert stats["spans_buffered"] == 1
+    assert "operation" in stats["sampler"]["operations"]
+    tracer = make_tracer(sampler=ProbabilisticSampler(1.0))
+    assert "sampler" not in tracer.stats()
+
+
+def traceparent(flags):
+    return "00-{0}-{1}-{2}".format(16 * "0" + 16 * "a", 16 * "b", flags)
+
+
+@pytest.mark.parametrize("propagator,unsampled,sampled", [
+    (B3Propagator, {"b3": "a-b-0"}, {"b3": "a-b-1"}),
+    (TraceContextPropagator, {"traceparent": traceparent("00")},
+     {"traceparent": traceparent("01")}),
+])
+def test_upstream_decision_is_honored(propagator, unsampled, sampled,
+                                      make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(1.0))
+    tracer.register_propagator(Format.HTTP_HEADERS, propagator())
+
+    span = tracer.start_span(
+        "server", child_of=tracer.extract(Format.HTTP_HEADERS, unsampled))
+    child = tracer.start_span("child", child_of=span)
+    assert isinstance(child, _UnsampledSpan)
+    child.finish()
+    span.finish()
+    assert tracer.recorder._span_records == []
+
+    # And is passed on downstream.
+    carrier = {}
+    tracer.inject(child.context, Format.HTTP_HEADERS, carrier)
+    assert tracer.extract(Format.HTTP_HEADERS, carrier).sampled is False
+
+    tracer = make_tracer(sampler=ProbabilisticSampler(0.0))
+    tracer.register_propagator(Format.HTTP_HEADERS, propagator())
+    tracer.start_span("server", child_of=tracer.extract(
+        Format.HTTP_HEADERS, sampled)).finish()
+    assert len(tracer.recorder._span_records) == 1
+
+
+@pytest.mark.parametrize("propagator,carrier", [
+    (B3Propagator, {"b3": "a-b-0"}),
+    (TraceContextPropagator, {"traceparent": traceparent("00")}),
+])
+def test_upstream_decision_overridden(propagator, carrier, make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(1.0))
+    tracer.register_propagator(Format.HTTP_HEADERS,
+                               propagator(honor_sampled=False))
+    span = tracer.start_span(
+        "server", child_of=tracer.extract(Format.HTTP_HEADERS, carrier))
+    span.finish()
+    assert span.context.sampled
+    assert len(tracer.recorder._span_records) == 1
+
+    # Downstream services get this service's decision.
+    injected = {}
+    tracer.inject(span.context, Format.HTTP_HEADERS, injected)
+    assert isinstance(tracer.extract(Format.HTTP_HEADERS, injected),
+                      _UndecidedSpanContext)
+    tracer.register_propagator(Format.HTTP_HEADERS, propagator())
+    assert tracer.extract(Format.HTTP_HEADERS, injected).sampled is True
+
+
+def test_undecided_upstream_trace_is_sampled_locally(make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(0.0))
+    tracer.register_propagator(Format.HTTP_HEADERS, B3Propagator())
+    parent = tracer.extract(Format.HTTP_HEADERS, {"b3": "a-b"})
+    assert isinstance(tracer.start_span("server", child_of=parent),
+                      _UnsampledSpan)
+
+
+_BINARY_FORMATS = [
+    (Format.BINARY, bytearray),
+    (LightStepFormat.LIGHTSTEP_BINARY, bytearray),
+]
+
+
+@pytest.mark.parametrize("propagator,carrier,format,new_carrier", [
+    (B3Propagator(), {"x-b3-traceid": "a", "x-b3-spanid": "b"},
+     Format.TEXT_MAP, dict),
+    (B3Propagator(), {"b3": "a-b"}, Format.TEXT_MAP, dict),
+    (TraceContextPropagator(), {}, Format.TEXT_MAP, dict),
+    (TraceContextPropagator(honor_sampled=False),
+     {"traceparent": traceparent("01")}, Format.TEXT_MAP, dict),
+] + [
+    # W3C contexts are not checked against the binary formats, which carry
+    # neither 128-bit trace ids nor its integer trace-flags baggage.
+    (B3Propagator(), carrier, format, new_carrier)
+    for carrier in [{"x-b3-traceid": "a", "x-b3-spanid": "b"}, {"b3": "a-b"}]
+    for format, new_carrier in _BINARY_FORMATS
+])
+def test_undecided_context_round_trips(propagator, carrier, format,
+                                       new_carrier, make_tracer):
+    tracer = make_tracer(sampler=ProbabilisticSampler(1.0))
+    tracer.register_propagator(Format.HTTP_HEADERS, propagator)
+    context = tracer.extract(Format.HTTP_HEADERS, carrier)
+    assert isinstance(context, _UndecidedSpanContext)
+
+    injected = new_carrier()
+    tracer.inject(context, format, injected)
+    extracted = tracer.extract(format, injected)
+    assert extracted.trace_id == context.trace_id
+    assert extracted.span_id == context.span_id
+    assert extracted.sampled is True
+
+    injected = {}
+    tracer.inject(context, Format.HTTP_HEADERS, injected)
+    assert tracer.extract(Format.HTTP_HEADERS, injected).trace_id == \
+        context.trace_id
@@ -0,0 +1,165 @@
+import random
+import socket
+
+import pytest
+
+from lightstep import constants
+from lightstep.satellite_pool import _DNSCache, _SatellitePool
+
+mock_collector = pytest.importorskip("benchmarks.mock_collector")
+chaos_collector = pytest.importorskip("benchmarks.chaos_collector")
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def collectors():
+    started = []
+
+    def start(profile=None):
+        if profile is None:
+            collector = mock_collector.MockCollector()
+        else:
+            collector = chaos_collector.ChaosCollector(profile)
+        started.append(collector.start())
+        return collector
+
+    yield start
+    for collector in started:
+        collector.stop()
+
+
+def endpoint(collector):
+    return "{0}:{1}".format(collector.host, collector.port)
+
+
+def flush_spans(tracer, count, connection=None):
+    for i in range(count):
+        tracer.start_span(str(i)).finish()
+        tracer.recorder.flush(connection)
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_reports_spread_over_endpoints(collectors, use_thrift, make_tracer):
+    pool = [collectors() for _ in range(3)]
+    tracer = make_tracer(collector_endpoints=[endpoint(c) for c in pool],
+                         collector_encryption="none", use_thrift=use_thrift)
+    flush_spans(tracer, 30)
+
+    assert sum(c.num_spans for c in pool) == 30
+    assert all(c.reports for c in pool)
+    assert tracer.recorder.stats()["endpoints"] == 3
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_slow_endpoint_avoided(collectors, make_tracer):
+    slow = collectors(chaos_collector.FaultProfile(
+        "slow", latency=chaos_collector.constant(0.1)))
+    fast = [collectors() for _ in range(2)]
+    tracer = make_tracer(
+        collector_endpoints=[endpoint(slow)] + [endpoint(c) for c in fast],
+        collector_encryption="none")
+    flush_spans(tracer, 60)
+
+    assert sum(c.num_spans for c in fast) + slow.num_spans == 60
+    # Once its round trip time is known it loses every comparison.
+    assert len(slow.reports) <= 2
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_failing_endpoint_ejected_and_readmitted(collectors, make_tracer):
+    failing = collectors(chaos_collector.FaultProfile("errors",
+                                                      error_rate=1.0))
+    healthy = collectors()
+    clock = FakeClock()
+    pool = _SatellitePool([endpoint(failing), endpoint(healthy)], False,
+                          False, 5, clock=clock, rng=random.Random(1))
+    tracer = make_tracer(collector_endpoints=["unused:1"],
+                         collector_encryption="none")
+
+    # Reports that fail are retried on the healthy endpoint.
+    flush_spans(tracer, 20, pool)
+    assert healthy.num_spans == 20
+    assert failing.injected_errors == \
+        constants.SATELLITE_EJECT_AFTER_FAILURES
+    assert pool.stats["endpoints_ejected"] == 1
+
+    # On probation, a single failure ejects it again, for twice as long.
+    clock.now += constants.SATELLITE_EJECT_SECONDS
+    flush_spans(tracer, 20, pool)
+    assert failing.injected_errors == \
+        constants.SATELLITE_EJECT_AFTER_FAILURES + 1
+    assert pool.stats["endpoints_ejected"] == 1
+    clock.now += constants.SATELLITE_EJECT_SECONDS
+    assert pool.stats["endpoints_ejected"] == 1
+
+    # Once it recovers, it is re-admitted.
+    failing.profile = chaos_collector.FaultProfile("healthy")
+    clock.now += constants.SATELLITE_EJECT_SECONDS
+    flush_spans(tracer, 20, pool)
+    assert failing.num_spans > 0
+    assert failing.num_spans + healthy.num_spans == 60
+    assert pool.stats["endpoints_ejected"] == 0
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_all_endpoints_down(make_tracer):
+    sockets = [socket.socket() for _ in range(2)]
+    for sock in sockets:
+        sock.bind(("127.0.0.1", 0))
+    endpoints = ["127.0.0.1:{0}".format(s.getsockname()[1]) for s in sockets]
+    for sock in sockets:
+        sock.close()
+
+    tracer = make_tracer(collector_endpoints=endpoints,
+                         collector_encryption="none")
+    tracer.start_span("kept").finish()
+    assert not tracer.flush()
+    assert len(tracer.recorder._span_records) == 1
+    tracer.recorder.shutdown(flush=False)
+
+
+@pytest.mark.parametrize("option", [
+    {"export_dir": "/tmp/reports"},
+    {"destinations": [{"collector_port": 1}]},
+    {"agent_socket": "/tmp/agent.sock"},
+    {"agent_udp_address": "127.0.0.1:1"},
+    {"use_grpc": True},
+])
+def test_only_one_transport(option, make_tracer):
+    with pytest.raises(ValueError, match="collector_endpoints"):
+        make_tracer(collector_endpoints=["127.0.0.1:1"], **option)
+
+
+def test_dns_cache(monkeypatch):
+    answers = [[("127.0.0.1",)], [("127.0.0.2",), ("127.0.0.1",)]]
+    calls = []
+
+    def getaddrinfo(host, port, *args):
+        calls.append(host)
+        if not answers:
+            raise socket.gaierror("no answer")
+        return [(None, None, None, None, address)
+                for address in answers.pop(0)]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    clock = FakeClock()
+    cache = _DNSCache(30, clock)
+
+    assert cache.resolve("satellites", 80) == ["127.0.0.1"]
+    clock.now += 29
+    assert cache.resolve("satellites", 80) == ["127.0.0.1"]
+    assert len(calls) == 1
+
+    clock.now += 1
+    assert cache.resolve("satellites", 80) == ["127.0.0.1", "127.0.0.2"]
+    # A failed refresh keeps the stale answer.
+    clock.now += 30
+    assert cache.resolve("satellites", 80) == ["127.0.0.1", "127.0.0.2"]
+    assert len(calls) == 3
@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from basictracer.context import SpanContext
+from opentracing.harness.scope_check import ScopeCompatibilityCheckMixin
+
+scope_manager = pytest.importorskip("lightstep.scope_manager")
+
+
+class ContextVarsScopeManagerCompatibility(unittest.TestCase,
+                                           ScopeCompatibilityCheckMixin):
+    def scope_manager(self):
+        return scope_manager.ContextVarsScopeManager()
+
+
+def test_scope_follows_tasks_and_executors(make_tracer):
+    tracer = make_tracer(
+        scope_manager=scope_manager.ContextVarsScopeManager())
+    seen = {}
+
+    async def child(name):
+        await asyncio.sleep(0)
+        seen[name] = tracer.active_span.operation_name
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        with tracer.start_active_span("parent"):
+            await asyncio.gather(*[
+                asyncio.create_task(child("task{0}".format(i)))
+                for i in range(10)
+            ])
+            with ThreadPoolExecutor(1) as executor:
+                await scope_manager.run_in_executor(
+                    loop, executor,
+                    lambda: seen.update(executor=tracer.active_span.operation_name))
+        assert tracer.active_span is None
+
+    asyncio.run(main())
+    assert set(seen.values()) == {"parent"}
+    assert len(seen) == 11
+
+
+def test_concurrent_tasks_keep_their_own_scopes(make_tracer):
+    tracer = make_tracer(
+        scope_manager=scope_manager.ContextVarsScopeManager())
+
+    async def worker(i):
+        with tracer.start_active_span(str(i)) as scope:
+            await asyncio.sleep(0)
+            assert tracer.active_span is scope.span
+            with tracer.start_active_span("child") as child:
+                await asyncio.sleep(0)
+                assert child.span.parent_id == scope.span.context.span_id
+            assert tracer.active_span is scope.span
+
+    async def main():
+        await asyncio.gather(*[worker(i) for i in range(100)])
+
+    asyncio.run(main())
+
+
+def test_close_truncates_trace_id(make_tracer):
+    tracer = make_tracer(
+        scope_manager=scope_manager.ContextVarsScopeManager())
+    parent = SpanContext(trace_id=(0xabc << 64) | 0x1234, span_id=1)
+    with tracer.start_active_span("child", child_of=parent) as scope:
+        assert type(scope) is scope_manager._ContextVarsScope
+    assert scope.span.context.trace_id == 0x1234
+
+
+def test_close_from_another_context(make_tracer):
+    manager = scope_manager.ContextVarsScopeManager()
+    tracer = make_tracer(
+        scope_manager=scope_manager.ContextVarsScopeManager())
+    parent = manager.activate(tracer.start_span("parent"), True)
+    scope = manager.activate(tracer.start_span("child"), True)
+
+    def close_elsewhere():
+        scope.close()
+        return manager.active
+
+    # The child's token belongs to the outer context, so reset() fails here
+    # and the previous scope is restored by hand.
+    assert contextvars.copy_context().run(close_elsewhere) is parent
+    assert manager.active is scope
@@ -0,0 +1,256 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import lightstep.thrift_converter
+import lightstep.tracer
+from lightstep.crouton import ttypes
+
+shared_ring = pytest.importorskip("lightstep.shared_ring")
+fork = multiprocessing.get_context("fork")
+
+
+class MockConnection(object):
+    def __init__(self):
+        self.reports = []
+        self.ready = True
+
+    def open(self):
+        pass
+
+    def report(self, _, report):
+        self.reports.append(report)
+        return ttypes.ReportResponse()
+
+    def close(self):
+        pass
+
+
+def record(recorder, names):
+    tracer = lightstep.tracer._LightstepTracer(False, recorder, None)
+    for name in names:
+        span = tracer.start_span(name)
+        span.log_kv({"event": "log", "payload": {"name": name}})
+        span.finish()
+
+
+def reported_names(recorder, connection):
+    return sorted(recorder.converter.get_span_name(span)
+                  for report in connection.reports
+                  for span in recorder.converter.get_span_records(report))
+
+
+def run_in_child(target, *args):
+    process = fork.Process(target=target, args=args)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+def test_ring_wraps_around(tmp_path):
+    ring = shared_ring._SpanRing(str(tmp_path / "ring"), 64)
+    reader = shared_ring._SpanRing(str(tmp_path / "ring"))
+    expected = []
+    for i in range(200):
+        data = bytes(bytearray([i % 256])) * (i % 13)
+        while not ring.put(data):
+            expected_batch = reader.drain(1000)
+            assert expected_batch == expected[:len(expected_batch)]
+            del expected[:len(expected_batch)]
+        expected.append(data)
+    assert reader.drain(1000) == expected
+    assert reader.empty()
+
+
+def test_full_ring_drops(tmp_path):
+    ring = shared_ring._SpanRing(str(tmp_path / "ring"), 64)
+    assert ring.put(b"x" * 60)
+    assert not ring.put(b"y")
+    assert not ring.put(b"z" * 100)
+
+
+def test_writer_killed_mid_record(tmp_path):
+    ring = shared_ring._SpanRing(str(tmp_path / "ring"), 64)
+    assert ring.put(b"published")
+    # A writer that dies after writing a record but before storing its
+    # position: the record is simply not there.
+    start = shared_ring._DATA_OFFSET + ring._head
+    shared_ring._LENGTH.pack_into(ring._map, start, 8)
+    ring._map[start + 4:start + 8] = b"torn"
+    ring.close()
+
+    reader = shared_ring._SpanRing(str(tmp_path / "ring"))
+    assert reader.drain(10) == [b"published"]
+    assert reader.empty()
+    assert reader.drain(10) == []
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_span_record_round_trip(tmp_path, use_thrift, make_recorder):
+    recorder = make_recorder(use_thrift, shared_ring_dir=str(tmp_path))
+    assert recorder._rings.is_reporter()
+    record(recorder, ["a"])
+
+    connection = MockConnection()
+    assert recorder.flush(connection)
+    span = recorder.converter.get_span_records(connection.reports[0])[0]
+    if use_thrift:
+        fields = span.log_records[0].fields
+        assert {(f.Key, f.Value) for f in fields} == {
+            ("event", "log"), ("payload", str({"name": "a"}))}
+    else:
+        fields = span.logs[0].fields
+        assert {(f.key, f.string_value) for f in fields} == {
+            ("event", "log"), ("payload", str({"name": "a"}))}
+
+
+def test_thrift_payload_encoded_once():
+    converter = lightstep.thrift_converter.ThriftConverter()
+    span_record = ttypes.SpanRecord(
+        span_name="payload",
+        log_records=[ttypes.LogRecord(payload_json={"life": 42})])
+    parsed = converter.parse_span_record(
+        converter.serialize_span_record(span_record))
+    report = converter.create_report(ttypes.Runtime(), [parsed])
+    payload_json = report.span_records[0].log_records[0].payload_json
+    assert json.loads(payload_json) == {"life": 42}
+
+
+def child_records(recorder, prefix):
+    record(recorder, ["{0}-{1}".format(prefix, i) for i in range(25)])
+    # Workers killed without flushing leave their spans to the reporter.
+    os._exit(0)
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_reporter_reports_for_workers(tmp_path, use_thrift, make_recorder):
+    recorder = make_recorder(use_thrift, shared_ring_dir=str(tmp_path))
+    assert recorder._rings.is_reporter()
+    for worker in range(4):
+        run_in_child(child_records, recorder, worker)
+    record(recorder, ["reporter"])
+
+    connection = MockConnection()
+    assert recorder.flush(connection)
+    assert reported_names(recorder, connection) == sorted(
+        ["{0}-{1}".format(w, i) for w in range(4) for i in range(25)] +
+        ["reporter"])
+    # The rings of the exited workers are removed once drained.
+    assert sorted(os.listdir(str(tmp_path))) == [
+        "reporter.lock", "ring-{0}".format(os.getpid())]
+
+
+def test_workers_do_not_report(tmp_path, make_recorder):
+    recorder = make_recorder(shared_ring_dir=str(tmp_path))
+    assert recorder._rings.is_reporter()
+
+    def worker():
+        # The reporter lock held by the parent is not inherited.
+        assert not recorder._rings.is_reporter()
+        connection = MockConnection()
+        record(recorder, ["worker"])
+        assert not recorder.flush(connection)
+        assert not connection.reports
+        os._exit(0)
+
+    run_in_child(worker)
+    connection = MockConnection()
+    assert recorder.flush(connection)
+    assert reported_names(recorder, connection) == ["worker"]
+
+
+def test_child_unmaps_inherited_rings(tmp_path, make_recorder):
+    recorder = make_recorder(shared_ring_dir=str(tmp_path))
+    record(recorder, ["parent"])
+    assert recorder.flush(MockConnection())
+    rings = recorder._rings
+
+    def worker():
+        inherited = list(rings._rings.values()) + [rings._own_ring]
+        record(recorder, ["worker"])
+        assert all(ring._map.closed for ring in inherited)
+        assert not rings._own_ring._map.closed
+        os._exit(0)
+
+    run_in_child(worker)
+    connection = MockConnection()
+    assert recorder.flush(connection)
+    assert reported_names(recorder, connection) == ["worker"]
+
+
+def test_reporter_crash_recovery(tmp_path, make_recorder):
+    def crashing_reporter():
+        recorder = make_recorder(shared_ring_dir=str(tmp_path))
+        assert recorder._rings.is_reporter()
+        record(recorder, ["lost-reporter"])
+        os._exit(1)
+
+    process = fork.Process(target=crashing_reporter)
+    process.start()
+    process.join()
+    assert process.exitcode == 1
+
+    # The lock died with the reporter; this process takes over and reports
+    # the spans it left behind.
+    recorder = make_recorder(shared_ring_dir=str(tmp_path))
+    connection = MockConnection()
+    assert recorder.flush(connection)
+    assert reported_names(recorder, connection) == ["lost-reporter"]
+
+
+def test_shutdown_flushes_rings_only_from_reporter(tmp_path, make_recorder):
+    recorder = make_recorder(shared_ring_dir=str(tmp_path))
+    connection = recorder._flush_connection = MockConnection()
+    assert recorder._rings.is_reporter()
+
+    def worker():
+        worker_connection = recorder._flush_connection = MockConnection()
+        record(recorder, ["worker"])
+        assert not recorder.shutdown()
+        assert not worker_connection.reports
+        os._exit(0)
+
+    run_in_child(worker)
+    assert recorder.shutdown()
+    assert reported_names(recorder, connection) == ["worker"]
+
+
+def test_reporter_shutdown_hands_over(tmp_path, make_recorder):
+    recorder = make_recorder(shared_ring_dir=str(tmp_path))
+    assert recorder._rings.is_reporter()
+    record(recorder, ["left-behind"])
+    # E.g. after a disable command, in a process that keeps running.
+    recorder.shutdown(flush=False)
+    assert not recorder._rings.is_reporter()
+
+    def worker():
+        other = make_recorder(shared_ring_dir=str(tmp_path))
+        connection = MockConnection()
+        assert other._rings.is_reporter()
+        assert other.flush(connection)
+        assert reported_names(other, connection) == ["left-behind"]
+        os._exit(0)
+
+    run_in_child(worker)
+
+
+def test_worker_shutdown_keeps_parent_reporter(tmp_path, make_recorder):
+    recorder = make_recorder(shared_ring_dir=str(tmp_path))
+    assert recorder._rings.is_reporter()
+
+    def worker():
+        # Shuts down with the parent's lock descriptor still inherited.
+        recorder.shutdown(flush=False)
+        os._exit(0)
+
+    run_in_child(worker)
+    assert recorder._rings.is_reporter()
+
+    def other_worker():
+        other = make_recorder(shared_ring_dir=str(tmp_path))
+        assert not other._rings.is_reporter()
+        os._exit(0)
+
+    run_in_child(other_worker)
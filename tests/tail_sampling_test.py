@@ -0,0 +1,115 @@
+import time
+
+from opentracing.ext import tags
+
+from lightstep.tail_sampling import TailSampler
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def buffered(tracer):
+    return sorted(r.operation_name for r in tracer.recorder._span_records)
+
+
+def finish_trace(tracer, root, children=(), **root_tags):
+    start_time = time.time()
+    with tracer.start_active_span(root, start_time=start_time) as scope:
+        for key, value in root_tags.items():
+            scope.span.set_tag(key, value)
+        for name, duration in children:
+            tracer.start_span(name, start_time=start_time).finish(
+                start_time + duration)
+    return scope.span
+
+
+def test_keeps_interesting_traces_only(make_tracer):
+    tracer = make_tracer(tail_sampler=TailSampler(
+        min_duration_seconds=1.0, operations=["checkout"]))
+    finish_trace(tracer, "boring", [("child", 0.1)])
+    finish_trace(tracer, "slow", [("slow child", 2.0)])
+    finish_trace(tracer, "failed", [("child", 0.1)], **{tags.ERROR: True})
+    finish_trace(tracer, "cart", [("checkout", 0.1)])
+
+    assert buffered(tracer) == ["cart", "checkout", "child", "failed",
+                                "slow", "slow child"]
+    stats = tracer.recorder.stats()
+    assert stats["traces_kept"] == 3
+    assert stats["traces_dropped"] == 1
+    assert stats["traces_pending"] == 0
+
+
+def test_sample_rate_keeps_fraction_of_boring_traces(make_tracer):
+    tracer = make_tracer(tail_sampler=TailSampler(sample_rate=0.25))
+    for _ in range(2000):
+        finish_trace(tracer, "boring")
+    assert 400 <= len(tracer.recorder._span_records) <= 600
+
+
+def test_remote_rooted_traces_wait_for_decision(make_tracer):
+    clock = FakeClock()
+    tail_sampler = TailSampler(decision_wait_seconds=5, clock=clock)
+    tracer = make_tracer(tail_sampler=tail_sampler)
+    parent = tracer.extract("text_map", {
+        "ot-tracer-traceid": "1", "ot-tracer-spanid": "2",
+        "ot-tracer-sampled": "true"})
+
+    tracer.start_span("server", child_of=parent).finish()
+    span = tracer.start_span("server", child_of=parent)
+    span.set_tag(tags.ERROR, True)
+    span.finish()
+    tracer.start_span("other", child_of=tracer.extract("text_map", {
+        "ot-tracer-traceid": "3", "ot-tracer-spanid": "4",
+        "ot-tracer-sampled": "true"})).finish()
+    assert tracer.recorder._span_records == []
+    assert tracer.recorder.stats()["spans_pending"] == 3
+
+    clock.now += 5
+    tracer.recorder._release_tail_sampled()
+    assert buffered(tracer) == ["server", "server"]
+    assert tracer.recorder.stats()["traces_kept"] == 1
+
+    # A late span of a kept trace is reported too.
+    tracer.start_span("late", child_of=parent).finish()
+    assert buffered(tracer) == ["late", "server", "server"]
+
+
+def test_bounded_memory(make_tracer):
+    clock = FakeClock()
+    tail_sampler = TailSampler(max_traces=100, max_spans=150, clock=clock)
+    tracer = make_tracer(tail_sampler=tail_sampler)
+    # Children only: nothing is decided by a root finishing.
+    for i in range(1000):
+        parent = tracer.extract("text_map", {
+            "ot-tracer-traceid": "{0:x}".format(i + 1),
+            "ot-tracer-spanid": "1", "ot-tracer-sampled": "true"})
+        for _ in range(3 if i % 2 else 1):
+            tracer.start_span("child", child_of=parent).finish()
+        stats = tail_sampler.stats()
+        assert stats["traces_pending"] <= 100
+        assert stats["spans_pending"] <= 150
+    assert tail_sampler.stats()["traces_decided_early"] > 0
+    assert len(tail_sampler._decisions) <= 101
+
+
+def test_shutdown_decides_every_trace(make_tracer):
+    tail_sampler = TailSampler(keep_errors=True)
+    tracer = make_tracer(tail_sampler=tail_sampler)
+    parent = tracer.extract("text_map", {
+        "ot-tracer-traceid": "1", "ot-tracer-spanid": "2",
+        "ot-tracer-sampled": "true"})
+    span = tracer.start_span("server", child_of=parent)
+    span.set_tag(tags.ERROR, "true")
+    span.finish()
+
+    recorder = tracer.recorder
+    flushed = []
+    recorder.flush = lambda *args, **kwargs: flushed.append(
+        len(recorder._span_records))
+    recorder.shutdown()
+    assert flushed == [1]
@@ -0,0 +1,72 @@
+import json
+
+from lightstep import constants
+from lightstep import thrift_converter
+from lightstep.crouton import ttypes
+from lightstep.thrift_converter import ThriftConverter
+
+
+class Payload(object):
+    def __init__(self):
+        self.life = 42
+
+
+def span_record_with_payloads(*payloads):
+    return ttypes.SpanRecord(
+        span_name="payloads",
+        attributes=[],
+        log_records=[ttypes.LogRecord(payload_json=p) for p in payloads]
+    )
+
+
+def test_payloads_encoded_as_json():
+    converter = ThriftConverter()
+    span_record = span_record_with_payloads(
+        {"life": 42}, [1, 2, 3], "message", 7, None
+    )
+    report = converter.create_report(ttypes.Runtime(), [span_record])
+
+    logs = report.span_records[0].log_records
+    assert json.loads(logs[0].payload_json) == {"life": 42}
+    assert json.loads(logs[1].payload_json) == [1, 2, 3]
+    assert json.loads(logs[2].payload_json) == "message"
+    assert json.loads(logs[3].payload_json) == 7
+    assert logs[4].payload_json is None
+
+
+def test_arbitrary_objects_fall_back_to_jsonpickle():
+    converter = ThriftConverter()
+    span_record = span_record_with_payloads(Payload(), {"nested": Payload()})
+    report = converter.create_report(ttypes.Runtime(), [span_record])
+
+    logs = report.span_records[0].log_records
+    assert json.loads(logs[0].payload_json) == {"life": 42}
+    assert json.loads(logs[1].payload_json) == {"nested": {"life": 42}}
+
+
+def test_unencodable_payload():
+    class Unencodable(object):
+        def __getstate__(self):
+            raise ValueError()
+
+    assert json.loads(thrift_converter._encode_payload(Unencodable())) == \
+        constants.JSON_FAIL
+
+
+def test_payloads_are_encoded_once():
+    converter = ThriftConverter()
+    span_record = span_record_with_payloads("message")
+    converter.create_report(ttypes.Runtime(), [span_record])
+
+    # Spans restored after a failed report go through create_report again.
+    report = converter.create_report(ttypes.Runtime(), [span_record])
+    assert report.span_records[0].log_records[0].payload_json == '"message"'
+
+
+def test_encoders_cached_per_type():
+    thrift_converter._encode_payload({"a": 1})
+    thrift_converter._encode_payload(Payload())
+    assert thrift_converter._payload_encoders[dict] is \
+        thrift_converter._json_encode
+    assert thrift_converter._payload_encoders[Payload] is \
+        thrift_converter._jsonpickle_encode
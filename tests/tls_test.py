@@ -0,0 +1,116 @@
+import shutil
+import ssl
+import subprocess
+import time
+
+import pytest
+
+from lightstep.collector_pb2 import Auth, ReportRequest
+from lightstep.crouton import ttypes
+from lightstep.http_connection import _HTTPConnection
+from lightstep.thrift_connection import _ThriftConnection
+
+mock_collector = pytest.importorskip("benchmarks.mock_collector")
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl is required to create a test certificate")
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.check_call(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+         "-keyout", key, "-out", cert, "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+@pytest.fixture
+def tls_collector(certificate):
+    collector = mock_collector.MockCollector()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    collector._server.socket = context.wrap_socket(
+        collector._server.socket, server_side=True)
+    with collector:
+        yield collector
+
+
+def url(collector, path):
+    return "https://127.0.0.1:{0}{1}".format(collector.port, path)
+
+
+def test_thrift_reconnects_resume_tls_session(tls_collector, certificate):
+    connection = _ThriftConnection(url(tls_collector, mock_collector.THRIFT_PATH))
+    connection._ssl_context.load_verify_locations(certificate[0])
+    connection.open()
+    for _ in range(3):
+        connection.report(ttypes.Auth("token"), ttypes.ReportRequest())
+
+    # THttpClient reconnects for every report.
+    assert len(tls_collector.reports) == 3
+    assert connection._ssl_context.handshakes == 3
+    assert connection._ssl_context.resumed_handshakes == 2
+
+
+def test_http_reconnect_resumes_tls_session(tls_collector, certificate):
+    connection = _HTTPConnection(url(tls_collector, mock_collector.PROTO_PATH), 5)
+    connection._ssl_context.load_verify_locations(certificate[0])
+    for _ in range(2):
+        connection.report(Auth(access_token="token"), ReportRequest())
+        connection.close()
+
+    assert len(tls_collector.reports) == 2
+    assert connection._ssl_context.handshakes == 2
+    assert connection._ssl_context.resumed_handshakes == 1
+
+
+def test_inline_reports_resume_tls_session(tls_collector, certificate):
+    connection = _HTTPConnection(url(tls_collector, mock_collector.PROTO_PATH), 5)
+    connection._ssl_context.load_verify_locations(certificate[0])
+    for _ in range(2):
+        connection.start_report(Auth(access_token="token"),
+                                ReportRequest()).wait()
+
+    assert len(tls_collector.reports) == 2
+    assert connection._ssl_context.handshakes == 2
+    assert connection._ssl_context.resumed_handshakes == 1
+
+
+@pytest.fixture
+def collector():
+    with mock_collector.MockCollector() as collector:
+        yield collector
+
+
+def test_prewarm_connects_before_first_span(collector, make_tracer):
+    tracer = make_tracer(collector, prewarm=True, periodic_flush_seconds=60)
+    wait_for(lambda: collector.reports)
+    assert collector.reports[0].num_spans == 0
+    assert tracer.recorder._flush_thread is not None
+
+    tracer.start_span("first").finish()
+    assert tracer.flush()
+    # The first span went out on the connection opened at construction.
+    assert collector.connections == 1
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_prewarm_without_flush_thread(collector, make_tracer):
+    tracer = make_tracer(collector, prewarm=True, serverless=True)
+    wait_for(lambda: collector.reports)
+    assert tracer.recorder._flush_thread is None
+
+    tracer.start_span("first").finish()
+    assert tracer.flush()
+    assert collector.connections == 1
+    tracer.recorder.shutdown(flush=False)
@@ -0,0 +1,44 @@
+from basictracer.context import SpanContext
+from opentracing import follows_from
+
+
+def test_start_active_span_truncates_trace_id(make_tracer):
+    tracer = make_tracer()
+    parent = SpanContext(trace_id=(0xabc << 64) | 0x1234, span_id=1)
+    with tracer.start_active_span("child", child_of=parent) as scope:
+        assert scope.span.context.trace_id == (0xabc << 64) | 0x1234
+    assert scope.span.context.trace_id == 0x1234
+
+
+def test_start_active_span_keeps_64_bit_trace_id(make_tracer):
+    tracer = make_tracer()
+    parent = SpanContext(trace_id=0xffffffffffffffff, span_id=1)
+    with tracer.start_active_span("child", child_of=parent) as scope:
+        pass
+    assert scope.span.context.trace_id == 0xffffffffffffffff
+
+
+def test_start_active_span_reuses_scope_class(make_tracer):
+    tracer = make_tracer()
+    with tracer.start_active_span("first") as first:
+        with tracer.start_active_span("second") as second:
+            assert type(first) is type(second)
+    with tracer.start_active_span("third") as third:
+        assert type(third) is type(first)
+    assert tracer.scope_manager.active is None
+
+
+def test_start_span_resolves_parent_as_basic_tracer(make_tracer):
+    tracer = make_tracer()
+    parent = SpanContext(trace_id=7, span_id=8)
+    span = tracer.start_span("follows", references=follows_from(parent))
+    assert (span.context.trace_id, span.parent_id) == (7, 8)
+
+    with tracer.start_active_span("active") as scope:
+        child = tracer.start_span("child")
+        assert child.parent_id == scope.span.context.span_id
+        # An empty references list falls back to the active span too.
+        assert tracer.start_span("child", references=[]).parent_id == \
+            scope.span.context.span_id
+        assert tracer.start_span("root", ignore_active_span=True) \
+            .parent_id is None
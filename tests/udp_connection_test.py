@@ -0,0 +1,84 @@
+import socket
+import time
+
+import pytest
+
+
+udp_receiver = pytest.importorskip("benchmarks.udp_receiver")
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def receiver():
+    with udp_receiver.UDPReceiver() as receiver:
+        yield receiver
+
+
+def finish_spans(tracer, count, logs=0, tag_bytes=0):
+    for i in range(count):
+        span = tracer.start_span("span-{0}".format(i))
+        span.set_tag("value", "x" * tag_bytes)
+        for _ in range(logs):
+            span.log_kv({"event": "log", "message": "y" * 200})
+        span.finish()
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_report_split_into_datagrams(receiver, use_thrift, make_tracer):
+    tracer = make_tracer(receiver, use_thrift)
+    finish_spans(tracer, 200, tag_bytes=50)
+    assert tracer.flush()
+    wait_for(lambda: receiver.num_spans == 200)
+
+    assert receiver.max_datagram_bytes <= 1472
+    assert len(receiver.reports) > 1
+    assert {r.access_token for r in receiver.reports} == {"test-token"}
+    names = sorted(tracer.recorder.converter.get_span_name(span)
+                   for span in receiver.spans)
+    assert names == sorted("span-{0}".format(i) for i in range(200))
+    stats = tracer.recorder.stats()
+    assert stats["datagrams_sent"] == len(receiver.reports)
+    assert stats["spans_truncated"] == stats["spans_dropped"] == 0
+    tracer.recorder.shutdown(flush=False)
+
+
+@pytest.mark.parametrize("use_thrift", [True, False])
+def test_oversized_spans(receiver, use_thrift, make_tracer):
+    tracer = make_tracer(receiver, use_thrift)
+    # Fits once its logs are dropped.
+    finish_spans(tracer, 1, logs=20)
+    # Does not fit even then.
+    finish_spans(tracer, 1, tag_bytes=4000)
+    assert tracer.flush()
+    wait_for(lambda: receiver.num_spans == 1)
+
+    stats = tracer.recorder.stats()
+    assert stats["spans_truncated"] == 1
+    assert stats["spans_dropped"] == 1
+    tracer.recorder.shutdown(flush=False)
+
+
+def test_send_errors_do_not_block(make_tracer):
+    # A port nobody listens on: the kernel reports the ICMP errors on later
+    # sends, which are counted rather than raised or retried.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    tracer = make_tracer(agent_udp_address="127.0.0.1:{0}".format(port))
+    for _ in range(3):
+        finish_spans(tracer, 50, tag_bytes=50)
+        start = time.time()
+        tracer.flush()
+        assert time.time() - start < 1
+    stats = tracer.recorder.stats()
+    assert stats["send_errors"] > 0
+    assert stats["spans_buffered"] == 0
+    tracer.recorder.shutdown(flush=False)
@@ -1,4 +1,6 @@
+import os
 import sys
+import threading
 import unittest
 import time
 
@@ -6,6 +8,38 @@ from lightstep import util
 
 class UtilTest(unittest.TestCase):
     
+    def test_is_monkey_patched(self):
+        class Patched(object):
+            def __init__(self, patched):
+                self.patched = patched
+
+            def is_module_patched(self, name):
+                return name in self.patched
+
+            is_monkey_patched = is_module_patched
+
+        saved = {name: sys.modules.get(name)
+                 for name in ('gevent.monkey', 'eventlet.patcher')}
+        try:
+            for name in saved:
+                sys.modules.pop(name, None)
+            self.assertFalse(util._is_monkey_patched())
+
+            sys.modules['gevent.monkey'] = Patched(['socket'])
+            self.assertFalse(util._is_monkey_patched())
+            sys.modules['gevent.monkey'] = Patched(['threading'])
+            self.assertTrue(util._is_monkey_patched())
+
+            del sys.modules['gevent.monkey']
+            sys.modules['eventlet.patcher'] = Patched(['thread'])
+            self.assertTrue(util._is_monkey_patched())
+        finally:
+            for name, module in saved.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+
     def test_merge_dicts(self):
         self.assertEqual(None, util._merge_dicts())
         self.assertEqual(None, util._merge_dicts(None))
@@ -44,5 +78,49 @@ class UtilTest(unittest.TestCase):
         self.assertEqual(777, seconds)
         self.assertEqual(987654321, nanos)
 
+    def test_generate_id(self):
+        ids = [util._generate_id() for _ in range(2000)]
+        self.assertEqual(len(ids), len(set(ids)))
+        for i in ids:
+            self.assertTrue(0 < i < 2 ** 64)
+
+        trace_id = util._generate_trace_id_128()
+        self.assertTrue(0 < trace_id < 2 ** 128)
+
+    def test_generate_id_across_threads(self):
+        thread_ids = []
+        thread_pools = []
+
+        def generate():
+            thread_ids.extend(util._generate_id() for _ in range(100))
+            thread_pools.append(util._id_pool.pop.__self__)
+
+        thread = threading.Thread(target=generate)
+        thread.start()
+        thread.join()
+        ids = [util._generate_id() for _ in range(100)]
+        self.assertFalse(set(ids) & set(thread_ids))
+        # Each thread draws from its own pool.
+        self.assertIsNot(util._id_pool.pop.__self__, thread_pools[0])
+
+    def test_guid_rng(self):
+        # Deprecated, but still there for code that used it.
+        self.assertTrue(0 <= util.guid_rng.getrandbits(64) < 2 ** 64)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_generate_id_after_fork(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write_fd, str(util._generate_id()).encode('ascii'))
+            os._exit(0)
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        child_id = int(os.read(read_fd, 64))
+        os.close(read_fd)
+        # The child does not repeat the id the parent draws next.
+        parent_id = util._generate_id()
+        self.assertNotEqual(child_id, parent_id)
+
 if __name__ == '__main__':
     unittest.main()